@@ -1,2 +1,3 @@
+from .metrics_endpoints import router as metrics_router
 from .msg_endpoints import router as msg_router
 from .user_msg_endpoints import router as user_msg_router
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Response
+
+from core.metrics import render_metrics
+
+
+router = APIRouter()
+
+
+@router.get('/metrics')
+def metrics():
+    """Метрики Prometheus всех процессов сервиса."""
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
@@ -1,6 +1,8 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 
+from api.utils import batch_openapi_extra, batch_result, parse_batch
 from core.config import logger
+from schemas.batch_schema import OutgoingBatchSchema
 from schemas.msg_schema import (OutgoingMessageSchema,
                                 IncomingMessageSchema)
 from kafka_client.producer import get_producer
@@ -29,7 +31,7 @@ async def receiving_message(
             status_code=500,
             detail="Kafka-продюсер не инициализирован"
         )
-    success = producer.send_message(
+    success = await producer.send_message(
         key=data_msg.key,
         message=data_msg.msg
     )
@@ -40,3 +42,29 @@ async def receiving_message(
             detail="Ошибка при отправке сообщения в Kafka"
         )
     return {"msg": "Сообщение получено и отправлено в Kafka"}
+
+
+@router.post(
+    '/message/batch',
+    response_model=OutgoingBatchSchema,
+    response_model_exclude_none=True,
+    openapi_extra=batch_openapi_extra(IncomingMessageSchema)
+)
+async def receiving_message_batch(request: Request):
+    """
+    Получает пачку сообщений (JSON-массив или NDJSON)
+    и отправляет ее в Kafka.
+    """
+    messages = await parse_batch(request, IncomingMessageSchema)
+    logger.info(f"Получена пачка из {len(messages)} сообщений от клиента")
+    producer = get_producer()
+    if not producer:
+        logger.info("Kafka-продюсер не инициализирован")
+        raise HTTPException(
+            status_code=500,
+            detail="Kafka-продюсер не инициализирован"
+        )
+    errors = await producer.send_batch(
+        [(data_msg.key, data_msg.msg) for data_msg in messages]
+    )
+    return batch_result(errors, "Пачка сообщений обработана")
@@ -1,25 +1,55 @@
 """Эндпоинты для работы с сообщениями пользователей."""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 
-from core.config import logger
+from api.utils import (batch_openapi_extra, batch_result, body_openapi_extra,
+                       parse_batch, parse_message)
+from core.config import logger, settings
+from schemas.batch_schema import OutgoingBatchSchema
 from schemas.msg_schema import OutgoingMessageSchema
 from schemas.user_msg_schema import (IncomingBlockedMessageSchema,
-                                     IncominUserMessageSchema)
+                                     IncominUserMessageSchema,
+                                     RawBlockedMessageSchema,
+                                     RawUserMessageSchema)
+from kafka_client.formats import FORMAT_JSON
+from kafka_client.keys import get_key_strategy
 from kafka_client.producer_plain import get_plain_producer
 
 
 router = APIRouter()
 
 
+# Ключи распределяют сообщения по партициям с сохранением порядка
+# для одного пользователя
+user_message_key = get_key_strategy(settings.user_message_key)
+blocked_message_key = get_key_strategy(settings.blocked_message_key)
+
+# Пересылка исходных байтов тела запроса без пересериализации
+# (только для формата json): строгая валидация за один проход
+raw_ingest = (
+    settings.user_message_raw_ingest
+    and settings.user_message_format == FORMAT_JSON
+)
+user_message_model = (
+    RawUserMessageSchema if raw_ingest else IncominUserMessageSchema
+)
+blocked_message_model = (
+    RawBlockedMessageSchema if raw_ingest else IncomingBlockedMessageSchema
+)
+
+
 @router.post(
     '/user-message',
     response_model=OutgoingMessageSchema,
-    response_model_exclude_none=True
+    response_model_exclude_none=True,
+    openapi_extra=body_openapi_extra(IncominUserMessageSchema)
 )
-async def set_user_message(
-    data_msg: IncominUserMessageSchema
-):
+async def set_user_message(request: Request):
     """Получает сообщение пользователя и отправляет его в Kafka."""
+    data_msg, body = await parse_message(
+        request,
+        user_message_model,
+        strict=raw_ingest
+    )
     logger.info(
                 f'Получено сообщение от пользователя {data_msg.user_id} '
                 f'для пользователя {data_msg.recipient_id}'
@@ -31,10 +61,10 @@ async def set_user_message(
             status_code=500,
             detail="Простой Kafka-продюсер не инициализирован"
         )
-    success = producer.send_message(
-        key='user_msg',
+    success = await producer.send_message(
+        key=user_message_key(data_msg),
         topic='messages_topic',
-        message=data_msg.model_dump_json()
+        message=body if raw_ingest else data_msg
     )
     if not success:
         logger.info("Ошибка при отправке простого сообщения в Kafka")
@@ -51,15 +81,19 @@ async def set_user_message(
 @router.post(
     '/blocked-message',
     response_model=OutgoingMessageSchema,
-    response_model_exclude_none=True
+    response_model_exclude_none=True,
+    openapi_extra=body_openapi_extra(IncomingBlockedMessageSchema)
 )
-async def set_blocked_user(
-    data_msg: IncomingBlockedMessageSchema
-):
+async def set_blocked_user(request: Request):
     """
     Получает сообщение о блокировке/разблокировке
     пользователя и отправляет его в Kafka.
     """
+    data_msg, body = await parse_message(
+        request,
+        blocked_message_model,
+        strict=raw_ingest
+    )
     logger.info(
         f'Получено сообщение от пользователя {data_msg.user_id} '
         f'для {data_msg.action} пользователя'
@@ -72,10 +106,10 @@ async def set_blocked_user(
             status_code=500,
             detail="Простой Kafka-продюсер не инициализирован"
         )
-    success = producer.send_message(
-        key='user_msg',
+    success = await producer.send_message(
+        key=blocked_message_key(data_msg),
         topic='blocked_users_topic',
-        message=data_msg.model_dump_json()
+        message=body if raw_ingest else data_msg
     )
     if not success:
         logger.info("Ошибка при отправке сообщения о блокировке в Kafka")
@@ -87,3 +121,63 @@ async def set_blocked_user(
         "msg": (f"Сообщение от пользователя {data_msg.user_id} получено "
                 f"сервером и отправлено в Kafka")
     }
+
+
+@router.post(
+    '/user-message/batch',
+    response_model=OutgoingBatchSchema,
+    response_model_exclude_none=True,
+    openapi_extra=batch_openapi_extra(IncominUserMessageSchema)
+)
+async def set_user_message_batch(request: Request):
+    """
+    Получает пачку сообщений пользователей (JSON-массив или NDJSON)
+    и отправляет ее в Kafka.
+    """
+    messages = await parse_batch(request, IncominUserMessageSchema)
+    logger.info(f'Получена пачка из {len(messages)} сообщений пользователей')
+    producer = get_plain_producer()
+    if not producer:
+        logger.info("Простой Kafka-продюсер не инициализирован")
+        raise HTTPException(
+            status_code=500,
+            detail="Простой Kafka-продюсер не инициализирован"
+        )
+    errors = await producer.send_batch(
+        topic='messages_topic',
+        messages=[
+            (user_message_key(data_msg), data_msg)
+            for data_msg in messages
+        ]
+    )
+    return batch_result(errors, "Пачка сообщений пользователей обработана")
+
+
+@router.post(
+    '/blocked-message/batch',
+    response_model=OutgoingBatchSchema,
+    response_model_exclude_none=True,
+    openapi_extra=batch_openapi_extra(IncomingBlockedMessageSchema)
+)
+async def set_blocked_user_batch(request: Request):
+    """
+    Получает пачку сообщений о блокировке/разблокировке
+    пользователей (JSON-массив или NDJSON) и отправляет ее в Kafka.
+    """
+    messages = await parse_batch(request, IncomingBlockedMessageSchema)
+    logger.info(f'Получена пачка из {len(messages)} сообщений о блокировке')
+    producer = get_plain_producer()
+    if not producer:
+        logger.info("Простой Kafka-продюсер не инициализирован")
+        raise HTTPException(
+            status_code=500,
+            detail="Простой Kafka-продюсер не инициализирован"
+        )
+    errors = await producer.send_batch(
+        topic='blocked_users_topic',
+        messages=[
+            (blocked_message_key(data_msg), data_msg)
+            for data_msg in messages
+        ]
+    )
+    return batch_result(errors, "Пачка сообщений о блокировке обработана")
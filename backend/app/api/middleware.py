@@ -0,0 +1,74 @@
+"""Промежуточные обработчики запросов."""
+import time
+
+from core.metrics import REQUEST_SECONDS
+from kafka_client.tracing import start_trace
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware: время запросов по шаблону пути эндпоинта.
+    Эндпоинты ждут подтверждения доставки, поэтому это время
+    от получения запроса до доставки сообщения в Kafka.
+    """
+
+    def __init__(self, app, skip_paths: tuple[str, ...] = ('/api/metrics',)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Шаблон пути маршрута, а не сам путь: число меток ограничено
+            route = scope.get('route')
+            endpoint = getattr(route, 'path', 'other')
+            if endpoint not in self.skip_paths:
+                REQUEST_SECONDS.labels(
+                    endpoint,
+                    scope['method'],
+                    status
+                ).observe(time.perf_counter() - started)
+
+
+class TraceMiddleware:
+    """
+    ASGI middleware: request ID (из заголовка X-Request-ID или новый)
+    и время приема запроса для заголовков трассировки записей Kafka.
+    Request ID возвращается в заголовке ответа.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope['headers']:
+            if name == b'x-request-id':
+                request_id = value.decode('latin-1')[:64]
+                break
+        trace = start_trace(request_id)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                message.setdefault('headers', []).append(
+                    (b'x-request-id', trace.request_id.encode('latin-1'))
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
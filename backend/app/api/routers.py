@@ -1,8 +1,9 @@
 from fastapi import APIRouter
 
-from api.endpoints import msg_router, user_msg_router
+from api.endpoints import metrics_router, msg_router, user_msg_router
 
 main_router = APIRouter()
 
 main_router.include_router(msg_router, tags=['Сообщения'])
 main_router.include_router(user_msg_router, tags=['Переписка пользователей'])
+main_router.include_router(metrics_router, tags=['Мониторинг'])
@@ -0,0 +1,138 @@
+"""Вспомогательные функции эндпоинтов."""
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+
+NDJSON_CONTENT_TYPES = (
+    'application/x-ndjson',
+    'application/ndjson',
+    'application/jsonl'
+)
+
+
+def body_openapi_extra(model: type[BaseModel]) -> dict:
+    """Описание тела запроса для эндпоинтов, читающих Request."""
+    return {
+        'requestBody': {
+            'required': True,
+            'content': {
+                'application/json': {'schema': model.model_json_schema()}
+            }
+        }
+    }
+
+
+def batch_openapi_extra(model: type[BaseModel]) -> dict:
+    """Описание тела пакетного запроса для OpenAPI."""
+    return {
+        'requestBody': {
+            'required': True,
+            'content': {
+                'application/json': {
+                    'schema': {
+                        'type': 'array',
+                        'items': model.model_json_schema()
+                    }
+                },
+                'application/x-ndjson': {
+                    'schema': {'type': 'string'}
+                }
+            }
+        }
+    }
+
+
+@lru_cache(maxsize=None)
+def batch_adapter(model: type[BaseModel]) -> TypeAdapter:
+    """Валидатор списка записей (создается один раз на модель)."""
+    return TypeAdapter(list[model])
+
+
+def body_errors(errors: list[dict], *prefix, **extra) -> list[dict]:
+    """Ошибки валидации с префиксом loc ('body', ...), как у FastAPI."""
+    return [
+        {**error, 'loc': ('body', *prefix, *error['loc']), **extra}
+        for error in errors
+    ]
+
+
+async def parse_batch(
+    request: Request,
+    model: type[BaseModel]
+) -> list:
+    """
+    Разбирает тело запроса (JSON-массив или NDJSON) и валидирует записи.
+    JSON-массив валидируется за один проход, NDJSON - построчно,
+    в ошибках указываются индекс записи и номер строки.
+    """
+    body = await request.body()
+    content_type = request.headers.get('content-type', '')
+    if content_type.split(';')[0].strip() not in NDJSON_CONTENT_TYPES:
+        try:
+            return batch_adapter(model).validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(
+                body_errors(e.errors(include_url=False))
+            )
+    lines = [
+        (line_number, line)
+        for line_number, line in enumerate(body.splitlines(), start=1)
+        if line.strip()
+    ]
+    records = []
+    errors = []
+    for index, (line_number, line) in enumerate(lines):
+        try:
+            records.append(model.model_validate_json(line))
+        except ValidationError as e:
+            errors.extend(body_errors(
+                e.errors(include_url=False),
+                index,
+                line=line_number
+            ))
+    if errors:
+        raise RequestValidationError(errors)
+    return records
+
+
+async def parse_message(
+    request: Request,
+    model: type[BaseModel],
+    strict: bool = False
+) -> tuple[BaseModel, bytes]:
+    """
+    Валидирует исходные байты тела запроса за один проход (без json.loads)
+    и возвращает модель вместе с этими байтами.
+    """
+    body = await request.body()
+    try:
+        return model.model_validate_json(body, strict=strict), body
+    except ValidationError as e:
+        raise RequestValidationError(body_errors(e.errors(include_url=False)))
+
+
+def batch_result(
+    errors: list[Optional[str]],
+    msg: str
+) -> dict:
+    """Формирует ответ с пособытийным статусом доставки."""
+    items = [
+        {
+            'index': index,
+            'status': 'failed' if error else 'delivered',
+            'error': error
+        }
+        for index, error in enumerate(errors)
+    ]
+    failed = sum(1 for error in errors if error)
+    return {
+        'msg': msg,
+        'total': len(errors),
+        'delivered': len(errors) - failed,
+        'failed': failed,
+        'items': items
+    }
@@ -0,0 +1,77 @@
+"""
+Сравнение синхронного коммита после каждого сообщения
+с асинхронным коммитом через OffsetCommitter.
+
+Требуется доступный кластер Kafka. Запуск из каталога backend/app:
+    python -m benchmarks.bench_commit [bootstrap_servers] [количество]
+"""
+import json
+import sys
+import time
+import uuid
+
+from confluent_kafka import Consumer, Producer
+
+from kafka_client.offsets import OffsetCommitter
+
+
+def fill_topic(bootstrap_servers: str, topic: str, count: int):
+    producer = Producer({'bootstrap.servers': bootstrap_servers})
+    for index in range(count):
+        producer.produce(topic, key=b'one', value=json.dumps({'n': index}))
+        producer.poll(0)
+    producer.flush(30)
+
+
+def consume(bootstrap_servers: str, topic: str, count: int, mode: str):
+    consumer = Consumer({
+        'bootstrap.servers': bootstrap_servers,
+        'group.id': f'bench-{mode}-{uuid.uuid4()}',
+        'auto.offset.reset': 'earliest',
+        'enable.auto.commit': False,
+        'enable.auto.offset.store': mode == 'sync',
+    })
+    committer = OffsetCommitter(consumer)
+    consumer.subscribe([topic])
+    latencies = []
+    received = 0
+    started = None
+    while received < count:
+        msg = consumer.poll(1.0)
+        if msg is None or msg.error():
+            continue
+        if started is None:
+            started = time.perf_counter()
+        step = time.perf_counter()
+        json.loads(msg.value())
+        if mode == 'sync':
+            consumer.commit(message=msg, asynchronous=False)
+        else:
+            committer.store(msg)
+        latencies.append(time.perf_counter() - step)
+        received += 1
+    if mode != 'sync':
+        committer.flush()
+    elapsed = time.perf_counter() - started
+    consumer.close()
+    latencies.sort()
+    return {
+        'mode': mode,
+        'messages': received,
+        'throughput_msg_s': round(received / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1e3, 3),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1e3, 3),
+    }
+
+
+def main():
+    bootstrap_servers = sys.argv[1] if len(sys.argv) > 1 else 'localhost:9095'
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    topic = f'bench-commit-{uuid.uuid4().hex[:8]}'
+    fill_topic(bootstrap_servers, topic, count)
+    for mode in ('sync', 'async'):
+        print(json.dumps(consume(bootstrap_servers, topic, count, mode)))
+
+
+if __name__ == '__main__':
+    main()
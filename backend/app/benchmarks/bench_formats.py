@@ -0,0 +1,130 @@
+"""
+Сравнение форматов сообщений (JSON, Avro, Protobuf) и кодеков сжатия:
+размер записи, размер пачки после сжатия и время сериализации.
+
+Schema Registry и брокер не нужны: ID схем заранее кладутся в кэш
+клиента. Сжатие пачки оценивается теми же алгоритмами, что использует
+librdkafka (lz4, snappy и zstd - из пакета cramjam, если он установлен).
+Запуск из каталога backend/app:
+    python -m benchmarks.bench_formats [количество] [размер пачки]
+"""
+import gzip
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import orjson
+from confluent_kafka.schema_registry import RegisteredSchema
+from confluent_kafka.serialization import MessageField, SerializationContext
+
+from kafka_client.formats import (
+    make_record_deserializer,
+    make_record_serializer,
+    record_schema
+)
+from kafka_client.schema_cache import CachedSchemaRegistryClient, SchemaCache
+
+
+TOPIC = 'messages_topic'
+RECORD_NAME = 'UserMessage'
+
+
+def offline_client() -> CachedSchemaRegistryClient:
+    url = 'http://schema-registry.invalid'
+    cache = SchemaCache(url, ttl=float('inf'))
+    subject = f'{TOPIC}-value'
+    for schema_id, message_format in enumerate(('avro', 'protobuf'), 1):
+        schema = record_schema(message_format, RECORD_NAME)
+        cache.registered[(subject, schema.schema_str)] = (
+            RegisteredSchema(
+                schema_id=schema_id,
+                guid=None,
+                schema=schema,
+                subject=subject,
+                version=schema_id
+            ),
+            time.time()
+        )
+        cache.schemas[schema_id] = (schema, time.time())
+    return CachedSchemaRegistryClient({'url': url}, cache)
+
+
+def codecs() -> dict:
+    result = {'none': lambda data: data, 'gzip': gzip.compress}
+    try:
+        import cramjam
+    except ImportError:
+        return result
+    result['snappy'] = lambda data: bytes(cramjam.snappy.compress_raw(data))
+    result['lz4'] = lambda data: bytes(cramjam.lz4.compress(data))
+    result['zstd'] = lambda data: bytes(cramjam.zstd.compress(data))
+    return result
+
+
+def measure(func, items) -> tuple[float, list]:
+    started = time.perf_counter()
+    result = [func(item) for item in items]
+    return (time.perf_counter() - started) / len(items) * 1e6, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    client = offline_client()
+    ctx = SerializationContext(TOPIC, MessageField.VALUE)
+    values = [
+        {
+            'user_id': f'user-{index % 1000}',
+            'recipient_id': str(uuid.uuid4()),
+            'timestamp': datetime.now().isoformat(),
+            'message': f'Привет! Это тестовое сообщение номер {index}'
+        }
+        for index in range(count)
+    ]
+    formats = {
+        'json': (orjson.dumps, orjson.loads),
+    }
+    for message_format in ('avro', 'protobuf'):
+        serializer = make_record_serializer(
+            message_format, RECORD_NAME, client
+        )
+        deserializer = make_record_deserializer(
+            message_format, RECORD_NAME, client
+        )
+        formats[message_format] = (
+            lambda value, serializer=serializer: serializer(value, ctx),
+            lambda data, deserializer=deserializer: deserializer(data, ctx)
+        )
+
+    compressors = codecs()
+    header = (
+        ['формат', 'байт/запись', 'сериализация мкс', 'десериализация мкс']
+        + [f'{name}: байт/запись (мкс/запись)' for name in compressors]
+    )
+    print('| ' + ' | '.join(header) + ' |')
+    print('|' + '---|' * len(header))
+    for name, (serialize, deserialize) in formats.items():
+        serialize_us, encoded = measure(serialize, values)
+        deserialize_us, decoded = measure(deserialize, encoded)
+        assert decoded == values
+        batch = b''.join(encoded[:batch_size])
+        batch_count = min(batch_size, count)
+        row = [
+            name,
+            f'{sum(map(len, encoded)) / count:.1f}',
+            f'{serialize_us:.2f}',
+            f'{deserialize_us:.2f}'
+        ]
+        for compress in compressors.values():
+            started = time.perf_counter()
+            compressed = compress(batch)
+            compress_us = (time.perf_counter() - started) / batch_count * 1e6
+            row.append(
+                f'{len(compressed) / batch_count:.1f} ({compress_us:.2f})'
+            )
+        print('| ' + ' | '.join(row) + ' |')
+
+
+if __name__ == '__main__':
+    main()
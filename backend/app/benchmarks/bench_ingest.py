@@ -0,0 +1,68 @@
+"""
+Стоимость подготовки сообщения /user-message к отправке в Kafka:
+разбор тела FastAPI (json.loads и валидация модели) с последующим
+model_dump_json против строгой валидации исходных байтов
+с пересылкой самого тела запроса (USER_MESSAGE_RAW_INGEST).
+
+Запуск из каталога backend/app:
+    python -m benchmarks.bench_ingest [количество]
+"""
+import json
+import sys
+import time
+import tracemalloc
+
+from schemas.user_msg_schema import (IncominUserMessageSchema,
+                                     RawUserMessageSchema)
+
+
+BODY = json.dumps({
+    'user_id': 'user-42',
+    'recipient_id': 'user-7',
+    'timestamp': '2026-10-18T12:00:00.000000',
+    'message': 'Привет! Это тестовое сообщение для пользователя'
+}, ensure_ascii=False).encode('utf-8')
+
+
+def parse_and_dump(body: bytes) -> str:
+    """Прежний путь: тело разбирает FastAPI, продюсер получает новую строку."""
+    data_msg = IncominUserMessageSchema.model_validate(json.loads(body))
+    return data_msg.model_dump_json()
+
+
+def validate_raw(body: bytes) -> bytes:
+    """Строгая валидация байтов за один проход, в Kafka уходит само тело."""
+    RawUserMessageSchema.model_validate_json(body, strict=True)
+    return body
+
+
+def measure(name: str, func, count: int) -> dict:
+    started = time.perf_counter()
+    for _ in range(count):
+        func(BODY)
+    elapsed = time.perf_counter() - started
+    # Пиковый объем памяти, выделяемой на один запрос
+    tracemalloc.start()
+    func(BODY)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'case': name,
+        'requests': count,
+        'us_per_request': round(elapsed / count * 1e6, 2),
+        'requests_s': round(count / elapsed),
+        'peak_bytes': peak
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for name, func in (
+        ('parse + model_dump_json', parse_and_dump),
+        ('raw bytes', validate_raw)
+    ):
+        print(json.dumps(measure(name, func, count), ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Нагрузка на конвейер API -> продюсер -> консьюмеры в одном процессе
+без кластера Kafka и Schema Registry (KAFKA_TRANSPORT=memory).
+
+Запросы генерирует benchmarks.load_api и передает приложению
+через ASGITransport httpx, консьюмеры работают в потоках процесса.
+После нагрузки измеряется время, за которое обе группы консьюмеров
+закоммитят все сообщения.
+
+Запуск из каталога backend/app:
+    python -m benchmarks.bench_pipeline [--rate 0] [--duration 10]
+Профилирование:
+    python -m cProfile -o pipeline.prof -m benchmarks.bench_pipeline
+Вывод приложения (print, логи) идет в stderr, результат - JSON в stdout.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+
+os.environ['KAFKA_TRANSPORT'] = 'memory'
+os.environ.setdefault('RUN_CONSUMERS_IN_API', 'true')
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from benchmarks.load_api import run_load  # noqa: E402
+from core.config import settings  # noqa: E402
+from kafka_client.transport import get_memory_broker  # noqa: E402
+
+
+async def wait_consumers(timeout: float) -> dict:
+    """Время до нулевого отставания групп консьюмеров."""
+    broker = get_memory_broker()
+    groups = (
+        settings.single_consumer_group_id,
+        settings.batch_consumer_group_id
+    )
+    started = time.perf_counter()
+    result = {}
+    while time.perf_counter() - started < timeout:
+        lags = {group: broker.lag(group) for group in groups}
+        for group, lag in lags.items():
+            if lag == 0 and group not in result:
+                result[group] = round(time.perf_counter() - started, 3)
+        if len(result) == len(groups):
+            break
+        await asyncio.sleep(0.01)
+    return {
+        group: {
+            'drain_s': result.get(group),
+            'lag': broker.lag(group)
+        }
+        for group in groups
+    }
+
+
+async def run(args) -> dict:
+    await main.startup_event()
+    try:
+        report = await run_load(
+            'http://pipeline/api',
+            args.scenario,
+            args.rate,
+            args.concurrency,
+            args.duration,
+            args.timeout,
+            transport=httpx.ASGITransport(app=main.app)
+        )
+        report['consumers'] = await wait_consumers(args.drain_timeout)
+    finally:
+        await main.shutdown_event()
+    broker = get_memory_broker()
+    report['topics'] = {
+        topic: sum(log.end for log in partitions)
+        for topic, partitions in broker.topics.items()
+    }
+    return report
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(
+        description='Нагрузка на конвейер с брокером в памяти'
+    )
+    parser.add_argument('--scenario', default='messages',
+                        choices=('messages', 'user-messages', 'blocked',
+                                 'test'))
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help='Запросов в секунду, 0 - без ограничения')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--drain-timeout', type=float, default=30.0,
+                        help='Ожидание обработки консьюмерами (секунды)')
+    args = parser.parse_args()
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,112 @@
+"""
+Сравнение JSONSerializer/JSONDeserializer из confluent-kafka
+с FastJSONSerializer/FastJSONDeserializer.
+
+Schema Registry не нужен: ID схемы заранее кладется в кэш клиента.
+Запуск из каталога backend/app:
+    python -m benchmarks.bench_serde [количество]
+"""
+import json
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from confluent_kafka.schema_registry import RegisteredSchema, Schema
+from confluent_kafka.schema_registry.json_schema import (
+    JSONDeserializer,
+    JSONSerializer
+)
+from confluent_kafka.serialization import MessageField, SerializationContext
+
+from kafka_client.schema_cache import CachedSchemaRegistryClient, SchemaCache
+from kafka_client.schemas import json_schema_str
+from kafka_client.serde import FastJSONDeserializer, FastJSONSerializer
+
+
+TOPIC = 'messages'
+SCHEMA_ID = 1
+
+
+def offline_client() -> CachedSchemaRegistryClient:
+    url = 'http://schema-registry.invalid'
+    cache = SchemaCache(url, ttl=float('inf'))
+    schema = Schema(json_schema_str, schema_type='JSON')
+    subject = f'{TOPIC}-value'
+    cache.registered[(subject, json_schema_str)] = (
+        RegisteredSchema(
+            schema_id=SCHEMA_ID,
+            guid=None,
+            schema=schema,
+            subject=subject,
+            version=1
+        ),
+        time.time()
+    )
+    cache.schemas[SCHEMA_ID] = (schema, time.time())
+    return CachedSchemaRegistryClient({'url': url}, cache)
+
+
+def measure(name: str, count: int, func) -> dict:
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    return {
+        'case': name,
+        'messages': count,
+        'us_per_msg': round(elapsed / count * 1e6, 2),
+        'msg_s': round(count / elapsed)
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    client = offline_client()
+    ctx = SerializationContext(TOPIC, MessageField.VALUE)
+    values = [
+        {
+            'id': str(uuid.uuid4()),
+            'timestamp': datetime.now().isoformat(),
+            'key': 'many',
+            'msg': f'сообщение {index}'
+        }
+        for index in range(count)
+    ]
+    confluent_serializer = JSONSerializer(json_schema_str, client)
+    confluent_deserializer = JSONDeserializer(
+        json_schema_str,
+        schema_registry_client=client
+    )
+    fast_serializer = FastJSONSerializer(json_schema_str, client)
+    fast_deserializer = FastJSONDeserializer(json_schema_str, client)
+
+    encoded = [confluent_serializer(value, ctx) for value in values]
+    assert encoded == fast_serializer.serialize_batch(values, ctx)
+    assert fast_deserializer.deserialize_batch(encoded, ctx) == values
+
+    results = [
+        measure('confluent serialize', count, lambda: [
+            confluent_serializer(value, ctx) for value in values
+        ]),
+        measure('fast serialize', count, lambda: [
+            fast_serializer(value, ctx) for value in values
+        ]),
+        measure('fast serialize_batch', count, lambda: (
+            fast_serializer.serialize_batch(values, ctx)
+        )),
+        measure('confluent deserialize', count, lambda: [
+            confluent_deserializer(data, ctx) for data in encoded
+        ]),
+        measure('fast deserialize', count, lambda: [
+            fast_deserializer(data, ctx) for data in encoded
+        ]),
+        measure('fast deserialize_batch', count, lambda: (
+            fast_deserializer.deserialize_batch(encoded, ctx)
+        )),
+    ]
+    for result in results:
+        print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
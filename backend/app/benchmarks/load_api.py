@@ -0,0 +1,277 @@
+"""
+Нагрузочный тест HTTP API приема сообщений.
+
+Воспроизводит трафик frontend/src/App.vue с заданной частотой
+и параллельностью:
+- messages: /api/message, ключ many раз в секунду и one раз
+  в 10 секунд (доля one - 1/11);
+- user-messages: /api/user-message, случайная пара пользователей
+  1..21, три слова, каждое третье сообщение с запрещенным словом;
+- blocked: /api/blocked-message, каждое третье - запрещенное слово
+  (user_id forbidden_words), действие чередуется blocked/unblocked;
+- test: user-messages и blocked поровну, как тестовая переписка.
+
+Запуск из каталога backend/app:
+    python -m benchmarks.load_api --scenario test --rate 500 \
+        --concurrency 64 --duration 30 --url http://localhost:8000/api
+
+При заданной частоте (--rate) запросы отправляются по расписанию,
+задержка считается от запланированного времени отправки, чтобы
+очередь на стороне генератора не скрывала медленные ответы.
+--rate 0 - замкнутый цикл: каждый из --concurrency запросов
+отправляется сразу после ответа на предыдущий.
+Результат - JSON: пропускная способность, перцентили задержки
+и доля ошибок по эндпоинтам и в целом.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import httpx
+
+
+WORDS = (
+    'Чтобы', 'эффективно', 'настраивать', 'брокеры', 'важно', 'понимать',
+    'как', 'взаимодействуют', 'продюсеры', 'и', 'консьюмеры', 'В', 'этом',
+    'уроке', 'вы', 'узнаете', 'подробнее', 'об', 'этих', 'двух',
+    'элементах', 'Продюсеры', 'генерируют', 'и', 'отправляют', 'данных',
+    'а', 'консьюмеры', 'потребляют', 'и', 'обрабатывают', 'эти', 'данные',
+    'Эти', 'два', 'элемента', 'работают', 'в', 'тандеме', 'создавая',
+    'поток', 'данных', 'который', 'реализует', 'разную', 'бизнес-логику',
+    'Например', 'В', 'системе', 'мониторинга', 'продюсеры', 'отправляют',
+    'метрики', 'производительности', 'в', 'реальном', 'времени',
+    'Консьюмеры', 'анализируют', 'эти', 'данные', 'и', 'генерируют',
+    'уведомления', 'о', 'потенциальных', 'проблемах', 'В', 'электронных',
+    'коммерческих', 'платформах', 'продюсеры', '–', 'это', 'системы',
+    'которые', 'обрабатывают', 'заказы', 'Консьюмеры', 'уведомляют',
+    'пользователей', 'о', 'статусе', 'их', 'заказов',
+)
+FORBIDDEN_WORDS = (
+    'ааа', 'ббб', 'ввв', 'ггг', 'ддд', 'еее', 'жжж', 'ззз', 'иии', 'ккк',
+    'ллл', 'ммм', 'ннн', 'ооо', 'ппп', 'ррр', 'ссс', 'ттт', 'ууу', 'ффф',
+    'xxx', 'ццц', 'ччч', 'шшш', 'щщщ',
+)
+FORBIDDEN_WORDS_KEY = 'forbidden_words'
+USERS = range(1, 22)
+ONE_EVERY = 11
+PERCENTILES = (50, 95, 99)
+
+
+def random_pair() -> tuple[str, str]:
+    first, second = random.sample(USERS, 2)
+    return str(first), str(second)
+
+
+class TrafficGenerator:
+    """Тела запросов по сценариям App.vue (счетчики - как во фронтенде)."""
+
+    def __init__(self):
+        self.messages = 0
+        self.user_messages = 0
+        self.blocked_messages = 0
+
+    def message(self) -> tuple[str, dict]:
+        self.messages += 1
+        key = 'one' if self.messages % ONE_EVERY == 1 else 'many'
+        text = 'Одиночное сообщение' if key == 'one' else 'Пакетное сообщение'
+        return '/message', {
+            'key': key,
+            'msg': f'{datetime.now().isoformat()}: {text}'
+        }
+
+    def user_message(self) -> tuple[str, dict]:
+        self.user_messages += 1
+        user_id, recipient_id = random_pair()
+        words = random.choices(WORDS, k=3)
+        if self.user_messages % 3 == 0:
+            words.append(random.choice(FORBIDDEN_WORDS))
+        return '/user-message', {
+            'user_id': user_id,
+            'recipient_id': recipient_id,
+            'timestamp': datetime.now().isoformat(),
+            'message': ' '.join(words)
+        }
+
+    def blocked_message(self) -> tuple[str, dict]:
+        self.blocked_messages += 1
+        if self.blocked_messages % 3 == 0:
+            user_id = FORBIDDEN_WORDS_KEY
+            blocked_user_id = random.choice(FORBIDDEN_WORDS)
+        else:
+            user_id, blocked_user_id = random_pair()
+        return '/blocked-message', {
+            'user_id': user_id,
+            'blocked_user_id': blocked_user_id,
+            'timestamp': datetime.now().isoformat(),
+            'action': (
+                'unblocked' if self.blocked_messages % 2 == 0 else 'blocked'
+            )
+        }
+
+    def scenario(self, name: str):
+        """Бесконечная последовательность запросов сценария."""
+        generators = {
+            'messages': (self.message,),
+            'user-messages': (self.user_message,),
+            'blocked': (self.blocked_message,),
+            'test': (self.user_message, self.blocked_message)
+        }[name]
+        for generate in itertools.cycle(generators):
+            yield generate()
+
+
+def percentile(values: list[float], pct: int) -> float:
+    """Перцентиль по ближайшему рангу (values отсортирован)."""
+    index = max(int(len(values) * pct / 100 + 0.5) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class LoadStats:
+    """Задержки и результаты запросов по эндпоинтам."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.results = defaultdict(Counter)
+
+    def add(self, endpoint: str, result: str, seconds: float):
+        self.latencies[endpoint].append(seconds)
+        self.results[endpoint][result] += 1
+
+    @staticmethod
+    def summarize(latencies: list[float], results: Counter,
+                  elapsed: float) -> dict:
+        latencies = sorted(latencies)
+        requests = len(latencies)
+        errors = requests - results.get('200', 0)
+        summary = {
+            'requests': requests,
+            'throughput_rps': round(requests / elapsed, 1),
+            'errors': errors,
+            'error_rate': round(errors / requests, 4) if requests else 0,
+            'results': dict(results)
+        }
+        if latencies:
+            for pct in PERCENTILES:
+                summary[f'p{pct}_ms'] = round(
+                    percentile(latencies, pct) * 1e3, 2
+                )
+            summary['max_ms'] = round(latencies[-1] * 1e3, 2)
+        return summary
+
+    def report(self, elapsed: float) -> dict:
+        total_results = sum(self.results.values(), Counter())
+        return {
+            'total': self.summarize(
+                list(itertools.chain(*self.latencies.values())),
+                total_results,
+                elapsed
+            ),
+            'endpoints': {
+                endpoint: self.summarize(
+                    latencies,
+                    self.results[endpoint],
+                    elapsed
+                )
+                for endpoint, latencies in sorted(self.latencies.items())
+            }
+        }
+
+
+async def send(client: httpx.AsyncClient, stats: LoadStats, endpoint: str,
+               body: dict, started: float):
+    try:
+        response = await client.post(endpoint, json=body)
+        result = str(response.status_code)
+    except httpx.HTTPError as e:
+        result = type(e).__name__
+    stats.add(endpoint, result, time.perf_counter() - started)
+
+
+async def run_load(url: str, scenario: str, rate: float, concurrency: int,
+                   duration: float, timeout: float,
+                   transport: httpx.AsyncBaseTransport = None) -> dict:
+    """
+    Нагрузка на API. transport - транспорт httpx, например
+    ASGITransport для приложения в том же процессе.
+    """
+    requests = TrafficGenerator().scenario(scenario)
+    stats = LoadStats()
+    client = httpx.AsyncClient(
+        base_url=url,
+        transport=transport,
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=concurrency,
+            max_keepalive_connections=concurrency
+        )
+    )
+    sequence = itertools.count()
+    started = time.perf_counter()
+    deadline = started + duration
+
+    async def worker():
+        while True:
+            if rate:
+                scheduled = started + next(sequence) / rate
+                if scheduled >= deadline:
+                    return
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                scheduled = time.perf_counter()
+                if scheduled >= deadline:
+                    return
+            endpoint, body = next(requests)
+            await send(client, stats, endpoint, body, scheduled)
+
+    async with client:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    report = stats.report(elapsed)
+    report['config'] = {
+        'url': url,
+        'scenario': scenario,
+        'rate': rate,
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 2)
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Нагрузочный тест API приема сообщений'
+    )
+    parser.add_argument('--url', default='http://localhost:8000/api',
+                        help='Базовый адрес API')
+    parser.add_argument('--scenario', default='test',
+                        choices=('messages', 'user-messages', 'blocked',
+                                 'test'))
+    parser.add_argument('--rate', type=float, default=100.0,
+                        help='Запросов в секунду, 0 - без ограничения')
+    parser.add_argument('--concurrency', type=int, default=32,
+                        help='Одновременных запросов (размер пула)')
+    parser.add_argument('--duration', type=float, default=30.0,
+                        help='Длительность в секундах')
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help='Таймаут запроса в секундах')
+    args = parser.parse_args()
+    report = asyncio.run(run_load(
+        args.url,
+        args.scenario,
+        args.rate,
+        args.concurrency,
+        args.duration,
+        args.timeout
+    ))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 """Настройки приложения."""
 import logging
+import tempfile
 from pathlib import Path
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -19,6 +20,88 @@ class Settings(BaseSettings):
     single_consumer_group_id: str
     batch_consumer_group_id: str
     log_level: str
+    # Режим сервера: uvicorn (один процесс) или gunicorn (несколько воркеров)
+    server_mode: str = 'uvicorn'
+    # Количество воркеров gunicorn, 0 - по числу ядер
+    web_concurrency: int = 0
+    # Стратегии ключей простого продюсера: "field:<поле>" или "const:<ключ>"
+    user_message_key: str = 'field:recipient_id'
+    blocked_message_key: str = 'field:user_id'
+    # Партиционер librdkafka, murmur2 совместим с Java-клиентом и Faust
+    plain_producer_partitioner: str = 'murmur2_random'
+    # Маршрутизация /api/message по ключу: none, topic или partition
+    kafka_topic_routing: str = 'none'
+    # Партиции ключей для режима partition, например "one:0;many:1,2"
+    kafka_key_partitions: str = ''
+    # Асинхронный коммит консьюмера единичных сообщений
+    single_consumer_commit_every: int = 100
+    single_consumer_commit_interval: float = 1.0
+    # Запускать консьюмеры в процессе API (иначе kafka_client.worker)
+    run_consumers_in_api: bool = True
+    # Количество процессов сервиса консьюмеров
+    consumer_worker_processes: int = 1
+    # Перезапусков упавших процессов, после - выход с ошибкой
+    consumer_worker_max_restarts: int = 5
+    # Пул обработки по партициям в консьюмерах (1 - без пула)
+    consumer_workers: int = 1
+    # Порог очереди партиции, после которого она ставится на паузу
+    consumer_max_queue: int = 1000
+    # Границы пачки пакетного консьюмера
+    batch_consumer_max_messages: int = 500
+    batch_consumer_max_wait: float = 1.0
+    batch_consumer_max_bytes: int = 1048576
+    # Файл кэша схем Schema Registry (пусто - без сохранения) и TTL записей
+    schema_cache_path: str = str(BASE_DIR / 'files' / 'schema_cache.json')
+    schema_cache_ttl: float = 300.0
+    # Сериализация JSON: fast (orjson) или confluent (JSONSerializer)
+    json_serde: str = 'fast'
+    # Формат сообщений /api/message: json, avro или protobuf
+    message_format: str = 'json'
+    # Формат топиков Faust (MESSAGE_FORMAT в .env.streams должен совпадать)
+    user_message_format: str = 'json'
+    # Пересылать в Kafka исходные байты /user-message и /blocked-message
+    user_message_raw_ingest: bool = False
+    # Допуск сообщений в продюсеры (0 - без лимита): сообщения, ожидающие
+    # подтверждения, и глубина очереди librdkafka; при превышении - 429
+    producer_max_in_flight: int = 20000
+    producer_max_queue_depth: int = 50000
+    # Сколько ждать места в переполненной очереди librdkafka (секунды)
+    producer_queue_wait: float = 0.0
+    # Значение заголовка Retry-After ответа 429 (секунды)
+    producer_retry_after: int = 1
+    # Сжатие продюсеров: none, gzip, snappy, lz4 или zstd
+    producer_compression: str = 'gzip'
+    plain_producer_compression: str = 'none'
+    # Журнал сообщений на время недоступности Kafka (каталог на томе files)
+    spool_enabled: bool = True
+    spool_dir: str = str(BASE_DIR / 'files' / 'spool')
+    spool_segment_bytes: int = 64 * 1024 * 1024
+    # fsync после каждой записи в журнал
+    spool_fsync: bool = True
+    # Размер порции отправки из журнала
+    spool_drain_batch: int = 500
+    # Размыкатель: ошибок доставки подряд до перехода на журнал
+    # и пауза перед проверкой кластера (секунды)
+    breaker_failure_threshold: int = 3
+    breaker_reset_timeout: float = 5.0
+    # Каталог метрик процессов, его очищают и включают лаунчеры
+    # main.py, gunicorn и kafka_client.worker (пусто - метрики
+    # только своего процесса)
+    metrics_multiproc_dir: str = str(
+        Path(tempfile.gettempdir()) / 'prometheus_multiproc'
+    )
+    # Интервал статистики librdkafka (stats_cb), 0 - отключена
+    kafka_statistics_interval_ms: int = 5000
+    # Порт метрик сервиса консьюмеров (0 - без HTTP-сервера)
+    consumer_metrics_port: int = 9100
+    # Заголовки трассировки (request ID, время приема и этапов) в записях
+    trace_headers: bool = True
+    # Транспорт клиентов: kafka (librdkafka) или memory (брокер и Schema
+    # Registry в памяти процесса для тестов и бенчмарков без кластера)
+    kafka_transport: str = 'kafka'
+    # Брокер в памяти: партиций в топике и хранимых сообщений партиции
+    memory_topic_partitions: int = 3
+    memory_retention_messages: int = 100000
 
     model_config = SettingsConfigDict(
         env_file=ENV_PATH,
@@ -0,0 +1,256 @@
+"""
+Метрики Prometheus бэкенда.
+
+Воркеры gunicorn и процессы сервиса консьюмеров пишут метрики
+в файлы каталога PROMETHEUS_MULTIPROC_DIR (режим multiprocess
+prometheus_client), эндпоинт /api/metrics собирает их вместе.
+Каталог готовит лаунчер (core.multiproc), без него у процесса
+обычный реестр. Каталог должен быть своим у каждого контейнера (реплики).
+"""
+import json
+import os
+import time
+from collections import deque
+
+from confluent_kafka import KafkaError
+
+from core.config import settings, logger
+
+if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+    # Каталог задан явно или лаунчером (core.multiproc)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,  # noqa: E402
+                               CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess,
+                               start_http_server)
+
+
+BATCH_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+REQUEST_SECONDS = Histogram(
+    'kafka_api_request_seconds',
+    'Время запроса от получения до ответа (включая доставку в Kafka)',
+    ['endpoint', 'method', 'status']
+)
+PRODUCER_DELIVERY_SECONDS = Histogram(
+    'kafka_producer_delivery_seconds',
+    'Время от produce до подтверждения доставки',
+    ['client']
+)
+PRODUCER_MESSAGES = Counter(
+    'kafka_producer_messages',
+    'Сообщения продюсеров по результату доставки',
+    ['client', 'result']
+)
+SPOOL_MESSAGES = Counter(
+    'kafka_spool_messages',
+    'Сообщения, записанные в журнал и отправленные из него',
+    ['client', 'action']
+)
+CLIENT_QUEUE_MESSAGES = Gauge(
+    'kafka_client_queue_messages',
+    'Сообщения в очереди librdkafka (statistics msg_cnt)',
+    ['client'],
+    multiprocess_mode='livesum'
+)
+CLIENT_QUEUE_BYTES = Gauge(
+    'kafka_client_queue_bytes',
+    'Объем очереди librdkafka (statistics msg_size)',
+    ['client'],
+    multiprocess_mode='livesum'
+)
+BROKER_RTT_SECONDS = Gauge(
+    'kafka_broker_rtt_seconds',
+    'Время ответа брокера (statistics rtt)',
+    ['client', 'broker', 'stat'],
+    multiprocess_mode='livemax'
+)
+BROKER_OUTBUF_MESSAGES = Gauge(
+    'kafka_broker_outbuf_messages',
+    'Запросы к брокеру, ожидающие отправки и ответа',
+    ['client', 'broker', 'state'],
+    multiprocess_mode='livesum'
+)
+CONSUMER_LAG = Gauge(
+    'kafka_consumer_lag',
+    'Отставание консьюмера по партиции (statistics consumer_lag)',
+    ['group', 'topic', 'partition'],
+    multiprocess_mode='livemax'
+)
+CONSUMER_MESSAGES = Counter(
+    'kafka_consumer_messages',
+    'Обработанные консьюмером сообщения',
+    ['consumer']
+)
+CONSUMER_BATCH_SIZE = Histogram(
+    'kafka_consumer_batch_size',
+    'Размер пачки пакетного консьюмера',
+    ['consumer'],
+    buckets=BATCH_BUCKETS
+)
+CONSUMER_COMMIT_MESSAGES = Histogram(
+    'kafka_consumer_commit_messages',
+    'Сообщений на один коммит оффсетов',
+    ['consumer'],
+    buckets=BATCH_BUCKETS
+)
+CONSUMER_COMMIT_SECONDS = Histogram(
+    'kafka_consumer_commit_seconds',
+    'Задержка коммита оффсетов',
+    ['consumer', 'mode'],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+)
+CONSUMER_COMMIT_ERRORS = Counter(
+    'kafka_consumer_commit_errors',
+    'Ошибки коммита оффсетов',
+    ['consumer']
+)
+CONSUMER_FAILED_MESSAGES = Counter(
+    'kafka_consumer_failed_messages',
+    'Сообщения, пропущенные после ошибки обработки',
+    ['consumer']
+)
+TRACE_BUCKETS = (
+    .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30
+)
+TRACE_HOP_SECONDS = Histogram(
+    'kafka_trace_hop_seconds',
+    'Задержка перехода между этапами трассировки',
+    ['topic', 'hop'],
+    buckets=TRACE_BUCKETS
+)
+TRACE_TOTAL_SECONDS = Histogram(
+    'kafka_trace_total_seconds',
+    'Задержка от приема запроса API до этапа stage',
+    ['topic', 'stage'],
+    buckets=TRACE_BUCKETS
+)
+
+
+def registry():
+    """Реестр для выдачи метрик всех процессов."""
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    collector_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collector_registry)
+    return collector_registry
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Метрики в текстовом формате Prometheus."""
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """Убирает live-метрики завершенного процесса."""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        multiprocess.mark_process_dead(pid)
+
+
+def start_metrics_server(port: int):
+    """HTTP-сервер метрик для процессов без API (сервис консьюмеров)."""
+    start_http_server(port, registry=registry())
+    logger.info(f"Метрики доступны на порту {port}")
+
+
+def statistics_conf(stats_cb) -> dict:
+    """Параметры статистики librdkafka для конфигурации клиента."""
+    if not settings.kafka_statistics_interval_ms:
+        return {}
+    return {
+        'statistics.interval.ms': settings.kafka_statistics_interval_ms,
+        'stats_cb': stats_cb
+    }
+
+
+class KafkaStatsCollector:
+    """
+    Обработчик stats_cb: очередь клиента, брокеры и отставание
+    консьюмера по партициям из JSON-статистики librdkafka.
+    """
+
+    def __init__(self, client: str, group: str = None):
+        self.client = client
+        self.group = group
+
+    def __call__(self, stats_json: str):
+        try:
+            self.collect(json.loads(stats_json))
+        except Exception as e:
+            logger.error(f"Ошибка обработки статистики librdkafka: {e}")
+
+    def collect(self, stats: dict):
+        CLIENT_QUEUE_MESSAGES.labels(self.client).set(stats['msg_cnt'])
+        CLIENT_QUEUE_BYTES.labels(self.client).set(stats['msg_size'])
+        for name, broker in stats.get('brokers', {}).items():
+            if broker.get('nodeid', -1) < 0:
+                # Bootstrap и служебные соединения
+                continue
+            rtt = broker.get('rtt', {})
+            for stat in ('avg', 'p99'):
+                BROKER_RTT_SECONDS.labels(self.client, name, stat).set(
+                    rtt.get(stat, 0) / 1e6
+                )
+            for state in ('outbuf', 'waitresp'):
+                BROKER_OUTBUF_MESSAGES.labels(self.client, name, state).set(
+                    broker.get(f'{state}_msg_cnt', 0)
+                )
+        if self.group is None:
+            return
+        for topic, topic_stats in stats.get('topics', {}).items():
+            for partition, partition_stats in topic_stats.get(
+                'partitions', {}
+            ).items():
+                if partition == '-1':
+                    continue
+                lag = partition_stats.get('consumer_lag', -1)
+                if partition_stats.get('fetch_state') == 'none' or lag < 0:
+                    # Партиция не назначена этому процессу
+                    lag = 0
+                CONSUMER_LAG.labels(self.group, topic, partition).set(lag)
+
+
+class CommitTimer:
+    """
+    Задержка коммита оффсетов: синхронного - по времени вызова,
+    асинхронного - до on_commit. Вызывается из потока poll консьюмера,
+    где выполняются и коммиты, и on_commit.
+
+    on_commit вызывается и для синхронных коммитов, поэтому очередь
+    хранит все отправленные коммиты по порядку (None - синхронный),
+    и задержка записывается только для асинхронных.
+    """
+
+    def __init__(self, consumer: str):
+        self.consumer = consumer
+        # Время отправки коммитов, ожидающих on_commit
+        self._commits = deque()
+        self._async = CONSUMER_COMMIT_SECONDS.labels(consumer, 'async')
+        self._sync = CONSUMER_COMMIT_SECONDS.labels(consumer, 'sync')
+        self._messages = CONSUMER_COMMIT_MESSAGES.labels(consumer)
+
+    def committed(
+            self,
+            started: float,
+            asynchronous: bool,
+            messages: int = None
+    ):
+        """Коммит отправлен (started - time.perf_counter() до вызова)."""
+        if messages:
+            self._messages.observe(messages)
+        if asynchronous:
+            self._commits.append(started)
+        else:
+            self._sync.observe(time.perf_counter() - started)
+            self._commits.append(None)
+
+    def completed(self, err=None):
+        """on_commit: коммит завершен."""
+        if err and err.code() != KafkaError._NO_OFFSET:
+            CONSUMER_COMMIT_ERRORS.labels(self.consumer).inc()
+        if not self._commits:
+            return
+        started = self._commits.popleft()
+        if started is not None:
+            self._async.observe(time.perf_counter() - started)
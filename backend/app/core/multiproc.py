@@ -0,0 +1,32 @@
+"""
+Каталог метрик режима multiprocess prometheus_client.
+
+Режим включается, только если задан PROMETHEUS_MULTIPROC_DIR:
+явно в окружении или лаунчером (main.py, gunicorn_conf.py,
+kafka_client.worker), который перед запуском процессов очищает каталог
+METRICS_MULTIPROC_DIR от файлов прошлых запусков. Модуль не импортирует
+prometheus_client, поэтому вызывается до импорта core.metrics.
+"""
+import os
+import shutil
+from typing import Optional
+
+from core.config import settings
+
+
+def prepare_multiproc_dir() -> Optional[str]:
+    """
+    Очищает каталог метрик и передает его процессам через
+    PROMETHEUS_MULTIPROC_DIR. None - каталог не задан, у каждого
+    процесса свой реестр.
+    """
+    path = (
+        os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+        or settings.metrics_multiproc_dir
+    )
+    if not path:
+        return None
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = path
+    return path
@@ -1,8 +1,45 @@
 from multiprocessing import cpu_count
 
+from core.config import settings
 
-bind = "127.0.0.1:9000"
 
+bind = f"{settings.host}:{settings.port}"
 
-workers = cpu_count() + 1
+
+workers = settings.web_concurrency or cpu_count() + 1
 worker_class = 'uvicorn.workers.UvicornWorker'
+
+
+def on_starting(server):
+    """
+    Удаляет файлы метрик прошлого запуска и включает режим
+    multiprocess до старта воркеров.
+    """
+    from core.multiproc import prepare_multiproc_dir
+    prepare_multiproc_dir()
+
+
+def child_exit(server, worker):
+    """Убирает live-метрики завершенного воркера."""
+    from core.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    """
+    Клиенты Kafka и Schema Registry, унаследованные от мастера,
+    после fork непригодны: каждый воркер создает свои в startup.
+    """
+    from kafka_client.producer import reset_producer
+    from kafka_client.producer_plain import reset_plain_producer
+    reset_producer()
+    reset_plain_producer()
+
+
+def worker_exit(server, worker):
+    """Дожидается доставки сообщений воркера перед его завершением."""
+    from kafka_client import producer, producer_plain
+    for instance in (producer.producer_instance,
+                     producer_plain.producer_instance):
+        if instance is not None:
+            instance.close()
@@ -0,0 +1,494 @@
+"""Базовый асинхронный продюсер кафка."""
+import asyncio
+import os
+import threading
+import time
+from functools import partial
+from typing import Optional
+
+from confluent_kafka import KafkaError, KafkaException
+
+from core.config import settings, logger
+from core.metrics import (PRODUCER_DELIVERY_SECONDS, PRODUCER_MESSAGES,
+                          SPOOL_MESSAGES, KafkaStatsCollector,
+                          statistics_conf)
+from kafka_client.spool import (CircuitBreaker, DiskSpool, SpoolDrainer,
+                                SpoolRecord)
+from kafka_client.tracing import STAGE_REPLAY, extend_headers, trace_headers
+from kafka_client.transport import create_producer
+
+
+NOT_QUEUED = 'Сообщение не поставлено в очередь продюсера'
+# Ошибки доставки, после которых сообщение уходит в журнал
+SPOOLED_ERRORS = {
+    KafkaError._MSG_TIMED_OUT,
+    KafkaError._TIMED_OUT,
+    KafkaError._TRANSPORT,
+    KafkaError._ALL_BROKERS_DOWN,
+    KafkaError._PURGE_QUEUE,
+}
+
+
+def to_record(
+    topic: str,
+    key: Optional[bytes],
+    value,
+    partition: Optional[int] = None
+) -> SpoolRecord:
+    """
+    Сообщение для deliver_batch и журнала (значение в байтах)
+    с заголовками трассировки текущего запроса.
+    """
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return topic, key, value, partition, trace_headers()
+
+
+def produce_kwargs(record: SpoolRecord) -> dict:
+    """Необязательные аргументы produce для записи."""
+    _, _, _, partition, headers = record
+    kwargs = {}
+    if partition is not None:
+        kwargs['partition'] = partition
+    if headers:
+        kwargs['headers'] = headers
+    return kwargs
+
+
+class ProducerOverloaded(Exception):
+    """
+    Продюсер перегружен: превышены лимиты сообщений в полете или
+    очереди librdkafka. API отвечает 429 с заголовком Retry-After.
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AsyncDeliveryProducer:
+    """
+    Базовый продюсер кафка с asyncio-совместимой отправкой.
+
+    Фоновый поток вызывает poll() и обрабатывает delivery callback'и,
+    результат доставки каждого сообщения передается в asyncio.Future,
+    которое ожидает эндпоинт. Поэтому flush после каждого сообщения
+    не нужен, и librdkafka может собирать сообщения в пачки.
+
+    Если кластер недоступен, сообщения пишутся в локальный журнал
+    (SPOOL_ENABLED), а фоновый поток отправляет их по порядку,
+    когда брокеры вернутся. В журнал попадают только сообщения,
+    от которых librdkafka отказался (отчет о доставке с ошибкой):
+    message.timeout.ms не больше delivery_timeout, поэтому медленный
+    брокер не доставит позже копию уже записанного в журнал сообщения.
+    """
+    poll_timeout: float = 0.1
+    # Запас ожидания отчета о доставке сверх message.timeout.ms
+    delivery_grace: float = 1.0
+    # Шаг ожидания места в очереди librdkafka
+    queue_wait_step: float = 0.005
+
+    def __init__(self, conf: dict, delivery_timeout: float = 5.0):
+        self.delivery_timeout = delivery_timeout
+        # Лимиты допуска сообщений (0 - без лимита)
+        self.max_in_flight = settings.producer_max_in_flight
+        self.max_queue_depth = settings.producer_max_queue_depth
+        self.queue_wait = settings.producer_queue_wait
+        self.retry_after = settings.producer_retry_after
+        self.breaker = CircuitBreaker(
+            settings.breaker_failure_threshold,
+            settings.breaker_reset_timeout
+        )
+        self.spool: Optional[DiskSpool] = None
+        self._drainer: Optional[SpoolDrainer] = None
+        client_id = conf.get('client.id', 'producer')
+        # Метрики доставки и статистика librdkafka (stats_cb)
+        self._delivery_seconds = PRODUCER_DELIVERY_SECONDS.labels(client_id)
+        self._delivered = PRODUCER_MESSAGES.labels(client_id, 'delivered')
+        self._failed = PRODUCER_MESSAGES.labels(client_id, 'failed')
+        self._spooled = SPOOL_MESSAGES.labels(client_id, 'spooled')
+        conf = {
+            # librdkafka отказывается от сообщения до истечения
+            # ожидания доставки, а не через 300 с по умолчанию
+            'message.timeout.ms': int(delivery_timeout * 1000),
+            **conf,
+            **statistics_conf(KafkaStatsCollector(client_id))
+        }
+        if settings.spool_enabled:
+            conf['error_cb'] = self._on_error
+        self.producer = create_producer(conf)
+        # Ожидающие подтверждения доставки futures (только из event loop)
+        self._pending: set[asyncio.Future] = set()
+        # Event loop, из которого отправляются сообщения
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = True
+        self._poll_thread = threading.Thread(
+            target=self._poll_loop,
+            daemon=True,
+            name=f"{client_id}-poll"
+        )
+        self._poll_thread.start()
+        if settings.spool_enabled:
+            # Свой каталог журнала у каждого продюсера и процесса
+            self.spool = DiskSpool(
+                os.path.join(settings.spool_dir, client_id),
+                settings.spool_segment_bytes,
+                settings.spool_fsync
+            )
+            self._drainer = SpoolDrainer(
+                self.spool,
+                self.breaker,
+                self._produce_spooled,
+                self._probe_cluster,
+                settings.spool_drain_batch,
+                delivery_timeout * 2,
+                client=client_id
+            )
+            self._drainer.start()
+
+    def _poll_loop(self):
+        """Фоновая обработка событий продюсера."""
+        while self._running:
+            try:
+                self.producer.poll(self.poll_timeout)
+            except Exception as e:
+                logger.error(f"Ошибка в потоке poll продюсера: {e}")
+
+    def _on_error(self, err: KafkaError):
+        """
+        Ошибки клиента librdkafka. Когда недоступны все брокеры,
+        размыкатель открывается и новые сообщения сразу пишутся в журнал.
+        Еще не отправленные сообщения удаляются из очереди: их отчеты
+        о доставке приходят с _PURGE_QUEUE, а отправленные брокеру
+        завершаются доставкой или _MSG_TIMED_OUT, и только тогда
+        сообщение попадает в журнал.
+        """
+        if err.code() != KafkaError._ALL_BROKERS_DOWN:
+            logger.debug(f"Ошибка клиента Kafka: {err}")
+            return
+        self.breaker.trip()
+        self.producer.purge(in_queue=True, in_flight=False, blocking=False)
+
+    def _probe_cluster(self) -> bool:
+        """Проверка доступности кластера запросом метаданных."""
+        try:
+            self.producer.list_topics(timeout=self.delivery_timeout)
+            return True
+        except KafkaException:
+            return False
+
+    def _produce_spooled(
+        self,
+        topic,
+        key,
+        value,
+        partition,
+        headers,
+        callback
+    ):
+        """Отправка сообщения из журнала (из потока SpoolDrainer)."""
+        kwargs = produce_kwargs((
+            topic,
+            key,
+            value,
+            partition,
+            extend_headers(headers, STAGE_REPLAY)
+        ))
+        self.producer.produce(
+            topic=topic,
+            key=key,
+            value=value,
+            callback=callback,
+            **kwargs
+        )
+
+    def delivery_callback(self, err, msg):
+        """Callback для отслеживания доставки сообщений"""
+
+    def _on_delivery(self, future, loop, started, err, msg):
+        """Передает результат доставки в future из потока poll."""
+        if err:
+            self._failed.inc()
+        else:
+            self._delivered.inc()
+            self._delivery_seconds.observe(time.perf_counter() - started)
+        self.delivery_callback(err, msg)
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is loop:
+            # flush() вызван из самого event loop (например, при close)
+            self._resolve(future, err, msg)
+            return
+        try:
+            loop.call_soon_threadsafe(self._resolve, future, err, msg)
+        except RuntimeError:
+            # Event loop уже закрыт, ожидать результат некому
+            pass
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, err, msg):
+        if future.done():
+            return
+        if err:
+            future.set_exception(KafkaException(err))
+        else:
+            future.set_result(msg)
+
+    def should_spool(self) -> bool:
+        """
+        Сообщения пишутся в журнал, пока размыкатель открыт, и пока
+        журнал не отправлен целиком, чтобы не нарушать порядок.
+        """
+        return self.spool is not None and (
+            self.spool.has_pending()
+            or self.breaker.state == CircuitBreaker.OPEN
+        )
+
+    @staticmethod
+    def is_spoolable(error: BaseException) -> bool:
+        """
+        Отчет о доставке с ошибкой из-за недоступности кластера,
+        а не самого сообщения. Истечение ожидания future не считается:
+        сообщение может оставаться в очереди librdkafka.
+        """
+        if isinstance(error, KafkaException) and \
+                isinstance(error.args[0], KafkaError):
+            return error.args[0].code() in SPOOLED_ERRORS \
+                or error.args[0].retriable()
+        return False
+
+    async def spool_records(self, records: list[SpoolRecord]):
+        """Запись сообщений в журнал вне event loop (fsync)."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.spool.append, records)
+        self._spooled.inc(len(records))
+
+    def admit(self, count: int = 1):
+        """
+        Проверяет, можно ли принять еще count сообщений,
+        иначе выбрасывает ProducerOverloaded. Пачка больше лимита
+        принимается, только когда продюсер ничего не ждет.
+        Пока сообщения пишутся в журнал, лимиты не применяются.
+        """
+        if self.should_spool():
+            return
+        in_flight = len(self._pending)
+        if self.max_in_flight and in_flight and \
+                in_flight + count > self.max_in_flight:
+            raise ProducerOverloaded(
+                f"Превышен лимит сообщений в полете: {in_flight}",
+                self.retry_after
+            )
+        queue_depth = len(self.producer)
+        if self.max_queue_depth and queue_depth and \
+                queue_depth + count > self.max_queue_depth:
+            raise ProducerOverloaded(
+                f"Превышен лимит очереди продюсера: {queue_depth}",
+                self.retry_after
+            )
+
+    async def produce_waiting(
+        self,
+        topic: str,
+        key: Optional[bytes],
+        value,
+        **kwargs
+    ) -> asyncio.Future:
+        """
+        produce_async, который при переполненной очереди librdkafka
+        (BufferError) ждет освобождения места не дольше queue_wait.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.queue_wait
+        while True:
+            try:
+                return self.produce_async(topic, key, value, **kwargs)
+            except BufferError:
+                if loop.time() >= deadline:
+                    raise ProducerOverloaded(
+                        "Очередь продюсера переполнена",
+                        self.retry_after
+                    )
+                await asyncio.sleep(self.queue_wait_step)
+
+    def produce_async(
+        self,
+        topic: str,
+        key: Optional[bytes],
+        value,
+        **kwargs
+    ) -> asyncio.Future:
+        """
+        Ставит сообщение в очередь librdkafka и возвращает future,
+        которое завершится после подтверждения доставки брокером.
+        """
+        loop = self._loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.producer.produce(
+            topic=topic,
+            key=key,
+            value=value,
+            callback=partial(
+                self._on_delivery,
+                future,
+                loop,
+                time.perf_counter()
+            ),
+            **kwargs
+        )
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return future
+
+    async def wait_delivery(self, future: asyncio.Future):
+        """
+        Ожидание отчета о доставке: librdkafka отправляет его
+        не позже message.timeout.ms (delivery_timeout).
+        """
+        return await asyncio.wait_for(
+            future,
+            self.delivery_timeout + self.delivery_grace
+        )
+
+    async def wait_batch_delivery(
+        self,
+        futures: list[Optional[asyncio.Future]]
+    ) -> list[Optional[str]]:
+        """
+        Ожидание доставки пачки сообщений.
+        Возвращает для каждого сообщения None или текст ошибки.
+        """
+        waiting = [future for future in futures if future is not None]
+        if waiting:
+            _, not_done = await asyncio.wait(
+                waiting,
+                timeout=self.delivery_timeout + self.delivery_grace
+            )
+            for future in not_done:
+                future.cancel()
+        errors = []
+        for future in futures:
+            if future is None:
+                errors.append(NOT_QUEUED)
+            elif future.cancelled():
+                errors.append('Превышено время ожидания доставки')
+            elif future.exception() is not None:
+                errors.append(str(future.exception()))
+            else:
+                errors.append(None)
+        return errors
+
+    async def deliver(
+        self,
+        topic: str,
+        key: Optional[bytes],
+        value,
+        partition: Optional[int] = None
+    ):
+        """
+        Отправка сообщения с ожиданием доставки. Если кластер
+        недоступен, сообщение принимается в журнал.
+        """
+        await self.deliver_record(to_record(topic, key, value, partition))
+
+    async def deliver_record(self, record: SpoolRecord):
+        """deliver для готовой записи (см. to_record)."""
+        if self.should_spool():
+            await self.spool_records([record])
+            return
+        topic, key, value, _, _ = record
+        future = await self.produce_waiting(
+            topic,
+            key,
+            value,
+            **produce_kwargs(record)
+        )
+        try:
+            await self.wait_delivery(future)
+        except Exception as e:
+            if self.spool is None or not self.is_spoolable(e):
+                raise
+            logger.warning(f"Сообщение записано в журнал: {e!r}")
+            self.breaker.record_failure()
+            await self.spool_records([record])
+            return
+        self.breaker.record_success()
+
+    async def deliver_batch(
+        self,
+        records: list[Optional[SpoolRecord]]
+    ) -> list[Optional[str]]:
+        """
+        Отправка пачки сообщений (None - сообщение не удалось
+        сериализовать). Недоставленные из-за недоступности кластера
+        сообщения принимаются в журнал.
+        Возвращает для каждого сообщения None или текст ошибки.
+        """
+        if self.should_spool():
+            await self.spool_records(
+                [record for record in records if record is not None]
+            )
+            return [None if record else NOT_QUEUED for record in records]
+        futures = []
+        for record in records:
+            if record is None:
+                futures.append(None)
+                continue
+            topic, key, value, _, _ = record
+            try:
+                futures.append(await self.produce_waiting(
+                    topic,
+                    key,
+                    value,
+                    **produce_kwargs(record)
+                ))
+            except Exception as e:
+                logger.error(f"Ошибка при отправке сообщения в Kafka: {e}")
+                futures.append(None)
+        errors = await self.wait_batch_delivery(futures)
+        if self.spool is None:
+            return errors
+        spooled = []
+        for index, (record, future) in enumerate(zip(records, futures)):
+            if future is None or future.cancelled() or \
+                    not self.is_spoolable(future.exception()):
+                continue
+            spooled.append(record)
+            errors[index] = None
+        if spooled:
+            logger.warning(
+                f"В журнал записано сообщений пачки: {len(spooled)}"
+            )
+            self.breaker.record_failure()
+            await self.spool_records(spooled)
+        elif any(future is not None for future in futures):
+            self.breaker.record_success()
+        return errors
+
+    def close(self):
+        """Закрытие продюсера с ожиданием недоставленных сообщений"""
+        if not self._running:
+            return
+        self._running = False
+        if self._drainer is not None:
+            self._drainer.stop()
+        self._poll_thread.join(timeout=self.poll_timeout * 10)
+        try:
+            remaining = self.producer.flush(timeout=10)
+            if remaining:
+                logger.error(
+                    f"При закрытии продюсера не доставлено "
+                    f"{remaining} сообщений"
+                )
+        except Exception as e:
+            logger.error(f"Ошибка при закрытии продюсера: {e}")
+        for future in list(self._pending):
+            if not future.done():
+                future.set_exception(
+                    KafkaException('Продюсер закрыт до подтверждения доставки')
+                )
+        self._pending.clear()
+        if self.spool is not None:
+            self.spool.close()
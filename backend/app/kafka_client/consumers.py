@@ -1,35 +1,73 @@
-from confluent_kafka import Consumer, KafkaError
-from confluent_kafka.schema_registry import SchemaRegistryClient
-from confluent_kafka.schema_registry.json_schema import JSONSerializer, JSONDeserializer
+from confluent_kafka import KafkaError, TopicPartition
 from confluent_kafka.serialization import (
     SerializationContext,
     MessageField
 )
 import threading
+import time
 
 from core.config import logger
+from core.metrics import (CONSUMER_BATCH_SIZE, CONSUMER_FAILED_MESSAGES,
+                          CONSUMER_MESSAGES,
+                          CommitTimer, KafkaStatsCollector, statistics_conf)
+from kafka_client.executor import PartitionExecutor
+from kafka_client.offsets import OffsetCommitter
+from kafka_client.routing import KeyRouter
+from kafka_client.schema_cache import get_schema_registry_client
+from kafka_client.formats import FORMAT_JSON, make_value_deserializer
+from kafka_client.serde import deserialize_batch
+from kafka_client.tracing import TraceRecorder, now_us
+from kafka_client.transport import create_consumer
 
 
 class SingleMessageConsumer:
     """Консьюмер единичных сообщений."""
-    def __init__(self, bootstrap_servers, topic, group_id, schema_registry_url, schema_str=None):
+    message_key = 'one'
+
+    def __init__(self, bootstrap_servers, topic, group_id, schema_registry_url, schema_str=None, commit_every=100, commit_interval=1.0, router=None, workers=1, max_queue=1000, message_format=FORMAT_JSON):
         self.config = {
             'bootstrap.servers': bootstrap_servers,
             'group.id': group_id,  # УНИКАЛЬНЫЙ group.id
             'auto.offset.reset': 'earliest',
             'enable.auto.commit': False,  # Отключаем авто-коммит
+            'enable.auto.offset.store': False,  # Оффсеты сохраняем сами
             'fetch.min.bytes': 1,  # Минимум 1 байт для быстрого ответа
-            'fetch.wait.max.ms': 100  # Ждем максимум 100 мс
+            'fetch.wait.max.ms': 100,  # Ждем максимум 100 мс
+            'on_commit': self.commit_callback,
+            # Очередь и отставание по партициям для метрик
+            **statistics_conf(KafkaStatsCollector('single-consumer', group_id))
         }
-        self.consumer = Consumer(self.config)
+        self.consumer = create_consumer(self.config)
+        self.commit_timer = CommitTimer('single')
+        self.tracer = TraceRecorder('single_consumer')
+        self._consumed = CONSUMER_MESSAGES.labels('single')
+        # Ошибка обработки: сообщение пропускается (в пуле и без него)
+        self._failed = CONSUMER_FAILED_MESSAGES.labels('single')
+        self.offsets = OffsetCommitter(
+            self.consumer,
+            commit_every=commit_every,
+            commit_interval=commit_interval,
+            commit_timer=self.commit_timer
+        )
+        # Пул обработки по партициям (при workers > 1)
+        self.executor = None
+        if workers > 1:
+            self.executor = PartitionExecutor(
+                self.consumer,
+                self.handle_message,
+                workers=workers,
+                max_queue=max_queue,
+                name='single-consumer',
+                on_error=self._failed.inc
+            )
         self.topic = topic
-        schema_registry_conf = {'url': schema_registry_url}
-        self.schema_registry_client = SchemaRegistryClient(schema_registry_conf)
-        # Инициализация JSONDeserializer с обязательным параметром schema_str
+        self.schema_registry_client = get_schema_registry_client(schema_registry_url)
+        # Инициализация десериализатора (JSON, Avro или Protobuf)
         if schema_str:
-            self.json_deserializer = JSONDeserializer(
-                schema_str=schema_str,
-                schema_registry_client=self.schema_registry_client
+            self.json_deserializer = make_value_deserializer(
+                message_format,
+                schema_str,
+                self.schema_registry_client
             )
         else:
             # Получить схему из Schema Registry
@@ -37,9 +75,10 @@ class SingleMessageConsumer:
                 subject = f"{topic}-value"
                 schema_response = self.schema_registry_client.get_latest_version(subject)
                 schema_str = schema_response.schema.schema_str
-                self.json_deserializer = JSONDeserializer(
-                    schema_str=schema_str,
-                    schema_registry_client=self.schema_registry_client
+                self.json_deserializer = make_value_deserializer(
+                    message_format,
+                    schema_str,
+                    self.schema_registry_client
                 )
                 logger.info(f"Схема получена из Schema Registry: {subject}")
             except Exception as e:
@@ -48,32 +87,69 @@ class SingleMessageConsumer:
                     e
                 )
                 raise
-        self.consumer.subscribe([self.topic])
+        # Подписка только на свою часть трафика
+        self.router = router or KeyRouter(topic)
+        self.router.attach(
+            self.consumer,
+            self.message_key,
+            on_revoke=self.on_revoke
+        )
+        self._running = True
         logger.info(f"SingleMessageConsumer запущен. Группа: {
             self.config['group.id']
         }")
 
+    def stop(self):
+        """Останавливает цикл run(), консьюмер закрывается в run()."""
+        self._running = False
+
+    def commit_callback(self, err, partitions):
+        """Результат асинхронного коммита оффсетов."""
+        self.commit_timer.completed(err)
+        if err:
+            logger.error("Ошибка коммита оффсетов: %s", err)
+        else:
+            logger.debug(f"Закоммичены оффсеты: {partitions}")
+
+    def on_revoke(self, consumer, partitions):
+        """Дообработка и коммит сообщений перед отзывом партиций."""
+        if self.executor:
+            self.offsets.store_offsets(self.executor.drain(partitions))
+        self.offsets.on_revoke(consumer, partitions)
+
+    def handle_message(self, msg):
+        # Проверяем ключ сообщения
+        if msg.key() and msg.key().decode('utf-8') == 'one':
+            self.tracer.record(msg.topic(), msg.headers())
+            serialization_context = SerializationContext(self.topic, MessageField.VALUE)
+            value = self.json_deserializer(msg.value(), serialization_context)
+            logger.info(f"Обработка одиночного сообщения: key={msg.key()}, value={value}")
+        else:
+            logger.debug(f"Пропуск сообщения с ключом: {msg.key()}")
+
     def process_message(self, msg):
+        self._consumed.inc()
+        if self.executor:
+            # Обработка в пуле, оффсет сохраняется после завершения
+            self.executor.submit(msg.topic(), msg.partition(), msg.offset(), msg)
+            return
         try:
-            # Проверяем ключ сообщения
-            if msg.key() and msg.key().decode('utf-8') == 'one':
-                serialization_context = SerializationContext(self.topic, MessageField.VALUE)
-                value = self.json_deserializer(msg.value(), serialization_context)
-                logger.info(f"Обработка одиночного сообщения: key={msg.key()}, value={value}")
-            else:
-                logger.debug(f"Пропуск сообщения с ключом: {msg.key()}")
-            # КОММИТ ОФФСЕТА ПОСЛЕ ОБРАБОТКИ
-            self.consumer.commit(message=msg, asynchronous=False)
-            logger.info(f"Закоммичен оффсет: partition={msg.partition()}, offset={msg.offset()}")
-
+            self.handle_message(msg)
         except Exception as e:
-            logger.error("Ошибка обработки сообщения: %s", e)
+            logger.error("Ошибка обработки сообщения, сообщение "
+                         "пропущено: %s", e)
+            self._failed.inc()
+        # ОФФСЕТ СОХРАНЯЕТСЯ ПОСЛЕ ОБРАБОТКИ, КОММИТ АСИНХРОННЫЙ
+        self.offsets.store(msg)
 
     def run(self):
         try:
-            while True:
+            while self._running:
                 msg = self.consumer.poll(timeout=1.0)
+                if self.executor:
+                    self.offsets.store_offsets(self.executor.collect_completed())
                 if msg is None:
+                    self.offsets.maybe_commit()
                     continue
                 if msg.error():
                     if msg.error().code() == KafkaError._PARTITION_EOF:
@@ -87,29 +163,58 @@ class SingleMessageConsumer:
         except KeyboardInterrupt:
             logger.info("Остановка консьюмера...")
         finally:
+            if self.executor:
+                self.offsets.store_offsets(self.executor.drain())
+                self.executor.shutdown()
+            self.offsets.flush()
             self.consumer.close()
 
 
 class BatchMessageConsumer:
     """Пакетный консьюмер."""
-    def __init__(self, bootstrap_servers, topic, group_id, schema_registry_url, schema_str=None):
+    message_key = 'many'
+
+    def __init__(
+            self,
+            bootstrap_servers,
+            topic,
+            group_id,
+            schema_registry_url,
+            schema_str=None,
+            max_batch_size=500,
+            max_batch_wait=1.0,
+            max_batch_bytes=1048576,
+            router=None,
+            workers=1,
+            max_queue=1000,
+            message_format=FORMAT_JSON
+    ):
         self.config = {
             'bootstrap.servers': bootstrap_servers,
             'group.id': group_id,  # ДРУГОЙ УНИКАЛЬНЫЙ group.id
             'auto.offset.reset': 'earliest',
             'enable.auto.commit': False,
             'fetch.min.bytes': 10240,  # Ждем минимум ~10КБ данных
-            'fetch.wait.max.ms': 5000  # Ждем до 5 секунд для накопления
+            'fetch.wait.max.ms': 5000,  # Ждем до 5 секунд для накопления
+            'on_commit': self.commit_callback,
+            # Очередь и отставание по партициям для метрик
+            **statistics_conf(KafkaStatsCollector('batch-consumer', group_id))
         }
-        self.consumer = Consumer(self.config)
+        self.consumer = create_consumer(self.config)
+        self.commit_timer = CommitTimer('batch')
+        self.tracer = TraceRecorder('batch_consumer')
+        self._consumed = CONSUMER_MESSAGES.labels('batch')
+        # Ошибка обработки: пачка пропускается (в пуле и без него)
+        self._failed = CONSUMER_FAILED_MESSAGES.labels('batch')
+        self._batch_size = CONSUMER_BATCH_SIZE.labels('batch')
         self.topic = topic
-        schema_registry_conf = {'url': schema_registry_url}
-        self.schema_registry_client = SchemaRegistryClient(schema_registry_conf)
-        # Инициализация JSONDeserializer с обязательным параметром schema_str
+        self.schema_registry_client = get_schema_registry_client(schema_registry_url)
+        # Инициализация десериализатора (JSON, Avro или Protobuf)
         if schema_str:
-            self.json_deserializer = JSONDeserializer(
-                schema_str=schema_str,
-                schema_registry_client=self.schema_registry_client
+            self.json_deserializer = make_value_deserializer(
+                message_format,
+                schema_str,
+                self.schema_registry_client
             )
         else:
             # Получить схему из Schema Registry
@@ -117,9 +222,10 @@ class BatchMessageConsumer:
                 subject = f"{topic}-value"
                 schema_response = self.schema_registry_client.get_latest_version(subject)
                 schema_str = schema_response.schema.schema_str
-                self.json_deserializer = JSONDeserializer(
-                    schema_str=schema_str,
-                    schema_registry_client=self.schema_registry_client
+                self.json_deserializer = make_value_deserializer(
+                    message_format,
+                    schema_str,
+                    self.schema_registry_client
                 )
                 logger.info(f"Схема получена из Schema Registry: {subject}")
             except Exception as e:
@@ -127,68 +233,235 @@ class BatchMessageConsumer:
                     "Не удалось получить схему из Schema Registry: %s", e
                 )
                 raise
-        self.consumer.subscribe([self.topic])
-        self.batch_size = 10
+        # Подписка только на свою часть трафика
+        self.router = router or KeyRouter(topic)
+        self.router.attach(
+            self.consumer,
+            self.message_key,
+            on_revoke=self.on_revoke
+        )
+        # Пул обработки по партициям (при workers > 1)
+        self.executor = None
+        if workers > 1:
+            self.executor = PartitionExecutor(
+                self.consumer,
+                self.handle_batch,
+                workers=workers,
+                max_queue=max_queue,
+                name='batch-consumer',
+                on_error=self._failed.inc
+            )
+        # Границы пачки: количество сообщений, время ожидания и объем
+        self.max_batch_size = max_batch_size
+        self.max_batch_wait = max_batch_wait
+        self.max_batch_bytes = max_batch_bytes
+        # Сообщения последнего consume(), не вошедшие в пачку по объему:
+        # с них начинается следующая пачка
+        self._leftover = []
+        # Последние оффсеты пачек, закоммиченные асинхронно (без пула):
+        # повторяются синхронным коммитом при отзыве партиций и закрытии
+        self._last_offsets = {}
+        self._running = True
         logger.info(f"BatchMessageConsumer запущен. Группа: {
             self.config['group.id']
         }")
 
+    def stop(self):
+        """Останавливает цикл run(), консьюмер закрывается в run()."""
+        self._running = False
+
+    def commit_callback(self, err, partitions):
+        """Результат асинхронного коммита оффсетов."""
+        self.commit_timer.completed(err)
+        if err:
+            logger.error("Ошибка коммита пачки: %s", err)
+        else:
+            logger.debug(f"Закоммичены оффсеты: {partitions}")
+
+    def collect_batch(self):
+        """
+        Собирает пачку через consume() до заполнения по количеству
+        или объему либо до истечения времени ожидания.
+
+        Объем проверяется по каждому сообщению: сообщение, с которым
+        пачка превысила бы max_batch_bytes, и остаток consume()
+        переносятся в следующую пачку. Пачка из одного сообщения
+        собирается при любом его размере.
+        """
+        messages = []
+        batch_bytes = 0
+        fetched, self._leftover = self._leftover, []
+        deadline = time.monotonic() + self.max_batch_wait
+        while True:
+            for index, msg in enumerate(fetched):
+                if msg.error():
+                    if msg.error().code() != KafkaError._PARTITION_EOF:
+                        logger.error(f"Ошибка Kafka: {msg.error()}")
+                    continue
+                size = len(msg.value() or b'')
+                if messages and (
+                        len(messages) >= self.max_batch_size
+                        or batch_bytes + size > self.max_batch_bytes
+                ):
+                    self._leftover = fetched[index:]
+                    return messages
+                messages.append(msg)
+                batch_bytes += size
+            if (len(messages) >= self.max_batch_size
+                    or batch_bytes >= self.max_batch_bytes):
+                return messages
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                return messages
+            fetched = self.consumer.consume(
+                num_messages=self.max_batch_size - len(messages),
+                timeout=timeout
+            )
+
+    @staticmethod
+    def batch_offsets(messages):
+        """Оффсеты для коммита: следующий оффсет по каждой партиции."""
+        offsets = {}
+        for msg in messages:
+            offsets[(msg.topic(), msg.partition())] = msg.offset() + 1
+        return [
+            TopicPartition(topic, partition, offset)
+            for (topic, partition), offset in offsets.items()
+        ]
+
+    def on_revoke(self, consumer, partitions):
+        """Дообработка и коммит пачек перед отзывом партиций."""
+        # Перенесенные сообщения отозванных партиций не обработаны,
+        # новый владелец прочитает их с закоммиченного оффсета
+        revoked = {(tp.topic, tp.partition) for tp in partitions}
+        self._leftover = [
+            msg for msg in self._leftover
+            if (msg.topic(), msg.partition()) not in revoked
+        ]
+        if self.executor:
+            self.commit_offsets(self.executor.drain(partitions),
+                                asynchronous=False)
+        else:
+            self.commit_last_offsets(partitions)
+
+    def commit_last_offsets(self, partitions=None):
+        """
+        Синхронно коммитит последние оффсеты пачек по партициям
+        (по всем, если partitions не заданы).
+        """
+        if partitions is None:
+            keys = list(self._last_offsets)
+        else:
+            keys = [
+                (tp.topic, tp.partition) for tp in partitions
+                if (tp.topic, tp.partition) in self._last_offsets
+            ]
+        self.commit_offsets(
+            [
+                TopicPartition(topic, partition,
+                               self._last_offsets.pop((topic, partition)))
+                for topic, partition in keys
+            ],
+            asynchronous=False
+        )
+
+    def commit_offsets(self, offsets, asynchronous=True):
+        if not offsets:
+            return
+        started = time.perf_counter()
+        try:
+            self.consumer.commit(offsets=offsets, asynchronous=asynchronous)
+        except Exception as e:
+            logger.error("Ошибка коммита пачки: %s", e)
+            return
+        self.commit_timer.committed(started, asynchronous)
+
+    def handle_batch(self, messages):
+        serialization_context = SerializationContext(self.topic, MessageField.VALUE)
+        key = self.message_key.encode()
+        messages_many = [msg for msg in messages if msg.key() == key]
+        received_us = now_us()
+        for msg in messages_many:
+            self.tracer.record(msg.topic(), msg.headers(), received_us)
+        # Десериализация всей пачки за один проход
+        values = deserialize_batch(
+            self.json_deserializer,
+            [msg.value() for msg in messages_many],
+            serialization_context
+        )
+        logger.info(
+            f"Обработана пачка: {len(values)} сообщений из {len(messages)}"
+        )
+
+    def submit_batch(self, messages):
+        """Раскладывает пачку по партициям и передает в пул."""
+        partitions = {}
+        for msg in messages:
+            partitions.setdefault((msg.topic(), msg.partition()), []).append(msg)
+        for (topic, partition), partition_messages in partitions.items():
+            self.executor.submit(
+                topic,
+                partition,
+                partition_messages[-1].offset(),
+                partition_messages,
+                size=len(partition_messages)
+            )
+
     def process_batch(self, messages):
         if not messages:
             return
+        self._consumed.inc(len(messages))
+        self._batch_size.observe(len(messages))
 
-        try:
-            for msg in messages:
-                if msg.key() and msg.key().decode('utf-8') == 'many':
-                    serialization_context = SerializationContext(self.topic, MessageField.VALUE)
-                    value = self.json_deserializer(msg.value(), serialization_context)
-                    logger.info(f"Обработка сообщения из пачки: key={msg.key()}, value={value}")
+        if self.executor:
+            self.submit_batch(messages)
+            return
 
-            # КОММИТ ВСЕЙ ПАЧКИ ОДИН РАЗ
-            self.consumer.commit(asynchronous=False)
-            logger.info(f"Закоммичена пачка из {len(messages)} сообщений")
+        try:
+            self.handle_batch(messages)
+        except Exception as e:
+            logger.error("Ошибка обработки пачки, пачка пропущена: %s", e)
+            self._failed.inc(len(messages))
 
+        # АСИНХРОННЫЙ КОММИТ ВСЕЙ ПАЧКИ ОДИН РАЗ
+        offsets = self.batch_offsets(messages)
+        started = time.perf_counter()
+        try:
+            self.consumer.commit(offsets=offsets, asynchronous=True)
         except Exception as e:
-            logger.error("Ошибка обработки пачки: %s", e)
+            logger.error("Ошибка коммита пачки: %s", e)
+            return
+        self.commit_timer.committed(started, True, len(messages))
+        for tp in offsets:
+            self._last_offsets[(tp.topic, tp.partition)] = tp.offset
 
     def run(self):
         try:
-            while True:
-                messages = []
-
-                # Собираем минимум batch_size сообщений
-                while len(messages) < self.batch_size:
-                    msg = self.consumer.poll(timeout=1.0)
-                    if msg is None:
-                        if len(messages) > 0:
-                            break  # Обрабатываем то, что накопили
-                        continue
-
-                    if msg.error():
-                        if msg.error().code() == KafkaError._PARTITION_EOF:
-                            continue
-                        else:
-                            logger.error(f"Ошибка Kafka: {msg.error()}")
-                            continue
-
-                    messages.append(msg)
-
+            while self._running:
+                messages = self.collect_batch()
                 if messages:
                     self.process_batch(messages)
+                if self.executor:
+                    self.commit_offsets(self.executor.collect_completed())
 
         except KeyboardInterrupt:
             logger.info("Остановка консьюмера...")
         finally:
+            if self.executor:
+                self.commit_offsets(self.executor.drain(), asynchronous=False)
+                self.executor.shutdown()
+            else:
+                self.commit_last_offsets()
             self.consumer.close()
 
 
-def run_consumers(bootstrap_servers: str, topic: str, single_group_id: str, batch_group_id: str, schema_registry_url: str, schema_str: str = None):
+def run_consumers(bootstrap_servers: str, topic: str, single_group_id: str, batch_group_id: str, schema_registry_url: str, schema_str: str = None, single_options: dict = None, batch_options: dict = None, router: KeyRouter = None, message_format: str = FORMAT_JSON):
     """
     Запускает оба консьюмера в отдельных потоках
     Возвращает словарь с потоками и консьюмерами для управления
     """
-    single_consumer = SingleMessageConsumer(bootstrap_servers, topic, single_group_id, schema_registry_url, schema_str)
-    batch_consumer = BatchMessageConsumer(bootstrap_servers, topic, batch_group_id, schema_registry_url, schema_str)
+    single_consumer = SingleMessageConsumer(bootstrap_servers, topic, single_group_id, schema_registry_url, schema_str, router=router, message_format=message_format, **(single_options or {}))
+    batch_consumer = BatchMessageConsumer(bootstrap_servers, topic, batch_group_id, schema_registry_url, schema_str, router=router, message_format=message_format, **(batch_options or {}))
 
     thread1 = threading.Thread(target=single_consumer.run, daemon=True, name="single-consumer")
     thread2 = threading.Thread(target=batch_consumer.run, daemon=True, name="batch-consumer")
@@ -202,3 +475,14 @@ def run_consumers(bootstrap_servers: str, topic: str, single_group_id: str, batc
         'threads': [thread1, thread2],
         'consumers': [single_consumer, batch_consumer]
     }
+
+
+def stop_consumers(consumers_info: dict, timeout: float = 30.0):
+    """Останавливает консьюмеры и ждет закрытия их потоков."""
+    for consumer in consumers_info['consumers']:
+        consumer.stop()
+    for thread in consumers_info['threads']:
+        thread.join(timeout=timeout)
+        if thread.is_alive():
+            logger.error(f"Поток {thread.name} не остановился за {timeout} с")
+    logger.info("Консьюмеры остановлены")
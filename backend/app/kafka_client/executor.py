@@ -0,0 +1,145 @@
+"""Параллельная обработка сообщений консьюмера по партициям."""
+import queue
+import threading
+from collections import defaultdict
+
+from confluent_kafka import TopicPartition
+
+from core.config import logger
+
+
+class PartitionExecutor:
+    """
+    Пул потоков обработки сообщений консьюмера.
+
+    Все сообщения одной партиции попадают к одному и тому же потоку
+    и обрабатываются строго по порядку, разные партиции обрабатываются
+    параллельно. Если у партиции накопилось max_queue необработанных
+    сообщений, она ставится на паузу и возобновляется, когда очередь
+    опустится до resume_queue.
+
+    Ошибка обработчика логируется и передается в on_error(size),
+    сообщение считается обработанным и его оффсет коммитится, как
+    и при обработке без пула.
+
+    Методы submit, collect_completed и drain вызываются из потока,
+    который выполняет poll консьюмера.
+    """
+
+    def __init__(
+            self,
+            consumer,
+            handler,
+            workers=4,
+            max_queue=1000,
+            resume_queue=None,
+            name='consumer',
+            on_error=None
+    ):
+        self.consumer = consumer
+        self.handler = handler
+        self.on_error = on_error
+        self.max_queue = max_queue
+        self.resume_queue = (
+            max_queue // 2 if resume_queue is None else resume_queue
+        )
+        self._queues = [queue.Queue() for _ in range(workers)]
+        # Завершенные задачи: (topic, partition, offset, size)
+        self._completed = queue.SimpleQueue()
+        # Количество необработанных сообщений по партициям
+        self._pending = defaultdict(int)
+        self._paused = set()
+        self._threads = [
+            threading.Thread(
+                target=self._work,
+                args=(work_queue,),
+                daemon=True,
+                name=f"{name}-worker-{index}"
+            )
+            for index, work_queue in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self, work_queue):
+        while True:
+            task = work_queue.get()
+            if task is None:
+                work_queue.task_done()
+                break
+            topic, partition, offset, size, payload = task
+            try:
+                self.handler(payload)
+            except Exception as e:
+                logger.error(f"Ошибка обработки {topic}[{partition}] "
+                             f"оффсет {offset}, сообщение пропущено: {e}")
+                if self.on_error:
+                    self.on_error(size)
+            self._completed.put((topic, partition, offset, size))
+            work_queue.task_done()
+
+    def submit(self, topic, partition, offset, payload, size=1):
+        """
+        Передает сообщение (или пачку сообщений одной партиции,
+        offset - последний оффсет пачки) на обработку.
+        """
+        work_queue = self._queues[hash((topic, partition)) % len(self._queues)]
+        tp = (topic, partition)
+        self._pending[tp] += size
+        work_queue.put((topic, partition, offset, size, payload))
+        if self._pending[tp] >= self.max_queue and tp not in self._paused:
+            self.consumer.pause([TopicPartition(topic, partition)])
+            self._paused.add(tp)
+            logger.info(f"Партиция {topic}[{partition}] на паузе: "
+                        f"очередь {self._pending[tp]}")
+
+    def collect_completed(self):
+        """
+        Возвращает оффсеты для коммита (следующий оффсет после последнего
+        обработанного) и снимает паузу с разгруженных партиций.
+        Партиция обрабатывается одним потоком по порядку, поэтому все
+        оффсеты до последнего завершенного тоже обработаны.
+        """
+        offsets = {}
+        while True:
+            try:
+                topic, partition, offset, size = self._completed.get_nowait()
+            except queue.Empty:
+                break
+            tp = (topic, partition)
+            offsets[tp] = offset + 1
+            self._pending[tp] -= size
+        for tp in [tp for tp in self._paused
+                   if self._pending[tp] <= self.resume_queue]:
+            self.consumer.resume([TopicPartition(*tp)])
+            self._paused.discard(tp)
+            logger.info(f"Партиция {tp[0]}[{tp[1]}] возобновлена")
+        return [
+            TopicPartition(topic, partition, offset)
+            for (topic, partition), offset in offsets.items()
+        ]
+
+    def drain(self, partitions=None):
+        """
+        Ждет обработки всех переданных сообщений и сбрасывает состояние
+        отзываемых партиций (всех, если partitions не заданы).
+        """
+        for work_queue in self._queues:
+            work_queue.join()
+        offsets = self.collect_completed()
+        if partitions is None:
+            revoked = set(self._pending) | self._paused
+        else:
+            revoked = {(tp.topic, tp.partition) for tp in partitions}
+        for tp in revoked:
+            self._pending.pop(tp, None)
+            self._paused.discard(tp)
+        return offsets
+
+    def shutdown(self):
+        """Останавливает потоки после обработки очередей."""
+        for work_queue in self._queues:
+            work_queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._paused.clear()
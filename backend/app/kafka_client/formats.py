@@ -0,0 +1,215 @@
+"""
+Форматы сериализации сообщений: JSON, Avro или Protobuf.
+
+Схемы записей описаны один раз в schemas/records.avsc в корне проекта,
+этот же файл читает приложение Faust (kafka_streams/record_formats.py).
+Protobuf-сообщения строятся из тех же полей.
+Все форматы регистрируются в Schema Registry и пишутся в формате Confluent.
+"""
+import base64
+import json
+from functools import lru_cache
+from pathlib import Path
+
+from confluent_kafka.schema_registry import Schema, SchemaRegistryClient
+
+from kafka_client.serde import make_json_deserializer, make_json_serializer
+
+
+FORMAT_JSON = 'json'
+FORMAT_AVRO = 'avro'
+FORMAT_PROTOBUF = 'protobuf'
+FORMATS = (FORMAT_JSON, FORMAT_AVRO, FORMAT_PROTOBUF)
+
+# Общий для бэкенда и Faust файл схем записей
+# (в контейнере каталог schemas монтируется в /schemas)
+RECORD_SCHEMAS_FILE = (
+    Path(__file__).resolve().parents[3] / 'schemas' / 'records.avsc'
+)
+
+
+def check_format(message_format: str) -> str:
+    if message_format not in FORMATS:
+        raise ValueError(
+            f"Неизвестный формат сообщений: {message_format}, "
+            f"допустимые: {', '.join(FORMATS)}"
+        )
+    return message_format
+
+
+@lru_cache(maxsize=None)
+def record_schemas() -> dict[str, dict]:
+    """Схемы Avro записей по имени, в порядке описания в файле."""
+    with open(RECORD_SCHEMAS_FILE, encoding='utf-8') as schemas_file:
+        return {schema['name']: schema for schema in json.load(schemas_file)}
+
+
+def record_fields(record_name: str) -> tuple[str, ...]:
+    """Имена полей записи."""
+    return tuple(
+        field['name'] for field in record_schemas()[record_name]['fields']
+    )
+
+
+def avro_schema_str(record_name: str) -> str:
+    """Схема Avro записи."""
+    return json.dumps(record_schemas()[record_name])
+
+
+@lru_cache(maxsize=None)
+def protobuf_file_descriptor():
+    """
+    FileDescriptorProto со всеми записями, поля нумеруются по порядку
+    (все поля записей строковые).
+    """
+    from google.protobuf import descriptor_pb2
+
+    schemas = list(record_schemas().values())
+    namespace = schemas[0]['namespace']
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name=f'{namespace}/messages.proto',
+        package=namespace,
+        syntax='proto3'
+    )
+    for schema in schemas:
+        message_proto = file_proto.message_type.add(name=schema['name'])
+        for number, field in enumerate(schema['fields'], start=1):
+            if field['type'] != 'string':
+                raise ValueError(
+                    f"Поле {schema['name']}.{field['name']}: "
+                    f"поддерживаются только строковые поля"
+                )
+            message_proto.field.add(
+                name=field['name'],
+                number=number,
+                type=descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+                label=descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL
+            )
+    return file_proto
+
+
+@lru_cache(maxsize=None)
+def protobuf_message_type(record_name: str):
+    """
+    Класс сообщения Protobuf, собранный из схемы записи
+    без сгенерированного protoc кода.
+    """
+    from google.protobuf import descriptor_pool
+    from google.protobuf.message_factory import GetMessageClass
+
+    file_proto = protobuf_file_descriptor()
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    return GetMessageClass(
+        pool.FindMessageTypeByName(f'{file_proto.package}.{record_name}')
+    )
+
+
+def record_schema(message_format: str, record_name: str) -> Schema:
+    """Схема записи в том виде, в котором ее регистрирует сериализатор."""
+    if check_format(message_format) == FORMAT_AVRO:
+        return Schema(avro_schema_str(record_name), schema_type='AVRO')
+    if message_format == FORMAT_PROTOBUF:
+        # Сериализатор регистрирует FileDescriptorProto в base64
+        return Schema(
+            base64.standard_b64encode(
+                protobuf_file_descriptor().SerializeToString()
+            ).decode(),
+            schema_type='PROTOBUF'
+        )
+    raise ValueError(f"Формат {message_format} не использует записи")
+
+
+def make_record_serializer(
+        message_format: str,
+        record_name: str,
+        schema_registry_client: SchemaRegistryClient
+):
+    """Сериализатор словаря с полями записи в Avro или Protobuf."""
+    if check_format(message_format) == FORMAT_AVRO:
+        from confluent_kafka.schema_registry.avro import AvroSerializer
+
+        return AvroSerializer(
+            schema_registry_client,
+            avro_schema_str(record_name)
+        )
+    if message_format == FORMAT_PROTOBUF:
+        from confluent_kafka.schema_registry.protobuf import (
+            ProtobufSerializer
+        )
+
+        message_type = protobuf_message_type(record_name)
+        serializer = ProtobufSerializer(
+            message_type,
+            schema_registry_client,
+            {'use.deprecated.format': False}
+        )
+        return lambda obj, ctx: serializer(message_type(**obj), ctx)
+    raise ValueError(f"Формат {message_format} не использует записи")
+
+
+def make_record_deserializer(
+        message_format: str,
+        record_name: str,
+        schema_registry_client: SchemaRegistryClient
+):
+    """Десериализатор Avro или Protobuf, возвращает словарь."""
+    if check_format(message_format) == FORMAT_AVRO:
+        from confluent_kafka.schema_registry.avro import AvroDeserializer
+
+        return AvroDeserializer(
+            schema_registry_client,
+            avro_schema_str(record_name)
+        )
+    if message_format == FORMAT_PROTOBUF:
+        from confluent_kafka.schema_registry.protobuf import (
+            ProtobufDeserializer
+        )
+
+        message_type = protobuf_message_type(record_name)
+        deserializer = ProtobufDeserializer(
+            message_type,
+            {'use.deprecated.format': False}
+        )
+        fields = record_fields(record_name)
+
+        def deserialize(data, ctx):
+            message = deserializer(data, ctx)
+            if message is None:
+                return None
+            return {field: getattr(message, field) for field in fields}
+        return deserialize
+    raise ValueError(f"Формат {message_format} не использует записи")
+
+
+def make_value_serializer(
+        message_format: str,
+        schema_str: str,
+        schema_registry_client: SchemaRegistryClient
+):
+    """Сериализатор сообщений /api/message."""
+    if check_format(message_format) == FORMAT_JSON:
+        return make_json_serializer(schema_str, schema_registry_client)
+    return make_record_serializer(
+        message_format,
+        'Message',
+        schema_registry_client
+    )
+
+
+def make_value_deserializer(
+        message_format: str,
+        schema_str: str,
+        schema_registry_client: SchemaRegistryClient
+):
+    """
+    Десериализатор сообщений /api/message, schema_str используется
+    только для JSON.
+    """
+    if check_format(message_format) == FORMAT_JSON:
+        return make_json_deserializer(schema_str, schema_registry_client)
+    return make_record_deserializer(
+        message_format,
+        'Message',
+        schema_registry_client
+    )
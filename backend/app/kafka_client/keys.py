@@ -0,0 +1,49 @@
+"""Стратегии формирования ключей сообщений кафка."""
+from typing import Callable
+
+from pydantic import BaseModel
+
+
+class ConstantKeyStrategy:
+    """Один и тот же ключ для всех сообщений."""
+    def __init__(self, value: str):
+        self.value = value
+
+    def __call__(self, record: BaseModel) -> str:
+        return self.value
+
+
+class FieldKeyStrategy:
+    """Ключ сообщения берется из поля записи."""
+    def __init__(self, field: str):
+        self.field = field
+
+    def __call__(self, record: BaseModel) -> str:
+        return str(getattr(record, self.field))
+
+
+KEY_STRATEGIES: dict[str, Callable[[str], Callable[[BaseModel], str]]] = {
+    'const': ConstantKeyStrategy,
+    'field': FieldKeyStrategy,
+}
+
+
+def register_key_strategy(
+    name: str,
+    factory: Callable[[str], Callable[[BaseModel], str]]
+):
+    """Регистрация собственной стратегии формирования ключей."""
+    KEY_STRATEGIES[name] = factory
+
+
+def get_key_strategy(spec: str) -> Callable[[BaseModel], str]:
+    """
+    Создает стратегию по описанию вида "<стратегия>:<аргумент>",
+    например "field:recipient_id" или "const:user_msg".
+    """
+    name, _, argument = spec.partition(':')
+    try:
+        factory = KEY_STRATEGIES[name]
+    except KeyError:
+        raise ValueError(f"Неизвестная стратегия ключей: {name}")
+    return factory(argument)
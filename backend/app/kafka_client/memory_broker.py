@@ -0,0 +1,579 @@
+"""
+Брокер Kafka и Schema Registry в памяти процесса.
+
+Используется при KAFKA_TRANSPORT=memory, чтобы конвейер
+API -> продюсер -> консьюмер можно было нагружать и профилировать
+на одной машине без кластера и Schema Registry. Клиенты реализуют
+ту часть API confluent_kafka.Producer/Consumer, которую использует
+kafka_client: delivery callback'и и on_commit вызываются из poll(),
+группы консьюмеров делят партиции подписанных топиков, оффсеты
+коммитятся в брокер.
+
+Данные существуют только в памяти процесса: API и консьюмеры
+должны работать в одном процессе (uvicorn, RUN_CONSUMERS_IN_API).
+"""
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Optional
+
+from confluent_kafka import (OFFSET_INVALID, TIMESTAMP_CREATE_TIME,
+                             KafkaError, KafkaException, TopicPartition)
+from confluent_kafka.admin import (ClusterMetadata, PartitionMetadata,
+                                   TopicMetadata)
+from confluent_kafka.schema_registry import Schema, SchemaRegistryClient
+
+from core.config import logger
+
+
+# Начальный оффсет при отсутствии закоммиченного (auto.offset.reset)
+EARLIEST_RESETS = ('earliest', 'smallest', 'beginning')
+MOCK_REGISTRY_URL = 'mock://memory'
+# Реестр в памяти из confluent_kafka: публично доступен только через
+# фабрику new_client с адресом mock://
+MockSchemaRegistryClient = type(
+    SchemaRegistryClient.new_client({'url': MOCK_REGISTRY_URL})
+)
+
+
+class MemoryMessage:
+    """Сообщение с интерфейсом confluent_kafka.Message."""
+    __slots__ = (
+        '_topic', '_partition', '_offset', '_key', '_value', '_headers',
+        '_timestamp'
+    )
+
+    def __init__(self, topic, partition, offset, key, value, headers):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._key = key
+        self._value = value
+        self._headers = headers
+        self._timestamp = int(time.time() * 1000)
+
+    def topic(self) -> str:
+        return self._topic
+
+    def partition(self) -> int:
+        return self._partition
+
+    def offset(self) -> int:
+        return self._offset
+
+    def key(self) -> Optional[bytes]:
+        return self._key
+
+    def value(self) -> Optional[bytes]:
+        return self._value
+
+    def headers(self) -> Optional[list[tuple[str, bytes]]]:
+        return self._headers
+
+    def timestamp(self) -> tuple[int, int]:
+        return TIMESTAMP_CREATE_TIME, self._timestamp
+
+    def error(self) -> None:
+        return None
+
+    def __len__(self) -> int:
+        return len(self._value or b'')
+
+
+class MemoryPartition:
+    """
+    Лог партиции. Хранятся последние retention сообщений,
+    оффсеты после удаления старых сообщений не меняются.
+    """
+
+    def __init__(self, retention: int):
+        self.retention = retention
+        self.base = 0
+        self.messages: list[MemoryMessage] = []
+
+    @property
+    def end(self) -> int:
+        return self.base + len(self.messages)
+
+    def append(self, message: MemoryMessage):
+        self.messages.append(message)
+        if self.retention and len(self.messages) > self.retention * 2:
+            # Удаление пачкой, а не на каждом сообщении
+            removed = len(self.messages) - self.retention
+            del self.messages[:removed]
+            self.base += removed
+
+    def read(self, offset: int, limit: int) -> list[MemoryMessage]:
+        start = max(offset - self.base, 0)
+        return self.messages[start:start + limit]
+
+
+def _bytes(value) -> Optional[bytes]:
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    return value
+
+
+def _headers(headers) -> Optional[list[tuple[str, bytes]]]:
+    if not headers:
+        return None
+    items = headers.items() if isinstance(headers, dict) else headers
+    return [(name, _bytes(value)) for name, value in items]
+
+
+class MemoryBroker:
+    """
+    Топики, партиции, закоммиченные оффсеты и группы консьюмеров.
+
+    Топик создается при первом обращении с partitions партициями.
+    Партиции группы распределяются между подписанными участниками
+    по кругу; участник применяет новое распределение в своем poll(),
+    вызывая on_revoke и on_assign, как librdkafka.
+    """
+
+    def __init__(self, partitions: int = 3, retention: int = 100000):
+        self.default_partitions = partitions
+        self.retention = retention
+        self.condition = threading.Condition(threading.RLock())
+        self.topics: dict[str, list[MemoryPartition]] = {}
+        # (группа, топик, партиция) -> следующий оффсет
+        self.committed: dict[tuple[str, str, int], int] = {}
+        self.groups: dict[str, list['MemoryConsumer']] = {}
+
+    def partitions(self, topic: str) -> list[MemoryPartition]:
+        with self.condition:
+            partitions = self.topics.get(topic)
+            if partitions is None:
+                partitions = self.topics[topic] = [
+                    MemoryPartition(self.retention)
+                    for _ in range(self.default_partitions)
+                ]
+            return partitions
+
+    def append(self, topic, partition, key, value, headers) -> MemoryMessage:
+        with self.condition:
+            log = self.partitions(topic)[partition]
+            message = MemoryMessage(
+                topic,
+                partition,
+                log.end,
+                key,
+                value,
+                headers
+            )
+            log.append(message)
+            self.condition.notify_all()
+            return message
+
+    def commit(self, group: str, offsets: list[TopicPartition]):
+        with self.condition:
+            for tp in offsets:
+                self.committed[(group, tp.topic, tp.partition)] = tp.offset
+
+    def committed_offset(
+            self,
+            group: str,
+            topic: str,
+            partition: int
+    ) -> Optional[int]:
+        return self.committed.get((group, topic, partition))
+
+    def lag(self, group: str) -> int:
+        """Незакоммиченные группой сообщения по всем ее топикам."""
+        with self.condition:
+            topics = {
+                topic
+                for member in self.groups.get(group, [])
+                for topic in member.subscription
+            }
+            return sum(
+                log.end - max(
+                    self.committed_offset(group, topic, index) or 0,
+                    log.base
+                )
+                for topic in topics
+                for index, log in enumerate(self.partitions(topic))
+            )
+
+    def join(self, consumer: 'MemoryConsumer'):
+        with self.condition:
+            members = self.groups.setdefault(consumer.group, [])
+            if consumer not in members:
+                members.append(consumer)
+            self.rebalance(consumer.group)
+
+    def leave(self, consumer: 'MemoryConsumer'):
+        with self.condition:
+            members = self.groups.get(consumer.group, [])
+            if consumer in members:
+                members.remove(consumer)
+                self.rebalance(consumer.group)
+
+    def rebalance(self, group: str):
+        """Новое распределение партиций между участниками группы."""
+        members = self.groups.get(group, [])
+        targets = {member: [] for member in members}
+        topics = sorted({
+            topic for member in members for topic in member.subscription
+        })
+        for topic in topics:
+            subscribed = [
+                member for member in members if topic in member.subscription
+            ]
+            for index in range(len(self.partitions(topic))):
+                targets[subscribed[index % len(subscribed)]].append(
+                    (topic, index)
+                )
+        for member, target in targets.items():
+            member.pending_assignment = target
+        self.condition.notify_all()
+
+
+class MemoryProducer:
+    """
+    Продюсер с интерфейсом confluent_kafka.Producer.
+
+    Сообщение сразу записывается в лог партиции, delivery callback
+    вызывается из poll() или flush(). Партиция без явного номера
+    выбирается по CRC32 ключа (без ключа - случайно).
+    """
+
+    def __init__(self, conf: dict, broker: MemoryBroker):
+        self.broker = broker
+        self.max_messages = int(
+            conf.get('queue.buffering.max.messages', 100000)
+        )
+        self._callbacks = deque()
+        self._wakeup = threading.Event()
+
+    def produce(
+            self,
+            topic: str,
+            value=None,
+            key=None,
+            partition: int = -1,
+            on_delivery=None,
+            callback=None,
+            timestamp: int = 0,
+            headers=None
+    ):
+        if len(self._callbacks) >= self.max_messages:
+            raise BufferError('Local: Queue full')
+        key = _bytes(key)
+        partitions = self.broker.partitions(topic)
+        if partition is None or partition < 0:
+            partition = (
+                random.randrange(len(partitions)) if key is None
+                else zlib.crc32(key) % len(partitions)
+            )
+        elif partition >= len(partitions):
+            raise KafkaException(KafkaError(KafkaError._UNKNOWN_PARTITION))
+        message = self.broker.append(
+            topic,
+            partition,
+            key,
+            _bytes(value),
+            _headers(headers)
+        )
+        callback = callback or on_delivery
+        if callback is not None:
+            self._callbacks.append((callback, message))
+            self._wakeup.set()
+
+    def poll(self, timeout: float = -1) -> int:
+        if not self._callbacks and timeout:
+            self._wakeup.wait(None if timeout < 0 else timeout)
+        self._wakeup.clear()
+        served = 0
+        while self._callbacks:
+            callback, message = self._callbacks.popleft()
+            callback(None, message)
+            served += 1
+        return served
+
+    def flush(self, timeout: float = -1) -> int:
+        while self._callbacks:
+            self.poll(0)
+        return 0
+
+    def purge(self, in_queue=True, in_flight=True, blocking=True):
+        """Сообщения записываются в лог сразу, очищать нечего."""
+
+    def list_topics(self, topic: str = None, timeout: float = -1):
+        return list_topics(self.broker, topic)
+
+    def __len__(self) -> int:
+        return len(self._callbacks)
+
+
+class MemoryConsumer:
+    """
+    Консьюмер с интерфейсом confluent_kafka.Consumer.
+
+    Поддерживает подписку в группе и ручное назначение партиций,
+    offset store (enable.auto.offset.store), синхронный
+    и асинхронный коммит, паузу партиций.
+    """
+
+    def __init__(self, conf: dict, broker: MemoryBroker):
+        self.broker = broker
+        self.group = conf['group.id']
+        self.reset = conf.get('auto.offset.reset', 'latest')
+        self.auto_store = conf.get('enable.auto.offset.store', True)
+        self.auto_commit = conf.get('enable.auto.commit', True)
+        self.auto_commit_interval = conf.get(
+            'auto.commit.interval.ms', 5000
+        ) / 1000
+        self.on_commit = conf.get('on_commit')
+        self.subscription: list[str] = []
+        self.pending_assignment: Optional[list[tuple[str, int]]] = None
+        self._on_assign = None
+        self._on_revoke = None
+        self._positions: dict[tuple[str, int], int] = {}
+        self._stored: dict[tuple[str, int], int] = {}
+        self._committed: dict[tuple[str, int], int] = {}
+        self._paused: set[tuple[str, int]] = set()
+        self._commit_results = deque()
+        self._last_auto_commit = time.monotonic()
+        self._closed = False
+
+    @staticmethod
+    def _partitions(tps) -> list[TopicPartition]:
+        return [TopicPartition(topic, partition) for topic, partition in tps]
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None, on_lost=None):
+        self.subscription = list(topics)
+        self._on_assign = on_assign
+        self._on_revoke = on_revoke or on_lost
+        self.broker.join(self)
+
+    def unsubscribe(self):
+        self.subscription = []
+        self.broker.leave(self)
+        self._revoke()
+
+    def assign(self, partitions: list[TopicPartition]):
+        self._set_assignment([(tp.topic, tp.partition) for tp in partitions])
+        for tp in partitions:
+            if tp.offset >= 0:
+                self._positions[(tp.topic, tp.partition)] = tp.offset
+
+    def unassign(self):
+        self._set_assignment([])
+
+    def assignment(self) -> list[TopicPartition]:
+        return self._partitions(self._positions)
+
+    def _initial_offset(self, topic: str, partition: int) -> int:
+        committed = self.broker.committed_offset(self.group, topic, partition)
+        if committed is not None:
+            return committed
+        log = self.broker.partitions(topic)[partition]
+        return log.base if self.reset in EARLIEST_RESETS else log.end
+
+    def _set_assignment(self, tps: list[tuple[str, int]]):
+        self._positions = {
+            tp: self._initial_offset(*tp) for tp in tps
+        }
+        self._stored = {
+            tp: offset for tp, offset in self._stored.items()
+            if tp in self._positions
+        }
+        self._paused &= set(self._positions)
+
+    def _revoke(self):
+        if self._positions and self._on_revoke:
+            self._on_revoke(self, self.assignment())
+        self._set_assignment([])
+
+    def _apply_rebalance(self):
+        """Новое распределение партиций (в потоке poll, как librdkafka)."""
+        with self.broker.condition:
+            target, self.pending_assignment = self.pending_assignment, None
+        if target is None or set(target) == set(self._positions):
+            return
+        self._revoke()
+        self._set_assignment(target)
+        logger.debug(f"Консьюмер {self.group}: назначены партиции {target}")
+        if self._on_assign:
+            self._on_assign(self, self.assignment())
+
+    def _serve_commits(self):
+        while self._commit_results:
+            partitions = self._commit_results.popleft()
+            if self.on_commit:
+                self.on_commit(None, partitions)
+
+    def _fetch(self, limit: int) -> list[MemoryMessage]:
+        messages = []
+        tps = list(self._positions)
+        # Начинаем с разных партиций, чтобы ни одна не ждала остальных
+        random.shuffle(tps)
+        for tp in tps:
+            if len(messages) >= limit:
+                break
+            if tp in self._paused:
+                continue
+            log = self.broker.partitions(tp[0])[tp[1]]
+            position = max(self._positions[tp], log.base)
+            batch = log.read(position, limit - len(messages))
+            if not batch:
+                continue
+            messages.extend(batch)
+            self._positions[tp] = batch[-1].offset() + 1
+            if self.auto_store:
+                self._stored[tp] = self._positions[tp]
+        return messages
+
+    def consume(self, num_messages: int = 1, timeout: float = -1):
+        if self._closed:
+            raise RuntimeError('Consumer closed')
+        deadline = None if timeout < 0 else time.monotonic() + timeout
+        while True:
+            self._serve_commits()
+            self._apply_rebalance()
+            self._maybe_auto_commit()
+            with self.broker.condition:
+                messages = self._fetch(num_messages)
+                if messages:
+                    return messages
+                remaining = (
+                    None if deadline is None else deadline - time.monotonic()
+                )
+                if remaining is not None and remaining <= 0:
+                    return []
+                if self.pending_assignment is None:
+                    self.broker.condition.wait(remaining)
+
+    def poll(self, timeout: float = -1) -> Optional[MemoryMessage]:
+        messages = self.consume(1, timeout)
+        return messages[0] if messages else None
+
+    def store_offsets(self, message=None, offsets=None):
+        if message is not None:
+            offsets = [TopicPartition(
+                message.topic(),
+                message.partition(),
+                message.offset() + 1
+            )]
+        for tp in offsets or []:
+            key = (tp.topic, tp.partition)
+            if key not in self._positions:
+                raise KafkaException(KafkaError(KafkaError._STATE))
+            self._stored[key] = tp.offset
+
+    def commit(self, message=None, offsets=None, asynchronous=True):
+        if message is not None:
+            offsets = [TopicPartition(
+                message.topic(),
+                message.partition(),
+                message.offset() + 1
+            )]
+        elif offsets is None:
+            offsets = [
+                TopicPartition(topic, partition, offset)
+                for (topic, partition), offset in self._stored.items()
+                if self._committed.get((topic, partition)) != offset
+            ]
+            if not offsets:
+                raise KafkaException(KafkaError(KafkaError._NO_OFFSET))
+        self.broker.commit(self.group, offsets)
+        for tp in offsets:
+            self._committed[(tp.topic, tp.partition)] = tp.offset
+        self._commit_results.append(offsets)
+        return None if asynchronous else offsets
+
+    def _maybe_auto_commit(self):
+        if not self.auto_commit or \
+                time.monotonic() - self._last_auto_commit < \
+                self.auto_commit_interval:
+            return
+        self._last_auto_commit = time.monotonic()
+        try:
+            self.commit(asynchronous=True)
+        except KafkaException:
+            pass
+
+    def committed(self, partitions, timeout: float = -1):
+        result = []
+        for tp in partitions:
+            offset = self.broker.committed_offset(
+                self.group,
+                tp.topic,
+                tp.partition
+            )
+            result.append(TopicPartition(
+                tp.topic,
+                tp.partition,
+                OFFSET_INVALID if offset is None else offset
+            ))
+        return result
+
+    def position(self, partitions):
+        return [
+            TopicPartition(
+                tp.topic,
+                tp.partition,
+                self._positions.get((tp.topic, tp.partition), OFFSET_INVALID)
+            )
+            for tp in partitions
+        ]
+
+    def get_watermark_offsets(self, partition, timeout=None, cached=False):
+        log = self.broker.partitions(partition.topic)[partition.partition]
+        return log.base, log.end
+
+    def pause(self, partitions):
+        self._paused.update((tp.topic, tp.partition) for tp in partitions)
+
+    def resume(self, partitions):
+        self._paused.difference_update(
+            (tp.topic, tp.partition) for tp in partitions
+        )
+
+    def list_topics(self, topic: str = None, timeout: float = -1):
+        return list_topics(self.broker, topic)
+
+    def close(self):
+        if self._closed:
+            return
+        if self.auto_commit:
+            try:
+                self.commit(asynchronous=False)
+            except KafkaException:
+                pass
+        if self.subscription:
+            self.broker.leave(self)
+        self._revoke()
+        self._serve_commits()
+        self._closed = True
+
+
+def list_topics(broker: MemoryBroker, topic: str = None) -> ClusterMetadata:
+    """Метаданные топиков брокера в формате confluent_kafka.admin."""
+    metadata = ClusterMetadata()
+    metadata.cluster_id = 'memory'
+    with broker.condition:
+        names = [topic] if topic else list(broker.topics)
+        for name in names:
+            topic_metadata = TopicMetadata()
+            topic_metadata.topic = name
+            for index in range(len(broker.partitions(name))):
+                partition_metadata = PartitionMetadata()
+                partition_metadata.id = index
+                topic_metadata.partitions[index] = partition_metadata
+            metadata.topics[name] = topic_metadata
+    return metadata
+
+
+class MemorySchemaRegistryClient(MockSchemaRegistryClient):
+    """Schema Registry в памяти процесса (клиент confluent_kafka mock://)."""
+
+    def __init__(self):
+        super().__init__({'url': MOCK_REGISTRY_URL})
+
+    def warm_up(self, subject_name: str, schema: Schema):
+        """Регистрация схемы заранее, как CachedSchemaRegistryClient."""
+        self.register_schema_full_response(subject_name, schema)
@@ -0,0 +1,90 @@
+"""Асинхронный коммит оффсетов консьюмера."""
+import time
+
+from confluent_kafka import KafkaError, KafkaException
+
+from core.config import logger
+
+
+class OffsetCommitter:
+    """
+    Хранит оффсеты обработанных сообщений в offset store librdkafka
+    и коммитит их асинхронно по количеству или интервалу времени.
+
+    При отзыве партиций и при остановке выполняется синхронный коммит,
+    поэтому сохраняется семантика at-least-once: закоммичены только
+    оффсеты обработанных сообщений (сообщение, обработчик которого
+    завершился ошибкой, пропускается и учитывается в метрике).
+    Консьюмер должен быть создан с 'enable.auto.offset.store': False.
+    """
+
+    def __init__(
+            self,
+            consumer,
+            commit_every=100,
+            commit_interval=1.0,
+            commit_timer=None
+    ):
+        self.consumer = consumer
+        # Метрики коммитов (core.metrics.CommitTimer)
+        self.commit_timer = commit_timer
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def store(self, msg):
+        """Запоминает оффсет обработанного сообщения."""
+        self.consumer.store_offsets(message=msg)
+        self._uncommitted += 1
+        self.maybe_commit()
+
+    def store_offsets(self, offsets):
+        """Запоминает оффсеты (список TopicPartition со следующим оффсетом)."""
+        if not offsets:
+            return
+        try:
+            self.consumer.store_offsets(offsets=offsets)
+        except KafkaException as e:
+            # Партиции могли быть отозваны, пока сообщения обрабатывались
+            logger.warning("Не удалось сохранить оффсеты: %s", e)
+            return
+        self._uncommitted += len(offsets)
+        self.maybe_commit()
+
+    def maybe_commit(self):
+        """Асинхронный коммит, если достигнут порог по количеству или времени."""
+        if not self._uncommitted:
+            return
+        if (self._uncommitted >= self.commit_every
+                or time.monotonic() - self._last_commit >= self.commit_interval):
+            self.commit(asynchronous=True)
+
+    def commit(self, asynchronous=True):
+        """Коммит сохраненных в offset store оффсетов."""
+        started = time.perf_counter()
+        try:
+            self.consumer.commit(asynchronous=asynchronous)
+        except KafkaException as e:
+            if e.args[0].code() != KafkaError._NO_OFFSET:
+                logger.error("Ошибка коммита оффсетов: %s", e)
+                return
+        else:
+            if self.commit_timer:
+                self.commit_timer.committed(
+                    started,
+                    asynchronous,
+                    self._uncommitted
+                )
+        logger.debug(f"Закоммичено сообщений: {self._uncommitted}")
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def flush(self):
+        """Синхронный коммит всех сохраненных оффсетов."""
+        self.commit(asynchronous=False)
+
+    def on_revoke(self, consumer, partitions):
+        """Коммит перед отзывом партиций при ребалансировке."""
+        logger.info(f"Отзыв партиций {partitions}, коммит оффсетов")
+        self.flush()
@@ -1,42 +1,58 @@
 """Продюсер кафка."""
 from datetime import datetime
+import os
 import uuid
 from typing import Optional
 
-from confluent_kafka import Producer
 from confluent_kafka.serialization import (
     SerializationContext,
     MessageField
 )
-from confluent_kafka.schema_registry import SchemaRegistryClient
-from confluent_kafka.schema_registry.json_schema import JSONSerializer
+from confluent_kafka.schema_registry import Schema
 
 from core.config import logger
+from kafka_client.base_producer import (AsyncDeliveryProducer,
+                                        ProducerOverloaded, to_record)
+from kafka_client.routing import KeyRouter
+from kafka_client.schema_cache import get_schema_registry_client
+from kafka_client.formats import FORMAT_JSON, make_value_serializer, record_schema
 from kafka_client.schemas import json_schema_str
 
 
-class MessageProducer:
+class MessageProducer(AsyncDeliveryProducer):
     """Продюсер кафка."""
     def __init__(
             self,
             bootstrap_servers: str,
             topic: str,
-            schema_registry_url: str
+            schema_registry_url: str,
+            router: Optional[KeyRouter] = None,
+            message_format: str = FORMAT_JSON,
+            compression: str = 'gzip'
     ):
         """
         Инициализация продюсера с поддержкой Schema Registry
         """
         self.bootstrap_servers = bootstrap_servers
         self.topic = topic
+        # Маршрутизация по ключу в отдельные топики или партиции
+        self.router = router or KeyRouter(topic)
 
-        # Инициализация Schema Registry Client
-        schema_registry_conf = {'url': schema_registry_url}
-        self.schema_registry_client = SchemaRegistryClient(
-            schema_registry_conf
+        # Общий для процесса Schema Registry Client с кэшем схем
+        self.schema_registry_client = get_schema_registry_client(
+            schema_registry_url
+        )
+        # ID схемы известен до первого сообщения
+        self.schema_registry_client.warm_up(
+            f"{topic}-value",
+            Schema(json_schema_str, schema_type='JSON')
+            if message_format == FORMAT_JSON
+            else record_schema(message_format, 'Message')
         )
 
-        # Создание JSON сериализатора с Schema Registry
-        self.json_serializer = JSONSerializer(
+        # Создание сериализатора (JSON, Avro или Protobuf) с Schema Registry
+        self.value_serializer = make_value_serializer(
+            message_format,
             json_schema_str,
             self.schema_registry_client
         )
@@ -48,10 +64,10 @@ class MessageProducer:
             'acks': 'all',
             'retries': 3,
             'enable.idempotence': True,
-            'compression.type': 'gzip'
+            'compression.type': compression
         }
 
-        self.producer = Producer(conf)
+        super().__init__(conf)
 
     def delivery_callback(self, err, msg):
         """Callback для отслеживания доставки сообщений"""
@@ -67,11 +83,19 @@ class MessageProducer:
                 f"partition={msg.partition()}, offset={msg.offset()}"
             )
 
-    def send_message(self, key: str, message: str) -> bool:
+    def routed_record(self, key: str, serialized_key, serialized_value):
+        """Сообщение в топик и партицию, выбранные по ключу."""
+        topic, partition = self.router.route(key)
+        return to_record(topic, serialized_key, serialized_value, partition)
+
+    async def send_message(self, key: str, message: str) -> bool:
         """
         Отправка сообщения в Kafka с использованием Schema Registry
         """
         try:
+            # Отказ до сериализации, если продюсер перегружен
+            self.admit()
+
             # Создание структурированного сообщения
             message_value = {
                 'id': str(uuid.uuid4()),
@@ -83,7 +107,7 @@ class MessageProducer:
             print(f"Отправка сообщения в Kafka: {message_value}")
 
             # Сериализация значения с использованием Schema Registry
-            serialized_value = self.json_serializer(
+            serialized_value = self.value_serializer(
                 message_value,
                 SerializationContext(self.topic, MessageField.VALUE)
             )
@@ -91,55 +115,104 @@ class MessageProducer:
             # Сериализация ключа (просто строку в bytes)
             serialized_key = key.encode('utf-8') if key else None
 
-            # Отправка сообщения
-            self.producer.produce(
-                topic=self.topic,
-                key=serialized_key,
-                value=serialized_value,
-                callback=self.delivery_callback
-            )
-
-            # Обработка событий
-            self.producer.poll(0)
-
-            # Принудительная отправка всех сообщений
-            self.producer.flush(timeout=5)
+            # Отправка сообщения и ожидание подтверждения доставки
+            await self.deliver_record(self.routed_record(
+                key,
+                serialized_key,
+                serialized_value
+            ))
 
             return True
 
+        except ProducerOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Ошибка при отправке сообщения в Kafka: {e}")
             print(f"Ошибка при отправке: {e}")
             return False
 
-    def close(self):
-        """Закрытие продюсера"""
-        try:
-            self.producer.flush(timeout=10)
-        except Exception as e:
-            logger.error(f"Ошибка при закрытии продюсера: {e}")
-
-
-# Глобальный экземпляр продюсера
+    async def send_batch(
+            self,
+            messages: list[tuple[str, str]]
+    ) -> list[Optional[str]]:
+        """
+        Отправка пачки сообщений (key, msg) в Kafka без flush
+        после каждого сообщения.
+        Возвращает для каждого сообщения None или текст ошибки.
+        """
+        logger.info(f"Отправка пачки из {len(messages)} сообщений в Kafka")
+        self.admit(len(messages))
+        serialization_context = SerializationContext(
+            self.topic,
+            MessageField.VALUE
+        )
+        records = []
+        for key, message in messages:
+            try:
+                serialized_value = self.value_serializer(
+                    {
+                        'id': str(uuid.uuid4()),
+                        'timestamp': datetime.now().isoformat(),
+                        'key': key,
+                        'msg': message
+                    },
+                    serialization_context
+                )
+                records.append(self.routed_record(
+                    key,
+                    key.encode('utf-8') if key else None,
+                    serialized_value
+                ))
+            except Exception as e:
+                logger.error(f"Ошибка при отправке сообщения в Kafka: {e}")
+                records.append(None)
+        return await self.deliver_batch(records)
+
+
+# Глобальный экземпляр продюсера, свой в каждом процессе
 producer_instance: Optional[MessageProducer] = None
+# PID процесса, создавшего продюсер, и параметры для пересоздания после fork
+producer_pid: Optional[int] = None
+producer_kwargs: dict = {}
 
 
 def init_producer(
     bootstrap_servers: str,
     topic: str,
-    schema_registry_url: str
+    schema_registry_url: str,
+    router: Optional[KeyRouter] = None,
+    message_format: str = FORMAT_JSON,
+    compression: str = 'gzip'
 ) -> MessageProducer:
     """Инициализация глобального продюсера"""
-    global producer_instance
-    if producer_instance is None:
-        producer_instance = MessageProducer(
-            bootstrap_servers,
-            topic,
-            schema_registry_url
-        )
+    global producer_instance, producer_pid
+    producer_kwargs.update(
+        bootstrap_servers=bootstrap_servers,
+        topic=topic,
+        schema_registry_url=schema_registry_url,
+        router=router,
+        message_format=message_format,
+        compression=compression
+    )
+    if producer_instance is None or producer_pid != os.getpid():
+        producer_instance = MessageProducer(**producer_kwargs)
+        producer_pid = os.getpid()
     return producer_instance
 
 
 def get_producer() -> Optional[MessageProducer]:
-    """Получение глобального продюсера"""
+    """
+    Получение глобального продюсера.
+    Клиент librdkafka нельзя использовать после fork, поэтому
+    в дочернем процессе продюсер лениво создается заново.
+    """
+    if producer_instance is not None and producer_pid != os.getpid():
+        return init_producer(**producer_kwargs)
     return producer_instance
+
+
+def reset_producer():
+    """Сброс унаследованного при fork продюсера без его закрытия."""
+    global producer_instance, producer_pid
+    producer_instance = None
+    producer_pid = None
@@ -1,28 +1,50 @@
 """Простой продюсер кафка."""
-from typing import Optional
+import os
+from typing import Optional, Union
+
+from confluent_kafka.serialization import MessageField, SerializationContext
+from pydantic import BaseModel
 
-from confluent_kafka import Producer
 from core.config import logger
+from kafka_client.base_producer import (AsyncDeliveryProducer,
+                                        ProducerOverloaded, to_record)
+from kafka_client.formats import FORMAT_JSON, check_format, make_record_serializer
+from kafka_client.schema_cache import get_schema_registry_client
+
+
+# Сообщение: готовая строка/байты или модель, которую кодирует продюсер
+PlainMessage = Union[str, bytes, BaseModel]
 
 
-class MessagePlainProducer:
+class MessagePlainProducer(AsyncDeliveryProducer):
     """Простой продюсер кафка."""
     def __init__(
             self,
-            bootstrap_servers: str
+            bootstrap_servers: str,
+            partitioner: str = 'murmur2_random',
+            message_format: str = FORMAT_JSON,
+            schema_registry_url: Optional[str] = None,
+            compression: str = 'none'
     ):
         """
         Инициализация продюсера
         """
         self.bootstrap_servers = bootstrap_servers
+        # Формат сообщений: json (без Schema Registry), avro или protobuf
+        self.message_format = check_format(message_format)
+        self.schema_registry_url = schema_registry_url
+        # Сериализаторы Avro/Protobuf по топику
+        self._serializers = {}
 
         # Конфигурация продюсера
         conf = {
             'bootstrap.servers': bootstrap_servers,
-            'client.id': 'python-plain-producer'
+            'client.id': 'python-plain-producer',
+            'partitioner': partitioner,
+            'compression.type': compression
         }
 
-        self.producer = Producer(conf)
+        super().__init__(conf)
 
     def delivery_callback(self, err, msg):
         """Callback для отслеживания доставки сообщений"""
@@ -38,59 +60,130 @@ class MessagePlainProducer:
                 f"partition={msg.partition()}, offset={msg.offset()}"
             )
 
-    def send_message(self, key: str, topic: str, message: str) -> bool:
+    def encode(self, topic: str, message: PlainMessage) -> Union[str, bytes]:
+        """
+        Кодирование модели в формат message_format, строки
+        и байты отправляются как есть.
+        """
+        if isinstance(message, (str, bytes)):
+            return message
+        if self.message_format == FORMAT_JSON:
+            return message.model_dump_json()
+        serializer = self._serializers.get(topic)
+        if serializer is None:
+            serializer = make_record_serializer(
+                self.message_format,
+                message.record_name,
+                get_schema_registry_client(self.schema_registry_url)
+            )
+            self._serializers[topic] = serializer
+        return serializer(
+            message.model_dump(),
+            SerializationContext(topic, MessageField.VALUE)
+        )
+
+    async def send_message(
+            self,
+            key: str,
+            topic: str,
+            message: PlainMessage
+    ) -> bool:
         """Отправка сообщения в Kafka."""
         try:
+            # Отказ до сериализации, если продюсер перегружен
+            self.admit()
+
             print(f"Отправка сообщения в Kafka: {message}")
 
             # Сериализация ключа (просто строку в bytes)
             serialized_key = key.encode('utf-8') if key else None
 
-            # Отправка сообщения
-            self.producer.produce(
+            # Отправка сообщения и ожидание подтверждения доставки
+            await self.deliver(
                 topic=topic,
                 key=serialized_key,
-                value=message,
-                callback=self.delivery_callback
+                value=self.encode(topic, message)
             )
 
-            # Обработка событий
-            self.producer.poll(0)
-
-            # Принудительная отправка всех сообщений
-            self.producer.flush(timeout=5)
-
             return True
 
+        except ProducerOverloaded:
+            raise
         except Exception as e:
             logger.error(f"Ошибка при отправке сообщения в Kafka: {e}")
             print(f"Ошибка при отправке: {e}")
             return False
 
-    def close(self):
-        """Закрытие продюсера"""
-        try:
-            self.producer.flush(timeout=10)
-        except Exception as e:
-            logger.error(f"Ошибка при закрытии продюсера: {e}")
-
-
-# Глобальный экземпляр продюсера
+    async def send_batch(
+            self,
+            topic: str,
+            messages: list[tuple[str, PlainMessage]]
+    ) -> list[Optional[str]]:
+        """
+        Отправка пачки сообщений (key, message) в Kafka без flush
+        после каждого сообщения.
+        Возвращает для каждого сообщения None или текст ошибки.
+        """
+        logger.info(
+            f"Отправка пачки из {len(messages)} сообщений в топик {topic}"
+        )
+        self.admit(len(messages))
+        records = []
+        for key, message in messages:
+            try:
+                records.append(to_record(
+                    topic,
+                    key.encode('utf-8') if key else None,
+                    self.encode(topic, message)
+                ))
+            except Exception as e:
+                logger.error(f"Ошибка при отправке сообщения в Kafka: {e}")
+                records.append(None)
+        return await self.deliver_batch(records)
+
+
+# Глобальный экземпляр продюсера, свой в каждом процессе
 producer_instance: Optional[MessagePlainProducer] = None
+# PID процесса, создавшего продюсер, и параметры для пересоздания после fork
+producer_pid: Optional[int] = None
+producer_kwargs: dict = {}
 
 
 def init_plain_producer(
-    bootstrap_servers: str
+    bootstrap_servers: str,
+    partitioner: str = 'murmur2_random',
+    message_format: str = FORMAT_JSON,
+    schema_registry_url: Optional[str] = None,
+    compression: str = 'none'
 ) -> MessagePlainProducer:
     """Инициализация глобального продюсера"""
-    global producer_instance
-    if producer_instance is None:
-        producer_instance = MessagePlainProducer(
-            bootstrap_servers
-        )
+    global producer_instance, producer_pid
+    producer_kwargs.update(
+        bootstrap_servers=bootstrap_servers,
+        partitioner=partitioner,
+        message_format=message_format,
+        schema_registry_url=schema_registry_url,
+        compression=compression
+    )
+    if producer_instance is None or producer_pid != os.getpid():
+        producer_instance = MessagePlainProducer(**producer_kwargs)
+        producer_pid = os.getpid()
     return producer_instance
 
 
 def get_plain_producer() -> Optional[MessagePlainProducer]:
-    """Получение глобального продюсера"""
+    """
+    Получение глобального продюсера.
+    Клиент librdkafka нельзя использовать после fork, поэтому
+    в дочернем процессе продюсер лениво создается заново.
+    """
+    if producer_instance is not None and producer_pid != os.getpid():
+        return init_plain_producer(**producer_kwargs)
     return producer_instance
+
+
+def reset_plain_producer():
+    """Сброс унаследованного при fork продюсера без его закрытия."""
+    global producer_instance, producer_pid
+    producer_instance = None
+    producer_pid = None
@@ -0,0 +1,80 @@
+"""Маршрутизация сообщений по ключу."""
+from itertools import cycle
+from typing import Optional
+
+from confluent_kafka import TopicPartition
+
+
+# Режимы маршрутизации
+ROUTING_NONE = 'none'  # один топик, партиция по хэшу ключа
+ROUTING_TOPIC = 'topic'  # отдельный топик <topic>.<key> для каждого ключа
+ROUTING_PARTITION = 'partition'  # выделенные партиции для каждого ключа
+
+
+def parse_key_partitions(spec: str) -> dict[str, list[int]]:
+    """Разбирает описание вида "one:0;many:1,2"."""
+    key_partitions = {}
+    for item in filter(None, (part.strip() for part in spec.split(';'))):
+        key, _, partitions = item.partition(':')
+        key_partitions[key.strip()] = [
+            int(partition) for partition in partitions.split(',')
+        ]
+    return key_partitions
+
+
+class KeyRouter:
+    """
+    Определяет топик и партицию сообщения по ключу, чтобы каждая
+    группа консьюмеров читала только свою часть трафика.
+    """
+
+    def __init__(
+            self,
+            topic: str,
+            mode: str = ROUTING_NONE,
+            key_partitions: str = ''
+    ):
+        if mode not in (ROUTING_NONE, ROUTING_TOPIC, ROUTING_PARTITION):
+            raise ValueError(f"Неизвестный режим маршрутизации: {mode}")
+        self.topic = topic
+        self.mode = mode
+        self.key_partitions = parse_key_partitions(key_partitions)
+        if mode == ROUTING_PARTITION and not self.key_partitions:
+            raise ValueError(
+                "Для маршрутизации по партициям нужен KAFKA_KEY_PARTITIONS"
+            )
+        self._partition_cycles = {
+            key: cycle(partitions)
+            for key, partitions in self.key_partitions.items()
+        }
+
+    def topic_for_key(self, key: str) -> str:
+        """Топик, в который пишутся сообщения с ключом."""
+        if self.mode == ROUTING_TOPIC:
+            return f"{self.topic}.{key}"
+        return self.topic
+
+    def route(self, key: str) -> tuple[str, Optional[int]]:
+        """
+        Топик и партиция для сообщения.
+        Партиция None означает выбор партиционером продюсера.
+        """
+        if self.mode == ROUTING_PARTITION:
+            partitions = self._partition_cycles.get(key)
+            if partitions is not None:
+                return self.topic, next(partitions)
+        return self.topic_for_key(key), None
+
+    def attach(self, consumer, key: str, on_revoke=None):
+        """
+        Подписывает консьюмер только на сообщения с ключом: на топик
+        ключа или напрямую на выделенные ему партиции.
+        """
+        if self.mode == ROUTING_PARTITION and key in self.key_partitions:
+            consumer.assign([
+                TopicPartition(self.topic, partition)
+                for partition in self.key_partitions[key]
+            ])
+            return
+        kwargs = {'on_revoke': on_revoke} if on_revoke else {}
+        consumer.subscribe([self.topic_for_key(key)], **kwargs)
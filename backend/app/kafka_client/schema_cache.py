@@ -0,0 +1,312 @@
+"""Общий кэш Schema Registry с сохранением в файл."""
+import json
+import os
+import threading
+import time
+from functools import partial
+from pathlib import Path
+from typing import Callable, Optional
+
+from confluent_kafka.schema_registry import (
+    RegisteredSchema,
+    Schema,
+    SchemaRegistryClient
+)
+
+from core.config import settings, logger
+from kafka_client.transport import (get_memory_schema_registry,
+                                    is_memory_transport)
+
+
+class SchemaCache:
+    """
+    Кэш соответствий subject -> ID схемы и ID -> схема.
+
+    Записи хранятся вместе со временем получения из Schema Registry
+    и сохраняются в JSON-файл, поэтому после перезапуска процесс
+    стартует с уже известными схемами. Несколько процессов пишут
+    в один файл: перед записью содержимое файла объединяется с кэшем.
+    """
+
+    def __init__(self, url: str, path: Optional[str] = None, ttl: float = 300.0):
+        self.url = url
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # (subject, schema_str) -> (RegisteredSchema, время получения)
+        self.registered: dict[tuple[str, str], tuple[RegisteredSchema, float]] = {}
+        # ID -> (Schema, время получения)
+        self.schemas: dict[int, tuple[Schema, float]] = {}
+        # subject -> (последняя версия, время получения)
+        self.latest: dict[str, tuple[RegisteredSchema, float]] = {}
+        self.load()
+
+    def is_fresh(self, fetched_at: float) -> bool:
+        return time.time() - fetched_at < self.ttl
+
+    def _read_file(self) -> dict:
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать кэш схем {self.path}: {e}")
+            return {}
+
+    def _merge(self, data: dict):
+        """Добавляет записи из файла, более свежие записи кэша сохраняются."""
+        for item in data.get('registered', []):
+            key = (item['subject'], item['schema_str'])
+            if key not in self.registered or \
+                    self.registered[key][1] < item['fetched_at']:
+                self.registered[key] = (
+                    RegisteredSchema.from_dict(item['schema']),
+                    item['fetched_at']
+                )
+        for schema_id, item in data.get('schemas', {}).items():
+            schema_id = int(schema_id)
+            if schema_id not in self.schemas:
+                self.schemas[schema_id] = (
+                    Schema.from_dict(item['schema']),
+                    item['fetched_at']
+                )
+        for subject, item in data.get('latest', {}).items():
+            if subject not in self.latest or \
+                    self.latest[subject][1] < item['fetched_at']:
+                self.latest[subject] = (
+                    RegisteredSchema.from_dict(item['schema']),
+                    item['fetched_at']
+                )
+
+    def load(self):
+        """Прогрев кэша из файла."""
+        data = self._read_file().get(self.url, {})
+        with self.lock:
+            self._merge(data)
+        if data:
+            logger.info(
+                f"Кэш схем загружен из {self.path}: "
+                f"subject'ов {len(self.registered)}, схем {len(self.schemas)}"
+            )
+
+    def _dump(self) -> dict:
+        return {
+            'registered': [
+                {
+                    'subject': subject,
+                    'schema_str': schema_str,
+                    'schema': registered.to_dict(),
+                    'fetched_at': fetched_at
+                }
+                for (subject, schema_str), (registered, fetched_at)
+                in self.registered.items()
+            ],
+            'schemas': {
+                str(schema_id): {
+                    'schema': schema.to_dict(),
+                    'fetched_at': fetched_at
+                }
+                for schema_id, (schema, fetched_at) in self.schemas.items()
+            },
+            'latest': {
+                subject: {
+                    'schema': registered.to_dict(),
+                    'fetched_at': fetched_at
+                }
+                for subject, (registered, fetched_at) in self.latest.items()
+            }
+        }
+
+    def save(self):
+        """Атомарная запись кэша в файл, ошибки записи не прерывают работу."""
+        if self.path is None:
+            return
+        try:
+            data = self._read_file()
+            with self.lock:
+                self._merge(data.get(self.url, {}))
+                data[self.url] = self._dump()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(
+                f"{self.path.name}.{os.getpid()}.tmp"
+            )
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(data, file, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить кэш схем {self.path}: {e}")
+
+
+class CachedSchemaRegistryClient(SchemaRegistryClient):
+    """
+    Клиент Schema Registry, который сначала обращается к SchemaCache.
+
+    Записи старше ttl обновляются из Schema Registry; если реестр
+    недоступен, используется устаревшая запись, а ошибка пробрасывается
+    только для схем, которых нет в кэше. Схема по ID в реестре
+    не меняется, поэтому такие записи не устаревают.
+    """
+
+    def __init__(self, conf: dict, cache: SchemaCache):
+        super().__init__(conf)
+        self.cache = cache
+
+    def _cached(self, entry, fetch: Callable, store: Callable):
+        if entry is not None and self.cache.is_fresh(entry[1]):
+            return entry[0]
+        try:
+            result = fetch()
+        except Exception as e:
+            if entry is None:
+                raise
+            logger.warning(
+                f"Schema Registry недоступен, используется кэш схем: {e}"
+            )
+            return entry[0]
+        with self.cache.lock:
+            store(result, time.time())
+        self.cache.save()
+        return result
+
+    def register_schema_full_response(
+            self,
+            subject_name: str,
+            schema: Schema,
+            normalize_schemas: bool = False
+    ) -> RegisteredSchema:
+        key = (subject_name, schema.schema_str)
+
+        def store(registered, fetched_at):
+            if registered.schema is None:
+                registered.schema = schema
+            if registered.subject is None:
+                registered.subject = subject_name
+            self.cache.registered[key] = (registered, fetched_at)
+
+        return self._cached(
+            self.cache.registered.get(key),
+            partial(
+                super().register_schema_full_response,
+                subject_name,
+                schema,
+                normalize_schemas
+            ),
+            store
+        )
+
+    def lookup_schema(
+            self,
+            subject_name: str,
+            schema: Schema,
+            normalize_schemas: bool = False,
+            fmt: Optional[str] = None,
+            deleted: bool = False
+    ) -> RegisteredSchema:
+        key = (subject_name, schema.schema_str)
+
+        def store(registered, fetched_at):
+            self.cache.registered[key] = (registered, fetched_at)
+
+        return self._cached(
+            self.cache.registered.get(key),
+            partial(
+                super().lookup_schema,
+                subject_name,
+                schema,
+                normalize_schemas,
+                fmt,
+                deleted
+            ),
+            store
+        )
+
+    def get_schema(
+            self,
+            schema_id: int,
+            subject_name: Optional[str] = None,
+            fmt: Optional[str] = None,
+            reference_format: Optional[str] = None
+    ) -> Schema:
+        entry = self.cache.schemas.get(schema_id)
+        if entry is not None:
+            return entry[0]
+
+        def store(schema, fetched_at):
+            self.cache.schemas[schema_id] = (schema, fetched_at)
+
+        return self._cached(
+            None,
+            partial(
+                super().get_schema,
+                schema_id,
+                subject_name,
+                fmt,
+                reference_format
+            ),
+            store
+        )
+
+    def get_latest_version(
+            self,
+            subject_name: str,
+            fmt: Optional[str] = None
+    ) -> RegisteredSchema:
+        def store(registered, fetched_at):
+            self.cache.latest[subject_name] = (registered, fetched_at)
+            if registered.schema_id is not None:
+                self.cache.schemas[registered.schema_id] = (
+                    registered.schema,
+                    fetched_at
+                )
+
+        return self._cached(
+            self.cache.latest.get(subject_name),
+            partial(super().get_latest_version, subject_name, fmt),
+            store
+        )
+
+    def warm_up(self, subject_name: str, schema: Schema):
+        """
+        Регистрирует схему заранее, чтобы первое сообщение
+        не ждало запроса к Schema Registry.
+        """
+        try:
+            self.register_schema_full_response(subject_name, schema)
+        except Exception as e:
+            logger.warning(
+                f"Не удалось зарегистрировать схему {subject_name}: {e}"
+            )
+
+
+# Клиенты по URL реестра, общие для всех продюсеров и консьюмеров процесса
+schema_registry_clients: dict[str, CachedSchemaRegistryClient] = {}
+schema_registry_pid: Optional[int] = None
+schema_registry_clients_lock = threading.Lock()
+
+
+def get_schema_registry_client(url: str) -> CachedSchemaRegistryClient:
+    """
+    Общий для процесса клиент Schema Registry с кэшем схем
+    (при KAFKA_TRANSPORT=memory - реестр в памяти процесса).
+    """
+    global schema_registry_pid
+    if is_memory_transport():
+        return get_memory_schema_registry()
+    with schema_registry_clients_lock:
+        if schema_registry_pid != os.getpid():
+            # HTTP-клиент не переиспользуется после fork
+            schema_registry_clients.clear()
+            schema_registry_pid = os.getpid()
+        client = schema_registry_clients.get(url)
+        if client is None:
+            client = CachedSchemaRegistryClient(
+                {'url': url},
+                SchemaCache(
+                    url,
+                    settings.schema_cache_path,
+                    settings.schema_cache_ttl
+                )
+            )
+            schema_registry_clients[url] = client
+        return client
@@ -0,0 +1,374 @@
+"""
+Быстрая сериализация JSON в формате Confluent Schema Registry.
+
+Формат сообщения совместим с JSONSerializer/JSONDeserializer:
+нулевой magic byte, 4 байта ID схемы (big-endian) и JSON документ.
+Кодирование выполняет orjson, валидатор собирается один раз
+на схему вместо полной проверки jsonschema для каждого сообщения.
+"""
+import struct
+from typing import Any, Callable, Iterable, Optional
+
+import orjson
+from confluent_kafka.schema_registry import (
+    Schema,
+    SchemaRegistryClient,
+    topic_subject_name_strategy
+)
+from confluent_kafka.schema_registry.json_schema import (
+    JSONDeserializer,
+    JSONSerializer
+)
+from confluent_kafka.serialization import SerializationContext, SerializationError
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
+
+from core.config import settings
+
+
+MAGIC_BYTE = 0
+HEADER = struct.Struct('>bI')
+
+# Проверка значения: None, если значение корректно, иначе текст ошибки
+Check = Callable[[Any], Optional[str]]
+
+# Ключевые слова, которые понимает собранный валидатор,
+# для остальных используется валидатор jsonschema
+ANNOTATIONS = frozenset({
+    '$schema', '$id', '$comment', 'title', 'description',
+    'default', 'examples'
+})
+KEYWORDS = ANNOTATIONS | {
+    'type', 'enum', 'properties', 'required', 'additionalProperties', 'items'
+}
+TYPES = {
+    'string': (str,),
+    'integer': (int,),
+    'number': (int, float),
+    'boolean': (bool,),
+    'object': (dict,),
+    'array': (list,),
+    'null': (type(None),)
+}
+
+
+def _accept(value) -> None:
+    return None
+
+
+def _json_equal(first, second) -> bool:
+    """
+    Равенство значений по JSON Schema (как в jsonschema): bool не равен
+    числу, хотя в Python True == 1, числа сравниваются по значению,
+    массивы и объекты - поэлементно.
+    """
+    if isinstance(first, bool) or isinstance(second, bool):
+        return type(first) is type(second) and first == second
+    if isinstance(first, (int, float)) and isinstance(second, (int, float)):
+        return first == second
+    if type(first) is not type(second):
+        return False
+    if isinstance(first, list):
+        return len(first) == len(second) and all(
+            _json_equal(a, b) for a, b in zip(first, second)
+        )
+    if isinstance(first, dict):
+        return first.keys() == second.keys() and all(
+            _json_equal(value, second[key]) for key, value in first.items()
+        )
+    return first == second
+
+
+def _compile_type(types) -> Optional[Check]:
+    if isinstance(types, str):
+        types = (types,)
+    if any(name not in TYPES for name in types):
+        return None
+    classes = tuple(cls for name in types for cls in TYPES[name])
+    # bool в Python - подкласс int, а в JSON Schema это разные типы
+    reject_bool = 'boolean' not in types
+    # 1.0 в JSON Schema считается целым числом
+    integer_floats = 'integer' in types and 'number' not in types
+    expected = ', '.join(types)
+
+    def check_type(value):
+        if isinstance(value, classes) and not (
+            reject_bool and isinstance(value, bool)
+        ):
+            return None
+        if integer_floats and isinstance(value, float) and value.is_integer():
+            return None
+        return f"ожидается тип {expected}"
+    return check_type
+
+
+def _compile_object(schema: dict) -> Optional[Check]:
+    properties = {}
+    for name, subschema in schema.get('properties', {}).items():
+        check = _compile(subschema)
+        if check is None:
+            return None
+        properties[name] = check
+    required = tuple(schema.get('required', ()))
+    additional = schema.get('additionalProperties', True)
+    if additional is True:
+        check_additional = None
+    elif additional is False:
+        check_additional = False
+    else:
+        check_additional = _compile(additional)
+        if check_additional is None:
+            return None
+
+    def check_object(value):
+        if not isinstance(value, dict):
+            return None
+        for name in required:
+            if name not in value:
+                return f"отсутствует обязательное поле '{name}'"
+        for name, item in value.items():
+            check = properties.get(name, check_additional)
+            if check is None:
+                continue
+            if check is False:
+                return f"лишнее поле '{name}'"
+            error = check(item)
+            if error is not None:
+                return f"'{name}': {error}"
+        return None
+    return check_object
+
+
+def _compile_items(schema: dict) -> Optional[Check]:
+    check_item = _compile(schema['items'])
+    if check_item is None:
+        return None
+
+    def check_items(value):
+        if not isinstance(value, list):
+            return None
+        for index, item in enumerate(value):
+            error = check_item(item)
+            if error is not None:
+                return f"[{index}]: {error}"
+        return None
+    return check_items
+
+
+def _compile(schema) -> Optional[Check]:
+    """Собирает проверку схемы или возвращает None для неподдерживаемой."""
+    if schema is True:
+        return _accept
+    if not isinstance(schema, dict) or not schema.keys() <= KEYWORDS:
+        return None
+    checks = []
+    if 'type' in schema:
+        checks.append(_compile_type(schema['type']))
+    if 'enum' in schema:
+        allowed = schema['enum']
+        checks.append(
+            lambda value: None
+            if any(_json_equal(value, item) for item in allowed)
+            else "значение не из enum"
+        )
+    if schema.keys() & {'properties', 'required', 'additionalProperties'}:
+        checks.append(_compile_object(schema))
+    if 'items' in schema:
+        if not isinstance(schema['items'], (dict, bool)):
+            return None
+        checks.append(_compile_items(schema))
+    if any(check is None for check in checks):
+        return None
+    if not checks:
+        return _accept
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(value):
+        for check in checks:
+            error = check(value)
+            if error is not None:
+                return error
+        return None
+    return check_all
+
+
+def compile_validator(schema: dict) -> Callable[[Any], None]:
+    """
+    Возвращает функцию проверки документа по схеме,
+    которая выбрасывает SerializationError.
+    """
+    check = _compile(schema)
+    if check is None:
+        validator = validator_for(schema)(schema)
+
+        def validate_full(value):
+            error = best_match(validator.iter_errors(value))
+            if error is not None:
+                raise SerializationError(error.message)
+        return validate_full
+
+    def validate(value):
+        error = check(value)
+        if error is not None:
+            raise SerializationError(error)
+    return validate
+
+
+class FastJSONSerializer:
+    """Сериализатор JSON с заголовком Confluent и предсобранным валидатором."""
+
+    def __init__(
+            self,
+            schema_str: str,
+            schema_registry_client: SchemaRegistryClient,
+            validate: bool = True
+    ):
+        self.schema = Schema(schema_str, schema_type='JSON')
+        self.schema_registry_client = schema_registry_client
+        self.validate = (
+            compile_validator(orjson.loads(schema_str)) if validate else None
+        )
+        # Заголовок (magic byte и ID схемы) по subject
+        self._headers: dict[str, bytes] = {}
+
+    def header(self, ctx: SerializationContext) -> bytes:
+        subject = topic_subject_name_strategy(ctx, None)
+        header = self._headers.get(subject)
+        if header is None:
+            registered = self.schema_registry_client.register_schema_full_response(
+                subject,
+                self.schema
+            )
+            header = HEADER.pack(MAGIC_BYTE, registered.schema_id)
+            self._headers[subject] = header
+        return header
+
+    def __call__(self, obj, ctx: SerializationContext) -> Optional[bytes]:
+        if obj is None:
+            return None
+        header = self.header(ctx)
+        if self.validate is not None:
+            self.validate(obj)
+        return header + orjson.dumps(obj)
+
+    def serialize_batch(
+            self,
+            objs: Iterable,
+            ctx: SerializationContext
+    ) -> list[bytes]:
+        """Сериализация пачки с одним получением заголовка."""
+        header = self.header(ctx)
+        validate = self.validate
+        dumps = orjson.dumps
+        result = []
+        for obj in objs:
+            if validate is not None:
+                validate(obj)
+            result.append(header + dumps(obj))
+        return result
+
+
+class FastJSONDeserializer:
+    """
+    Десериализатор JSON в формате Confluent.
+
+    Если передан schema_str, документы проверяются по ней (как
+    у JSONDeserializer), иначе по схеме писателя, полученной
+    из Schema Registry по ID; валидатор собирается один раз на ID.
+    """
+
+    def __init__(
+            self,
+            schema_str: Optional[str] = None,
+            schema_registry_client: Optional[SchemaRegistryClient] = None,
+            validate: bool = True
+    ):
+        self.schema_registry_client = schema_registry_client
+        self.validate = validate
+        self._reader_validator = (
+            compile_validator(orjson.loads(schema_str))
+            if schema_str and validate else None
+        )
+        self._validators: dict[int, Callable[[Any], None]] = {}
+
+    def validator(self, schema_id: int) -> Optional[Callable[[Any], None]]:
+        if not self.validate:
+            return None
+        if self._reader_validator is not None:
+            return self._reader_validator
+        validator = self._validators.get(schema_id)
+        if validator is None:
+            schema = self.schema_registry_client.get_schema(schema_id)
+            validator = compile_validator(orjson.loads(schema.schema_str))
+            self._validators[schema_id] = validator
+        return validator
+
+    def _decode(self, data: bytes):
+        if len(data) < HEADER.size or data[0] != MAGIC_BYTE:
+            raise SerializationError(
+                "Сообщение не в формате Confluent Schema Registry"
+            )
+        _, schema_id = HEADER.unpack_from(data)
+        try:
+            value = orjson.loads(memoryview(data)[HEADER.size:])
+        except orjson.JSONDecodeError as e:
+            raise SerializationError(f"Некорректный JSON: {e}")
+        return schema_id, value
+
+    def __call__(self, data: Optional[bytes], ctx=None):
+        if data is None:
+            return None
+        schema_id, value = self._decode(data)
+        validator = self.validator(schema_id)
+        if validator is not None:
+            validator(value)
+        return value
+
+    def deserialize_batch(self, datas: Iterable[Optional[bytes]], ctx=None) -> list:
+        """Десериализация пачки, валидатор ищется при смене ID схемы."""
+        result = []
+        last_id = None
+        validator = None
+        for data in datas:
+            if data is None:
+                result.append(None)
+                continue
+            schema_id, value = self._decode(data)
+            if schema_id != last_id:
+                validator = self.validator(schema_id)
+                last_id = schema_id
+            if validator is not None:
+                validator(value)
+            result.append(value)
+        return result
+
+
+def deserialize_batch(deserializer, datas: list, ctx: SerializationContext) -> list:
+    """Пачка через deserialize_batch, если десериализатор его поддерживает."""
+    if isinstance(deserializer, FastJSONDeserializer):
+        return deserializer.deserialize_batch(datas, ctx)
+    return [deserializer(data, ctx) for data in datas]
+
+
+def make_json_serializer(
+        schema_str: str,
+        schema_registry_client: SchemaRegistryClient
+):
+    """Сериализатор, выбранный настройкой JSON_SERDE."""
+    if settings.json_serde == 'fast':
+        return FastJSONSerializer(schema_str, schema_registry_client)
+    return JSONSerializer(schema_str, schema_registry_client)
+
+
+def make_json_deserializer(
+        schema_str: str,
+        schema_registry_client: SchemaRegistryClient
+):
+    """Десериализатор, выбранный настройкой JSON_SERDE."""
+    if settings.json_serde == 'fast':
+        return FastJSONDeserializer(schema_str, schema_registry_client)
+    return JSONDeserializer(
+        schema_str=schema_str,
+        schema_registry_client=schema_registry_client
+    )
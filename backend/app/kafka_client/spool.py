@@ -0,0 +1,367 @@
+"""
+Локальный журнал (spool) сообщений на время недоступности брокеров.
+
+Сообщения дописываются в сегментные файлы только на добавление,
+фоновый поток отправляет их в Kafka по порядку, когда кластер
+снова доступен, и сдвигает сохраненную позицию чтения.
+"""
+import fcntl
+import os
+import socket
+import struct
+import threading
+import time
+import zlib
+from itertools import count
+from pathlib import Path
+from typing import Callable, Optional
+
+from core.config import logger
+from core.metrics import SPOOL_MESSAGES
+
+
+# Заголовок записи: длина данных и CRC32
+FRAME = struct.Struct('>II')
+# Данные записи: партиция (-1 - не задана), длина топика, длина ключа,
+# количество заголовков
+RECORD = struct.Struct('>iHiH')
+# Заголовок: длина имени и значения
+HEADER = struct.Struct('>HI')
+NO_KEY = -1
+SEGMENT_SUFFIX = '.log'
+
+# Запись журнала: (topic, key, value, partition, headers)
+SpoolRecord = tuple[
+    str,
+    Optional[bytes],
+    bytes,
+    Optional[int],
+    Optional[list[tuple[str, bytes]]]
+]
+
+
+def encode_record(record: SpoolRecord) -> bytes:
+    topic, key, value, partition, headers = record
+    topic_bytes = topic.encode('utf-8')
+    parts = [
+        RECORD.pack(
+            -1 if partition is None else partition,
+            len(topic_bytes),
+            NO_KEY if key is None else len(key),
+            len(headers or ())
+        ),
+        topic_bytes,
+        key or b''
+    ]
+    for name, header_value in headers or ():
+        name_bytes = name.encode('utf-8')
+        parts += (
+            HEADER.pack(len(name_bytes), len(header_value)),
+            name_bytes,
+            header_value
+        )
+    parts.append(value)
+    payload = b''.join(parts)
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_record(payload: bytes) -> SpoolRecord:
+    partition, topic_length, key_length, headers_count = \
+        RECORD.unpack_from(payload)
+    position = RECORD.size
+    topic = payload[position:position + topic_length].decode('utf-8')
+    position += topic_length
+    key = None
+    if key_length != NO_KEY:
+        key = payload[position:position + key_length]
+        position += key_length
+    headers = []
+    for _ in range(headers_count):
+        name_length, value_length = HEADER.unpack_from(payload, position)
+        position += HEADER.size
+        name = payload[position:position + name_length].decode('utf-8')
+        position += name_length
+        headers.append((name, payload[position:position + value_length]))
+        position += value_length
+    return (
+        topic,
+        key,
+        payload[position:],
+        None if partition < 0 else partition,
+        headers or None
+    )
+
+
+def claim_spool_dir(base_dir: Path) -> tuple[Path, int]:
+    """
+    Захватывает каталог журнала процесса блокировкой файла.
+
+    Каталоги называются <hostname>-<n>: после перезапуска процесс
+    получает тот же каталог и дочитывает оставшиеся сообщения,
+    а несколько воркеров одного хоста не пишут в один журнал.
+    """
+    hostname = socket.gethostname()
+    for index in count():
+        directory = base_dir / f'{hostname}-{index}'
+        directory.mkdir(parents=True, exist_ok=True)
+        lock_fd = os.open(directory / 'lock', os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(lock_fd)
+            continue
+        return directory, lock_fd
+
+
+class DiskSpool:
+    """
+    Журнал сообщений в сегментных файлах.
+
+    Позиция - пара (номер сегмента, смещение). Запись всегда идет
+    в новый сегмент после запуска, поэтому недописанный при сбое
+    хвост старого сегмента не смешивается с новыми записями.
+    """
+
+    def __init__(
+            self,
+            base_dir: str,
+            segment_bytes: int = 64 * 1024 * 1024,
+            fsync: bool = True
+    ):
+        self.directory, self._lock_fd = claim_spool_dir(Path(base_dir))
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        segments = self._segments()
+        self._cursor = self._load_cursor(segments[0] if segments else 0)
+        self._write_seq = (segments[-1] + 1) if segments else self._cursor[0]
+        self._file = open(self._segment_path(self._write_seq), 'ab')
+        self._write_pos = (self._write_seq, 0)
+        if segments:
+            logger.warning(
+                f"В журнале {self.directory} остались неотправленные "
+                f"сообщения, сегментов: {len(segments)}"
+            )
+
+    def _segment_path(self, seq: int) -> Path:
+        return self.directory / f'{seq:012d}{SEGMENT_SUFFIX}'
+
+    def _segments(self) -> list[int]:
+        return sorted(
+            int(path.stem)
+            for path in self.directory.glob(f'*{SEGMENT_SUFFIX}')
+            if path.stat().st_size
+        )
+
+    def _load_cursor(self, first_seq: int) -> tuple[int, int]:
+        try:
+            seq, offset = (
+                self.directory / 'cursor'
+            ).read_text().split()
+            return max((int(seq), int(offset)), (first_seq, 0))
+        except (OSError, ValueError):
+            return (first_seq, 0)
+
+    def _save_cursor(self):
+        path = self.directory / 'cursor'
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(f'{self._cursor[0]} {self._cursor[1]}')
+        os.replace(tmp_path, path)
+
+    def has_pending(self) -> bool:
+        """Есть ли неотправленные сообщения."""
+        return self._cursor < self._write_pos
+
+    def append(self, records: list[SpoolRecord]):
+        """Дописывает сообщения в журнал (один fsync на вызов)."""
+        data = b''.join(encode_record(record) for record in records)
+        with self._lock:
+            if self._write_pos[1] and \
+                    self._write_pos[1] + len(data) > self.segment_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._write_pos = (self._write_seq, self._write_pos[1] + len(data))
+
+    def _rotate(self):
+        self._file.close()
+        self._write_seq += 1
+        self._file = open(self._segment_path(self._write_seq), 'ab')
+        self._write_pos = (self._write_seq, 0)
+
+    def read(self, limit: int) -> tuple[list[SpoolRecord], tuple[int, int]]:
+        """
+        Читает до limit сообщений с текущей позиции.
+        Возвращает сообщения и позицию после них для commit().
+        """
+        with self._lock:
+            write_pos = self._write_pos
+        seq, offset = self._cursor
+        records = []
+        while len(records) < limit and (seq, offset) < write_pos:
+            path = self._segment_path(seq)
+            if not path.exists():
+                seq, offset = seq + 1, 0
+                continue
+            end_of_segment = False
+            with open(path, 'rb') as file:
+                file.seek(offset)
+                while len(records) < limit:
+                    header = file.read(FRAME.size)
+                    if len(header) < FRAME.size:
+                        end_of_segment = True
+                        break
+                    length, crc = FRAME.unpack(header)
+                    payload = file.read(length)
+                    if len(payload) < length or zlib.crc32(payload) != crc:
+                        logger.error(
+                            f"Поврежденная запись в {path} на смещении "
+                            f"{offset}, остаток сегмента пропущен"
+                        )
+                        end_of_segment = True
+                        break
+                    records.append(decode_record(payload))
+                    offset += FRAME.size + length
+            if end_of_segment and seq < write_pos[0]:
+                seq, offset = seq + 1, 0
+            elif end_of_segment:
+                break
+        return records, (seq, offset)
+
+    def commit(self, position: tuple[int, int]):
+        """Сохраняет позицию чтения и удаляет отправленные сегменты."""
+        self._cursor = position
+        self._save_cursor()
+        for seq in self._segments():
+            if seq < position[0]:
+                self._segment_path(seq).unlink(missing_ok=True)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        os.close(self._lock_fd)
+
+
+class CircuitBreaker:
+    """
+    Размыкатель: после failure_threshold ошибок подряд (или сообщения
+    librdkafka о недоступности всех брокеров) API перестает ждать
+    кластер и пишет в журнал. Через reset_timeout разрешается проверка.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 5.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def trip(self):
+        if self._opened_at is None:
+            logger.warning("Kafka недоступна, сообщения пишутся в журнал")
+        self._opened_at = time.monotonic()
+
+    def record_failure(self):
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            self.trip()
+
+    def record_success(self):
+        if self._opened_at is not None:
+            logger.info("Kafka снова доступна")
+        self._failures = 0
+        self._opened_at = None
+
+
+class SpoolDrainer(threading.Thread):
+    """
+    Фоновая отправка сообщений из журнала по порядку.
+    Позиция сдвигается только после подтверждения всей порции,
+    при ошибке порция отправляется повторно (at-least-once).
+    После паузы размыкателя кластер сначала проверяется probe,
+    чтобы не копить повторы в очереди продюсера.
+    """
+
+    def __init__(
+            self,
+            spool: DiskSpool,
+            breaker: CircuitBreaker,
+            produce: Callable,
+            probe: Callable[[], bool],
+            batch_size: int = 500,
+            delivery_timeout: float = 10.0,
+            client: str = 'producer'
+    ):
+        super().__init__(daemon=True, name=f'{client}-spool')
+        self.spool = spool
+        self.breaker = breaker
+        self.produce = produce
+        self.probe = probe
+        self.batch_size = batch_size
+        self.delivery_timeout = delivery_timeout
+        self._stop_event = threading.Event()
+        self._replayed = SPOOL_MESSAGES.labels(client, 'replayed')
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=self.delivery_timeout + 1)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if not self.spool.has_pending() or \
+                    self.breaker.state == CircuitBreaker.OPEN:
+                self._stop_event.wait(0.1)
+                continue
+            if self.breaker.state == CircuitBreaker.HALF_OPEN and \
+                    not self.probe():
+                self.breaker.trip()
+                continue
+            try:
+                self.drain_batch()
+            except Exception as e:
+                logger.error(f"Ошибка отправки сообщений из журнала: {e}")
+                self.breaker.trip()
+
+    def drain_batch(self):
+        records, position = self.spool.read(self.batch_size)
+        if not records:
+            self.spool.commit(position)
+            return
+        done = threading.Event()
+        remaining = [len(records)]
+        errors = []
+        lock = threading.Lock()
+
+        def on_delivery(err, msg):
+            with lock:
+                if err:
+                    errors.append(err)
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    done.set()
+
+        for topic, key, value, partition, headers in records:
+            self.produce(topic, key, value, partition, headers, on_delivery)
+        if not done.wait(self.delivery_timeout) or errors:
+            logger.warning(
+                f"Не удалось отправить порцию из журнала: "
+                f"{errors[0] if errors else 'таймаут'}"
+            )
+            self.breaker.trip()
+            return
+        self.spool.commit(position)
+        self._replayed.inc(len(records))
+        self.breaker.record_success()
+        logger.info(f"Из журнала отправлено сообщений: {len(records)}")
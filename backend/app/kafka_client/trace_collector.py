@@ -0,0 +1,140 @@
+"""
+Сборщик трассировки: читает конечные топики конвейера, дописывает
+этап collect и выводит перцентили задержек переходов и полной
+задержки в JSON.
+
+Запуск из каталога backend/app:
+    python -m kafka_client.trace_collector [--duration 60] \
+        [--topics filtered_messages_topic,blocked_users_topic,<KAFKA_TOPIC>]
+
+По умолчанию читаются filtered_messages_topic и топики /api/message
+с учетом KAFKA_TOPIC_ROUTING (<KAFKA_TOPIC>.one и <KAFKA_TOPIC>.many
+в режиме topic). Читаются только новые сообщения (отдельная группа
+без коммитов).
+"""
+import argparse
+import json
+import time
+import uuid
+from collections import defaultdict
+
+from confluent_kafka import Consumer
+
+from core.config import settings
+from kafka_client.consumers import BatchMessageConsumer, SingleMessageConsumer
+from kafka_client.tracing import Hop, hop_latencies, now_us, parse_hops
+from kafka_client.worker import build_router
+
+
+STAGE_COLLECT = 'collect'
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: list[float], pct: int) -> float:
+    """Перцентиль по ближайшему рангу (values отсортирован)."""
+    index = max(int(len(values) * pct / 100 + 0.5) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def summarize(values: list[float]) -> dict:
+    values = sorted(values)
+    result = {'count': len(values)}
+    for pct in PERCENTILES:
+        result[f'p{pct}_ms'] = round(percentile(values, pct) * 1e3, 3)
+    result['max_ms'] = round(values[-1] * 1e3, 3)
+    return result
+
+
+class TraceCollector:
+    """Накопитель задержек по топикам: переходы и полная задержка."""
+
+    def __init__(self):
+        self.hops = defaultdict(lambda: defaultdict(list))
+        self.totals = defaultdict(list)
+        self.untraced = defaultdict(int)
+
+    def add(self, topic: str, headers, timestamp_us: int):
+        hops = parse_hops(headers)
+        if not hops:
+            self.untraced[topic] += 1
+            return
+        hops.append(Hop(STAGE_COLLECT, timestamp_us))
+        for hop, seconds in hop_latencies(hops):
+            self.hops[topic][hop].append(max(seconds, 0))
+        self.totals[topic].append(
+            max((timestamp_us - hops[0].timestamp_us) / 1e6, 0)
+        )
+
+    def report(self) -> dict:
+        return {
+            topic: {
+                'total': summarize(totals),
+                'hops': {
+                    hop: summarize(values)
+                    for hop, values in self.hops[topic].items()
+                },
+                'untraced': self.untraced.get(topic, 0)
+            }
+            for topic, totals in self.totals.items()
+        }
+
+
+def default_topics() -> list[str]:
+    """Конечные топики конвейера: Faust и топики ключей /api/message."""
+    router = build_router()
+    topics = ['filtered_messages_topic']
+    for key in (SingleMessageConsumer.message_key,
+                BatchMessageConsumer.message_key):
+        topic = router.topic_for_key(key)
+        if topic not in topics:
+            topics.append(topic)
+    return topics
+
+
+def collect(topics: list[str], duration: float) -> dict:
+    consumer = Consumer({
+        'bootstrap.servers': settings.kafka_bootstrap_servers,
+        'group.id': f'trace-collector-{uuid.uuid4().hex[:8]}',
+        'auto.offset.reset': 'latest',
+        'enable.auto.commit': False
+    })
+    consumer.subscribe(topics)
+    collector = TraceCollector()
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            messages = consumer.consume(num_messages=500, timeout=0.5)
+            received_us = now_us()
+            for msg in messages:
+                if msg.error():
+                    continue
+                collector.add(msg.topic(), msg.headers(), received_us)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        consumer.close()
+    return collector.report()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Перцентили задержек по заголовкам трассировки'
+    )
+    parser.add_argument(
+        '--topics',
+        default=','.join(default_topics()),
+        help='Топики через запятую'
+    )
+    parser.add_argument(
+        '--duration',
+        type=float,
+        default=60.0,
+        help='Время сбора в секундах'
+    )
+    args = parser.parse_args()
+    report = collect(args.topics.split(','), args.duration)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Трассировка сообщений через заголовки Kafka.
+
+Запрос к API получает request ID и время приема (ingest), продюсеры
+добавляют их в заголовки записи вместе со списком этапов (hops)
+"этап@время_мкс,...". Faust и консьюмеры дописывают свои этапы,
+по разнице соседних этапов считается задержка каждого перехода.
+Время - wall clock в микросекундах, поэтому часы хостов должны быть
+синхронизированы.
+"""
+import time
+import uuid
+from contextvars import ContextVar
+from typing import NamedTuple, Optional
+
+from core.config import settings
+from core.metrics import TRACE_HOP_SECONDS, TRACE_TOTAL_SECONDS
+
+
+REQUEST_ID_HEADER = 'x-request-id'
+INGEST_HEADER = 'x-ingest-ts'
+HOPS_HEADER = 'x-trace-hops'
+
+# Этапы
+STAGE_INGEST = 'ingest'
+STAGE_PRODUCE = 'produce'
+STAGE_REPLAY = 'spool_replay'
+
+# Заголовки записи librdkafka: список (имя, значение)
+Headers = list[tuple[str, bytes]]
+
+
+class Trace(NamedTuple):
+    """Трассировка запроса API."""
+    request_id: str
+    ingest_us: int
+
+
+class Hop(NamedTuple):
+    stage: str
+    timestamp_us: int
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar(
+    'current_trace',
+    default=None
+)
+
+
+def now_us() -> int:
+    return time.time_ns() // 1000
+
+
+def start_trace(request_id: Optional[str] = None) -> Trace:
+    """Начинает трассировку запроса (вызывается middleware)."""
+    trace = Trace(request_id or uuid.uuid4().hex, now_us())
+    current_trace.set(trace)
+    return trace
+
+
+def trace_headers(stage: str = STAGE_PRODUCE) -> Optional[Headers]:
+    """
+    Заголовки трассировки текущего запроса с этапом stage.
+    None, если трассировка отключена или запроса нет.
+    """
+    trace = current_trace.get()
+    if trace is None or not settings.trace_headers:
+        return None
+    ingest = str(trace.ingest_us).encode()
+    return [
+        (REQUEST_ID_HEADER, trace.request_id.encode()),
+        (INGEST_HEADER, ingest),
+        (HOPS_HEADER, b'%s@%s,%s@%d' % (
+            STAGE_INGEST.encode(), ingest, stage.encode(), now_us()
+        ))
+    ]
+
+
+def extend_headers(
+    headers: Optional[Headers],
+    stage: str,
+    timestamp_us: Optional[int] = None
+) -> Optional[Headers]:
+    """Копия заголовков с дописанным этапом (без трассировки - None)."""
+    if not headers:
+        return headers
+    hop = b'%s@%d' % (stage.encode(), timestamp_us or now_us())
+    result = []
+    extended = False
+    for name, value in headers:
+        if name == HOPS_HEADER:
+            value = (value + b',' + hop) if value else hop
+            extended = True
+        result.append((name, value))
+    return result if extended else headers
+
+
+def parse_hops(headers) -> list[Hop]:
+    """
+    Этапы из заголовков (список пар или словарь). Некорректный заголовок
+    (например, от внешнего продюсера) считается отсутствием трассировки:
+    трассировка не должна влиять на обработку сообщений.
+    """
+    if not headers:
+        return []
+    items = headers.items() if isinstance(headers, dict) else headers
+    for name, value in items:
+        if name == HOPS_HEADER and value:
+            hops = []
+            try:
+                for item in value.decode().split(','):
+                    stage, _, timestamp = item.rpartition('@')
+                    hops.append(Hop(stage, int(timestamp)))
+            except ValueError:
+                return []
+            return hops
+    return []
+
+
+def hop_latencies(hops: list[Hop]) -> list[tuple[str, float]]:
+    """Задержки переходов между соседними этапами в секундах."""
+    return [
+        (f'{previous.stage}->{hop.stage}',
+         (hop.timestamp_us - previous.timestamp_us) / 1e6)
+        for previous, hop in zip(hops, hops[1:])
+    ]
+
+
+class TraceRecorder:
+    """
+    Дописывает этап stage к трассировке полученного сообщения
+    и записывает задержки переходов и полную задержку в метрики.
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def record(self, topic: str, headers, timestamp_us: Optional[int] = None):
+        hops = parse_hops(headers)
+        if not hops:
+            return
+        hops.append(Hop(self.stage, timestamp_us or now_us()))
+        for hop, seconds in hop_latencies(hops):
+            TRACE_HOP_SECONDS.labels(topic, hop).observe(max(seconds, 0))
+        TRACE_TOTAL_SECONDS.labels(topic, self.stage).observe(
+            max((hops[-1].timestamp_us - hops[0].timestamp_us) / 1e6, 0)
+        )
@@ -0,0 +1,79 @@
+"""
+Транспорт клиентов Kafka (KAFKA_TRANSPORT).
+
+kafka - librdkafka (confluent_kafka) и Schema Registry по HTTP;
+memory - брокер и Schema Registry в памяти процесса
+(kafka_client.memory_broker) для тестов и бенчмарков на одной машине.
+Продюсеры и консьюмеры создают клиентов только через этот модуль.
+"""
+import threading
+from typing import Optional
+
+from confluent_kafka import Consumer, Producer
+
+from core.config import settings, logger
+from kafka_client.memory_broker import (MemoryBroker, MemoryConsumer,
+                                        MemoryProducer,
+                                        MemorySchemaRegistryClient)
+
+
+TRANSPORT_KAFKA = 'kafka'
+TRANSPORT_MEMORY = 'memory'
+TRANSPORTS = (TRANSPORT_KAFKA, TRANSPORT_MEMORY)
+
+# Брокер и Schema Registry в памяти, общие для всех клиентов процесса
+memory_broker: Optional[MemoryBroker] = None
+memory_schema_registry: Optional[MemorySchemaRegistryClient] = None
+memory_lock = threading.Lock()
+
+
+def check_transport(transport: str) -> str:
+    if transport not in TRANSPORTS:
+        raise ValueError(
+            f"Неизвестный транспорт Kafka: {transport}, "
+            f"доступны: {', '.join(TRANSPORTS)}"
+        )
+    return transport
+
+
+def is_memory_transport() -> bool:
+    return check_transport(settings.kafka_transport) == TRANSPORT_MEMORY
+
+
+def get_memory_broker() -> MemoryBroker:
+    """Брокер в памяти процесса (создается при первом обращении)."""
+    global memory_broker
+    with memory_lock:
+        if memory_broker is None:
+            memory_broker = MemoryBroker(
+                settings.memory_topic_partitions,
+                settings.memory_retention_messages
+            )
+            logger.warning(
+                "Используется брокер Kafka в памяти процесса "
+                "(KAFKA_TRANSPORT=memory)"
+            )
+        return memory_broker
+
+
+def get_memory_schema_registry() -> MemorySchemaRegistryClient:
+    """Schema Registry в памяти процесса."""
+    global memory_schema_registry
+    with memory_lock:
+        if memory_schema_registry is None:
+            memory_schema_registry = MemorySchemaRegistryClient()
+        return memory_schema_registry
+
+
+def create_producer(conf: dict):
+    """Продюсер выбранного транспорта (интерфейс confluent_kafka.Producer)."""
+    if is_memory_transport():
+        return MemoryProducer(conf, get_memory_broker())
+    return Producer(conf)
+
+
+def create_consumer(conf: dict):
+    """Консьюмер выбранного транспорта (интерфейс confluent_kafka.Consumer)."""
+    if is_memory_transport():
+        return MemoryConsumer(conf, get_memory_broker())
+    return Consumer(conf)
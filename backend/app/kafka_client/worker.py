@@ -0,0 +1,155 @@
+"""
+Отдельный сервис консьюмеров.
+
+Запуск из каталога app:
+    python -m kafka_client.worker
+Запускает CONSUMER_WORKER_PROCESSES процессов, в каждом работают
+оба консьюмера. SIGTERM/SIGINT пересылается процессам, они останавливают
+консьюмеры и закрывают их.
+Упавший процесс перезапускается (не более CONSUMER_WORKER_MAX_RESTARTS раз),
+после этого сервис останавливается с ненулевым кодом выхода.
+Метрики всех процессов отдаются на порту CONSUMER_METRICS_PORT.
+"""
+import multiprocessing
+import multiprocessing.connection
+import signal
+import sys
+import threading
+
+from core.config import settings, logger
+from core.multiproc import prepare_multiproc_dir
+
+if __name__ == '__main__':
+    # Каталог метрик готовится до импорта prometheus_client: процессы
+    # консьюмеров создаются через fork и наследуют режим multiprocess
+    prepare_multiproc_dir()
+
+from core.metrics import mark_process_dead, start_metrics_server  # noqa: E402
+from kafka_client.consumers import run_consumers, stop_consumers  # noqa: E402
+from kafka_client.routing import KeyRouter  # noqa: E402
+from kafka_client.schemas import json_schema_str  # noqa: E402
+
+
+def build_router() -> KeyRouter:
+    """Маршрутизатор сообщений по ключу из настроек."""
+    return KeyRouter(
+        settings.kafka_topic,
+        settings.kafka_topic_routing,
+        settings.kafka_key_partitions
+    )
+
+
+def start_consumers(router: KeyRouter = None) -> dict:
+    """Запуск консьюмеров с параметрами из настроек."""
+    return run_consumers(
+        bootstrap_servers=settings.kafka_bootstrap_servers,
+        topic=settings.kafka_topic,
+        single_group_id=settings.single_consumer_group_id,
+        batch_group_id=settings.batch_consumer_group_id,
+        schema_registry_url=settings.kafka_schemaregistry_url,
+        schema_str=json_schema_str,
+        single_options={
+            'commit_every': settings.single_consumer_commit_every,
+            'commit_interval': settings.single_consumer_commit_interval,
+            'workers': settings.consumer_workers,
+            'max_queue': settings.consumer_max_queue
+        },
+        batch_options={
+            'max_batch_size': settings.batch_consumer_max_messages,
+            'max_batch_wait': settings.batch_consumer_max_wait,
+            'max_batch_bytes': settings.batch_consumer_max_bytes,
+            'workers': settings.consumer_workers,
+            'max_queue': settings.consumer_max_queue
+        },
+        router=router or build_router(),
+        message_format=settings.message_format
+    )
+
+
+def consumer_process():
+    """Процесс с консьюмерами, работает до SIGTERM от главного процесса."""
+    # Свое событие остановки в каждом процессе: общий multiprocessing.Event
+    # остается заблокированным, если процесс убит во время wait()
+    stop_event = threading.Event()
+    # SIGINT обрабатывает главный процесс и пересылает SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    consumers_info = start_consumers()
+    failed = False
+    try:
+        while not stop_event.wait(timeout=1.0):
+            if not all(thread.is_alive() for thread in consumers_info['threads']):
+                logger.error("Поток консьюмера завершился, остановка процесса")
+                failed = True
+                break
+    finally:
+        stop_consumers(consumers_info)
+    if failed:
+        sys.exit(1)
+
+
+def start_process(index: int) -> multiprocessing.Process:
+    process = multiprocessing.Process(
+        target=consumer_process,
+        name=f"consumer-worker-{index}"
+    )
+    process.start()
+    return process
+
+
+def main():
+    processes_count = settings.consumer_worker_processes
+    processes = {}
+    stopping = threading.Event()
+
+    def stop_processes():
+        stopping.set()
+        for process in list(processes.values()):
+            process.terminate()
+
+    def handle_signal(signum, frame):
+        logger.info(f"Получен сигнал {signum}, остановка консьюмеров")
+        stop_processes()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    for index in range(processes_count):
+        processes[index] = start_process(index)
+    logger.info(f"Запущено процессов консьюмеров: {processes_count}")
+    if settings.consumer_metrics_port:
+        start_metrics_server(settings.consumer_metrics_port)
+    restarts = 0
+    exit_code = 0
+    # Ждем завершения любого процесса; до остановки сервиса это падение
+    while processes:
+        sentinels = {
+            process.sentinel: index for index, process in processes.items()
+        }
+        for sentinel in multiprocessing.connection.wait(list(sentinels)):
+            index = sentinels[sentinel]
+            process = processes.pop(index)
+            process.join()
+            mark_process_dead(process.pid)
+            if stopping.is_set():
+                continue
+            logger.error(f"Процесс {process.name} завершился с кодом "
+                         f"{process.exitcode}")
+            if restarts < settings.consumer_worker_max_restarts:
+                restarts += 1
+                processes[index] = start_process(index)
+                logger.info(f"Процесс {process.name} перезапущен "
+                            f"({restarts}/"
+                            f"{settings.consumer_worker_max_restarts})")
+            else:
+                logger.error("Превышено число перезапусков процессов, "
+                             "остановка сервиса консьюмеров")
+                exit_code = 1
+                stop_processes()
+    logger.info("Сервис консьюмеров остановлен")
+    if exit_code:
+        sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,20 @@
+import os
 import threading
 import uvicorn
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import ORJSONResponse
 
+from api.middleware import RequestMetricsMiddleware, TraceMiddleware
 from api.routers import main_router
 from core.config import settings, logger
+from core.multiproc import prepare_multiproc_dir
+from kafka_client.base_producer import ProducerOverloaded
 from kafka_client.producer import init_producer, get_producer
 from kafka_client.producer_plain import init_plain_producer, get_plain_producer
-from kafka_client.consumers import run_consumers
-from kafka_client.schemas import json_schema_str
+from kafka_client.consumers import stop_consumers
+from kafka_client.worker import build_router, start_consumers
 
 
 app = FastAPI(
@@ -35,21 +39,41 @@ app.add_middleware(
         'Access-Control-Allow-Origin'
     ],
 )
+app.add_middleware(RequestMetricsMiddleware)
+app.add_middleware(TraceMiddleware)
 
 
 app.state.kafka_consumers = None
 
 
+@app.exception_handler(ProducerOverloaded)
+async def producer_overloaded_handler(
+    request: Request,
+    exc: ProducerOverloaded
+):
+    """Быстрый отказ с 429, пока продюсер перегружен."""
+    logger.warning(f'Запрос {request.url.path} отклонен: {exc}')
+    return ORJSONResponse(
+        status_code=429,
+        content={'detail': str(exc)},
+        headers={'Retry-After': str(exc.retry_after)}
+    )
+
+
 @app.on_event('startup')
 async def startup_event():
     """Запуск сервиса Кафка."""
     logger.info('Запуск Kafka')
+    router = build_router()
     try:
         # Инициализация продюсера с передачей URL Schema Registry
         init_producer(
             bootstrap_servers=settings.kafka_bootstrap_servers,
             topic=settings.kafka_topic,
-            schema_registry_url=settings.kafka_schemaregistry_url
+            schema_registry_url=settings.kafka_schemaregistry_url,
+            router=router,
+            message_format=settings.message_format,
+            compression=settings.producer_compression
         )
         logger.info('Kafka продюсер инициализирован')
     except Exception as e:
@@ -58,22 +82,22 @@ async def startup_event():
     try:
         # Инициализация простого продюсера
         init_plain_producer(
-            bootstrap_servers=settings.kafka_bootstrap_servers
+            bootstrap_servers=settings.kafka_bootstrap_servers,
+            partitioner=settings.plain_producer_partitioner,
+            message_format=settings.user_message_format,
+            schema_registry_url=settings.kafka_schemaregistry_url,
+            compression=settings.plain_producer_compression
         )
         logger.info('Kafka продюсер инициализирован')
     except Exception as e:
         logger.error('Ошибка инициализации продюсера: %s', e)
 
-    # Запуск консьюмеров
+    # Запуск консьюмеров (если они не вынесены в отдельный сервис)
+    if not settings.run_consumers_in_api:
+        logger.info('Консьюмеры работают в отдельном сервисе')
+        return
     try:
-        consumers_info = run_consumers(
-            bootstrap_servers=settings.kafka_bootstrap_servers,
-            topic=settings.kafka_topic,
-            single_group_id=settings.single_consumer_group_id,
-            batch_group_id=settings.batch_consumer_group_id,
-            schema_registry_url=settings.kafka_schemaregistry_url,
-            schema_str=json_schema_str
-        )
+        consumers_info = start_consumers(router)
 
         # Сохраняем информацию о консьюмерах для возможного graceful shutdown
         app.state.kafka_consumers = consumers_info
@@ -101,12 +125,26 @@ async def shutdown_event():
             logger.info('Простой Kafka продюсер закрыт')
         except Exception as e:
             logger.error('Ошибка закрытия простого продюсера: %s', e)
-    # Фиксируем остановку консьюмеров
+    # Останавливаем консьюмеры
     if app.state.kafka_consumers:
         logger.info('Консьюмеры завершают работу')
+        try:
+            stop_consumers(app.state.kafka_consumers)
+        except Exception as e:
+            logger.error('Ошибка остановки консьюмеров: %s', e)
 
 
 if __name__ == '__main__':
+    # Метрики прошлого запуска не должны попасть в /api/metrics.
+    # Сервер работает в новых процессах (gunicorn или reload uvicorn),
+    # они наследуют PROMETHEUS_MULTIPROC_DIR
+    prepare_multiproc_dir()
+    if settings.server_mode == 'gunicorn':
+        # Несколько процессов UvicornWorker по настройкам gunicorn_conf.py
+        os.execvp(
+            'gunicorn',
+            ['gunicorn', '-c', 'gunicorn_conf.py', 'main:app']
+        )
     uvicorn.run(
         'main:app',
         host=settings.host,
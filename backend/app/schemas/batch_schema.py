@@ -0,0 +1,25 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class BatchItemStatusSchema(BaseModel):
+    """Статус доставки одного сообщения из пачки"""
+    index: int
+    status: str
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class OutgoingBatchSchema(BaseModel):
+    """Схема ответа на пакетную отправку сообщений"""
+    msg: str
+    total: int
+    delivered: int
+    failed: int
+    items: list[BatchItemStatusSchema]
+
+    class Config:
+        from_attributes = True
@@ -1,8 +1,12 @@
+from typing import ClassVar
+
 from pydantic import BaseModel
 
 
 class IncominUserMessageSchema(BaseModel):
     """Схема исходящего сообщения для ПР2"""
+    # Имя записи Avro/Protobuf в kafka_client.formats
+    record_name: ClassVar[str] = 'UserMessage'
     user_id: str
     recipient_id: str
     timestamp: str
@@ -15,6 +19,8 @@ class IncominUserMessageSchema(BaseModel):
 
 class IncomingBlockedMessageSchema(BaseModel):
     """Схема входящего сообщения для П2"""
+    # Имя записи Avro/Protobuf в kafka_client.formats
+    record_name: ClassVar[str] = 'BlockedMessage'
     user_id: str
     blocked_user_id: str
     timestamp: str
@@ -23,3 +29,23 @@ class IncomingBlockedMessageSchema(BaseModel):
     class Config:
         """Для совместимости с ORM."""
         from_attributes = True
+
+
+class RawUserMessageSchema(IncominUserMessageSchema):
+    """
+    Сообщение пользователя, исходные байты которого пересылаются
+    в Kafka без пересериализации: лишние поля запрещены.
+    """
+
+    class Config:
+        extra = 'forbid'
+
+
+class RawBlockedMessageSchema(IncomingBlockedMessageSchema):
+    """
+    Сообщение о блокировке, исходные байты которого пересылаются
+    в Kafka без пересериализации: лишние поля запрещены.
+    """
+
+    class Config:
+        extra = 'forbid'
@@ -0,0 +1,90 @@
+"""
+Накладные расходы метрик агента process_filtered_messages:
+проверка блокировок и очистка слов для пачки без метрик и с метриками
+этапов (AgentMetrics). Стоимость самих метрик на пачку измеряется
+отдельно (пустые пачки), так как разница двух прогонов сравнима с шумом.
+Отправка в Kafka не учитывается, поэтому доля - верхняя оценка.
+
+Запуск из каталога kafka_streams:
+    python -m benchmarks.bench_instrumentation [пачек] [размер пачки]
+"""
+import random
+import sys
+import time
+
+import faust_app
+from faust_app import (MessageModel, apply_block, clean_messages,
+                       filter_metrics, is_allowed)
+
+
+def make_batch(size: int, rnd: random.Random) -> list[dict]:
+    return [
+        {
+            'user_id': f'user-{rnd.randrange(1000)}',
+            'recipient_id': f'user-{rnd.randrange(1000)}',
+            'timestamp': '2026-10-18T12:00:00',
+            'message': 'Привет! Тут есть spam и другие слова ' * 2
+        }
+        for _ in range(size)
+    ]
+
+
+def plain(values):
+    allowed = [value for value in values if is_allowed(value)]
+    clean_messages(allowed)
+    return allowed
+
+
+def instrumented(values):
+    started = filter_metrics.start()
+    allowed = [value for value in values if is_allowed(value)]
+    stage_started = filter_metrics.stage('table_lookup', started)
+    clean_messages(allowed)
+    stage_started = filter_metrics.stage('word_filter', stage_started)
+    filter_metrics.stage('send', stage_started)
+    filter_metrics.stage('total', started)
+    filter_metrics.processed(len(values))
+    filter_metrics.dropped(len(values) - len(allowed), 'blocked')
+    return allowed
+
+
+def measure(func, batches) -> float:
+    # Очистка слов изменяет сообщения, поэтому модели создаются заново
+    models = [[MessageModel(**value) for value in values] for values in batches]
+    started = time.perf_counter()
+    for values in models:
+        func(values)
+    return time.perf_counter() - started
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rnd = random.Random(7)
+    for _ in range(5000):
+        apply_block(
+            f'user-{rnd.randrange(1000)}',
+            f'user-{rnd.randrange(1000)}',
+            True
+        )
+    for word in ('spam', 'scam', 'фишинг'):
+        apply_block(faust_app.FORBIDDEN_WORDS_KEY, word, True)
+    batches = [make_batch(batch_size, rnd) for _ in range(count)]
+    events = count * batch_size
+    cases = {'без метрик': plain, 'с метриками': instrumented}
+    results = {name: float('inf') for name in cases}
+    # Варианты чередуются, берется лучший из повторов
+    for _ in range(7):
+        for name, func in cases.items():
+            results[name] = min(results[name], measure(func, batches))
+    for name, elapsed in results.items():
+        print(f'{name}: {elapsed / events * 1e6:.3f} мкс/событие')
+    empty = [[] for _ in range(10000)]
+    metrics_us = min(measure(instrumented, empty) for _ in range(7)) / 10000
+    batch_us = results['без метрик'] / count
+    print(f'метрики на пачку: {metrics_us * 1e6:.2f} мкс, '
+          f'накладные расходы: {metrics_us / batch_us * 100:.2f}%')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Время восстановления состояния блокировок после рестарта воркера:
+полное чтение changelog в memory-хранилище против открытия локальной
+RocksDB (rocksdict) с дочитыванием хвоста changelog.
+
+Сетевое чтение changelog из Kafka не учитывается, поэтому для
+memory-хранилища результат является нижней границей.
+
+Запуск из каталога kafka_streams:
+    python -m benchmarks.bench_recovery [количество записей]
+"""
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from block_state import BlockListView, pair_key
+
+
+TAIL_SHARE = 0.01
+
+
+def synthetic_changelog(size: int) -> list[tuple[bytes, bytes]]:
+    """Записи changelog в том виде, в котором их хранит Kafka."""
+    rnd = random.Random(7)
+    users = max(size // 50, 1)
+    events = []
+    for _ in range(size):
+        key = pair_key(str(rnd.randrange(users)), str(rnd.randrange(users)))
+        value = b'true' if rnd.random() > 0.1 else None
+        events.append((json.dumps(key).encode(), value))
+    return events
+
+
+def replay(events, data: dict):
+    """Применение changelog к memory-хранилищу (как apply_changelog_batch)."""
+    for raw_key, raw_value in events:
+        key = json.loads(raw_key)
+        if raw_value is None:
+            data.pop(key, None)
+        else:
+            data[key] = json.loads(raw_value)
+
+
+def bench_memory(events) -> tuple[float, float]:
+    started = time.perf_counter()
+    data = {}
+    replay(events, data)
+    store_ready = time.perf_counter()
+    BlockListView().load(data.keys())
+    return store_ready - started, time.perf_counter() - store_ready
+
+
+def bench_rocksdb(events, path: str) -> tuple[float, float]:
+    from rocksdict import Rdict
+
+    tail_start = int(len(events) * (1 - TAIL_SHARE))
+    # Состояние, сохраненное воркером до остановки
+    db = Rdict(path)
+    for raw_key, raw_value in events[:tail_start]:
+        if raw_value is None:
+            db.delete(raw_key)
+        else:
+            db[raw_key] = raw_value
+    db[b'__faust\x00offset__'] = str(tail_start).encode()
+    db.close()
+
+    started = time.perf_counter()
+    db = Rdict(path)
+    int(db[b'__faust\x00offset__'])
+    for raw_key, raw_value in events[tail_start:]:
+        if raw_value is None:
+            db.delete(raw_key)
+        else:
+            db[raw_key] = raw_value
+    store_ready = time.perf_counter()
+    view = BlockListView()
+    view.load(
+        json.loads(raw_key) for raw_key in db.keys()
+        if not raw_key.startswith(b'__faust')
+    )
+    view_ready = time.perf_counter()
+    db.close()
+    return store_ready - started, view_ready - store_ready
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000]
+    print(f"{'записей':>10} | {'memory: replay, с':>17} | "
+          f"{'rocksdb: open+хвост, с':>22} | {'сборка view, с':>14}")
+    for size in sizes:
+        events = synthetic_changelog(size)
+        memory_seconds, view_seconds = bench_memory(events)
+        path = tempfile.mkdtemp(prefix='bench-recovery-')
+        try:
+            rocksdb_seconds, _ = bench_rocksdb(events, path)
+        except ImportError:
+            rocksdb_seconds = float('nan')
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+        print(f"{size:>10} | {memory_seconds:>17.2f} | "
+              f"{rocksdb_seconds:>22.2f} | {view_seconds:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Сравнение очистки сообщений от запрещенных слов: цикл str.replace
+против автомата Ахо-Корасик.
+
+Запуск из каталога kafka_streams:
+    python -m benchmarks.bench_word_filter
+"""
+import random
+import string
+import time
+
+from word_filter import ForbiddenWordsFilter
+
+
+WORD_COUNTS = (10, 1_000, 100_000)
+MESSAGES = 200
+
+
+def random_word(rnd: random.Random) -> str:
+    return ''.join(
+        rnd.choice(string.ascii_lowercase)
+        for _ in range(rnd.randint(5, 10))
+    )
+
+
+def replace_loop(text: str, forbidden_words: list[str]) -> str:
+    """Прежний алгоритм из process_filtered_messages."""
+    for forbidden_word in forbidden_words:
+        text = text.replace(forbidden_word, '')
+    return ' '.join(text.split())
+
+
+def measure(func, messages: list[str]) -> float:
+    started = time.perf_counter()
+    for message in messages:
+        func(message)
+    return (time.perf_counter() - started) / len(messages) * 1e6
+
+
+def main():
+    rnd = random.Random(42)
+    print(f"{'слов':>8} | {'replace, мкс/сообщ':>19} | "
+          f"{'Ахо-Корасик, мкс/сообщ':>23} | {'сборка, мс':>10}")
+    for count in WORD_COUNTS:
+        words = list({random_word(rnd) for _ in range(count)})
+        messages = []
+        for index in range(MESSAGES):
+            text = [random_word(rnd) for _ in range(12)]
+            if index % 3 == 0:
+                text.append(rnd.choice(words))
+            messages.append(' '.join(text))
+
+        started = time.perf_counter()
+        words_filter = ForbiddenWordsFilter(words)
+        words_filter.clean('')
+        words_filter.clean('warmup')
+        build_ms = (time.perf_counter() - started) * 1e3
+
+        for message in messages:
+            assert words_filter.clean(message) == replace_loop(message, words)
+        loop_us = measure(lambda text: replace_loop(text, words), messages)
+        filter_us = measure(words_filter.clean, messages)
+        print(f"{count:>8} | {loop_us:>19.1f} | {filter_us:>23.1f} | "
+              f"{build_ms:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Представление списков блокировок в памяти."""
+import sys
+from typing import Iterable
+
+
+# Разделитель пользователя и заблокированного в ключе таблицы
+PAIR_SEPARATOR = '\x1f'
+
+
+def pair_key(user_id: str, blocked_id: str) -> str:
+    """Ключ таблицы для пары (пользователь, заблокированный)."""
+    return f'{user_id}{PAIR_SEPARATOR}{blocked_id}'
+
+
+def split_pair_key(key: str) -> tuple[str, str]:
+    """Разбирает ключ таблицы на пользователя и заблокированного."""
+    user_id, _, blocked_id = key.partition(PAIR_SEPARATOR)
+    return user_id, blocked_id
+
+
+class BlockListView:
+    """
+    Множества заблокированных по пользователям.
+
+    Проверка блокировки и изменения выполняются за O(1) без копирования
+    списков. Идентификаторы интернируются, поэтому одна и та же строка
+    хранится в памяти один раз, сколько бы пар на нее ни ссылалось.
+    В changelog-таблицу пишется только изменившаяся пара.
+    """
+
+    def __init__(self):
+        self._blocked: dict[str, set[str]] = {}
+        self._pairs = 0
+
+    def __len__(self) -> int:
+        """Количество пар (пользователь, заблокированный)."""
+        return self._pairs
+
+    def add(self, user_id: str, blocked_id: str) -> bool:
+        """Добавляет пару, возвращает True если состояние изменилось."""
+        members = self._blocked.get(user_id)
+        if members is None:
+            members = self._blocked[sys.intern(user_id)] = set()
+        if blocked_id in members:
+            return False
+        members.add(sys.intern(blocked_id))
+        self._pairs += 1
+        return True
+
+    def discard(self, user_id: str, blocked_id: str) -> bool:
+        """Удаляет пару, возвращает True если состояние изменилось."""
+        members = self._blocked.get(user_id)
+        if not members or blocked_id not in members:
+            return False
+        members.discard(blocked_id)
+        if not members:
+            del self._blocked[user_id]
+        self._pairs -= 1
+        return True
+
+    def is_blocked(self, user_id: str, sender_id: str) -> bool:
+        """Заблокирован ли sender_id для user_id."""
+        members = self._blocked.get(user_id)
+        return members is not None and sender_id in members
+
+    def members(self, user_id: str) -> frozenset[str]:
+        """Заблокированные для пользователя (только для чтения)."""
+        return frozenset(self._blocked.get(user_id, ()))
+
+    def load(self, keys: Iterable[str]):
+        """Заполняет представление по ключам пар из таблицы."""
+        self._blocked.clear()
+        self._pairs = 0
+        for key in keys:
+            self.add(*split_pair_key(key))
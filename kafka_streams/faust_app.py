@@ -1,9 +1,16 @@
 """Приложение Faust."""
+import asyncio
 import os
 import logging
 import faust
 from dotenv import load_dotenv
 
+from block_state import BlockListView, pair_key, split_pair_key
+from instrumentation import AgentMetrics, setup_metrics
+from record_formats import value_serializer
+from tracing import extend_headers, now_us, record_hops
+from word_filter import ForbiddenWordsFilter
+
 
 # Загружаем переменные окружения
 load_dotenv('.env.streams')
@@ -12,6 +19,30 @@ load_dotenv('.env.streams')
 # Получаем настройки из переменных окружения
 kafka_bootstrap_servers = os.getenv('KAFKA_BOOTSTRAP_SERVERS')
 log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Реплицировать состояние блокировок на все воркеры (GlobalTable)
+block_state_global = os.getenv('BLOCK_STATE_GLOBAL', 'true').lower() == 'true'
+# Хранилище таблиц: memory:// или rocksdb:// (локальное, на томе)
+table_store = os.getenv('TABLE_STORE', 'memory://')
+faust_datadir = os.getenv('FAUST_DATADIR', '{conf.name}-data')
+table_standby_replicas = int(os.getenv('TABLE_STANDBY_REPLICAS', '1'))
+# Пакетная обработка сообщений: размер пачки и окно ожидания (секунды)
+filter_batch_size = int(os.getenv('FILTER_BATCH_SIZE', '500'))
+filter_batch_within = float(os.getenv('FILTER_BATCH_WITHIN', '0.1'))
+# Отдельный экземпляр агента на каждую партицию: параллельная обработка
+# партиций с сохранением порядка событий внутри партиции (и ключа)
+filter_isolated_partitions = os.getenv(
+    'FILTER_AGENT_ISOLATED_PARTITIONS', 'false'
+).lower() == 'true'
+blocked_isolated_partitions = os.getenv(
+    'BLOCKED_AGENT_ISOLATED_PARTITIONS', 'false'
+).lower() == 'true'
+# Формат сообщений топиков: json, avro или protobuf (через Schema Registry)
+message_format = os.getenv('MESSAGE_FORMAT', 'json').lower()
+schema_registry_url = os.getenv(
+    'SCHEMA_REGISTRY_URL', 'http://schema-registry:8081'
+)
+# Сжатие продюсера: gzip, snappy, lz4 или zstd (пусто - без сжатия)
+producer_compression_type = os.getenv('PRODUCER_COMPRESSION_TYPE') or None
 
 
 log_level = getattr(logging, log_level)
@@ -27,6 +58,10 @@ app = faust.App(
     "message-processing-app",
     broker=kafka_bootstrap_servers,
     value_serializer="json",
+    store=table_store,
+    datadir=faust_datadir,
+    table_standby_replicas=table_standby_replicas,
+    producer_compression_type=producer_compression_type,
     web_host="0.0.0.0",
     web_port=6066
 )
@@ -52,14 +87,26 @@ class MessageBlockedModel(faust.Record):
 messages_topic = app.topic(
     "messages_topic",
     key_type=str,
-    value_type=MessageModel
+    value_type=MessageModel,
+    value_serializer=value_serializer(
+        "messages_topic",
+        "UserMessage",
+        message_format,
+        schema_registry_url
+    )
 )
 
 
 blocked_users_topic = app.topic(
     "blocked_users_topic",
     key_type=str,
-    value_type=MessageBlockedModel
+    value_type=MessageBlockedModel,
+    value_serializer=value_serializer(
+        "blocked_users_topic",
+        "BlockedMessage",
+        message_format,
+        schema_registry_url
+    )
 )
 
 
@@ -67,53 +114,208 @@ blocked_users_topic = app.topic(
 filtered_messages_topic = app.topic(
     "filtered_messages_topic",
     key_type=str,
-    value_type=MessageModel
+    value_type=MessageModel,
+    value_serializer=value_serializer(
+        "filtered_messages_topic",
+        "UserMessage",
+        message_format,
+        schema_registry_url
+    )
+)
+
+
+# Ключ, под которым хранятся запрещенные слова
+FORBIDDEN_WORDS_KEY = 'forbidden_words'
+
+
+# Представление таблицы в памяти для проверок за O(1)
+block_view = BlockListView()
+
+
+# Скомпилированный фильтр запрещенных слов, синхронизируется с таблицей
+forbidden_words_filter = ForbiddenWordsFilter()
+
+
+def apply_block(user_id: str, blocked_id: str, blocked: bool) -> bool:
+    """
+    Применяет блокировку/разблокировку к представлению в памяти.
+    Возвращает True, если состояние изменилось.
+    """
+    if blocked:
+        return block_view.add(user_id, blocked_id)
+    return block_view.discard(user_id, blocked_id)
+
+
+def apply_forbidden_word(word: str, forbidden: bool) -> bool:
+    """
+    Добавляет/удаляет слово в фильтре запрещенных слов.
+    Возвращает True, если состояние изменилось.
+    """
+    if forbidden == (word in forbidden_words_filter):
+        return False
+    if forbidden:
+        forbidden_words_filter.add(word)
+    else:
+        forbidden_words_filter.discard(word)
+    return True
+
+
+async def on_block_changelog_event(event):
+    """
+    Применяет запись changelog, прочитанную при восстановлении или
+    репликации таблицы, чтобы представление в памяти на каждом воркере
+    видело изменения, сделанные другими воркерами.
+    """
+    user_id, blocked_id = split_pair_key(event.key)
+    apply_block(user_id, blocked_id, bool(event.value))
+
+
+async def on_forbidden_word_changelog_event(event):
+    """Применяет запись changelog таблицы запрещенных слов."""
+    apply_forbidden_word(event.key, bool(event.value))
+
+
+# Таблица пар (пользователь, заблокированный).
+# Каждая пара хранится отдельным ключом, поэтому изменение блокировки
+# записывает в changelog одну короткую запись, а не весь список.
+if block_state_global:
+    # Полная копия на каждом воркере: сообщения фильтруются локально
+    # независимо от того, какие партиции назначены воркеру
+    blocked_pairs_table = app.GlobalTable(
+        'blocked_pairs_table',
+        key_type=str,
+        value_type=bool,
+        default=bool,
+        partitions=1,
+        recovery_buffer_size=1,
+        use_partitioner=True,
+        on_changelog_event=on_block_changelog_event
+    )
+else:
+    # Партиционированная таблица: сообщения (ключ recipient_id) и блокировки
+    # (ключ user_id) должны быть ко-партиционированы
+    blocked_pairs_table = app.Table(
+        'blocked_pairs_table',
+        key_type=str,
+        value_type=bool,
+        default=bool,
+        on_changelog_event=on_block_changelog_event
+    )
+
+
+# Запрещенные слова приходят с одним ключом forbidden_words и попадают
+# в одну партицию blocked_users_topic, а фильтр нужен каждому воркеру,
+# поэтому слова хранятся в отдельной глобальной таблице при любом
+# значении BLOCK_STATE_GLOBAL
+forbidden_words_table = app.GlobalTable(
+    'forbidden_words_table',
+    key_type=str,
+    value_type=bool,
+    default=bool,
+    partitions=1,
+    recovery_buffer_size=1,
+    use_partitioner=True,
+    on_changelog_event=on_forbidden_word_changelog_event
 )
 
 
-# Таблица для хранения заблокированых пользователей и запрещенных слов
-blocked_user_table = app.Table(
-    'blocked_user_table',
-    default=lambda: []
+# Метрики агентов и таблиц на странице /metrics веб-сервера Faust
+setup_metrics(app, {
+    'blocked_pairs': lambda: len(block_view),
+    'forbidden_words': lambda: len(forbidden_words_filter)
+})
+blocked_metrics = AgentMetrics('process_blocked_users', ('table_update',))
+filter_metrics = AgentMetrics(
+    'process_filtered_messages',
+    ('table_lookup', 'word_filter', 'send', 'total')
 )
 
 
-@app.agent(blocked_users_topic)
+@blocked_pairs_table.on_recover
+async def rebuild_block_state():
+    """Перестраивает представление блокировок после восстановления таблицы."""
+    block_view.load(blocked_pairs_table.keys())
+    logger.info('Состояние блокировок восстановлено, пар: %s',
+                len(block_view))
+
+
+@forbidden_words_table.on_recover
+async def rebuild_forbidden_words():
+    """Перестраивает фильтр запрещенных слов после восстановления таблицы."""
+    forbidden_words_filter.replace(
+        word for word, forbidden in forbidden_words_table.items() if forbidden
+    )
+    logger.info('Фильтр запрещенных слов восстановлен, слов: %s',
+                len(forbidden_words_filter))
+
+
+def update_block(user_id: str, blocked_id: str, blocked: bool):
+    """Записывает изменение блокировки в память и таблицу пар."""
+    if not apply_block(user_id, blocked_id, blocked):
+        return
+    key = pair_key(user_id, blocked_id)
+    if blocked:
+        blocked_pairs_table[key] = True
+    elif key in blocked_pairs_table:
+        del blocked_pairs_table[key]
+
+
+def update_forbidden_word(word: str, forbidden: bool):
+    """Записывает изменение запрещенного слова в фильтр и таблицу слов."""
+    if not apply_forbidden_word(word, forbidden):
+        return
+    if forbidden:
+        forbidden_words_table[word] = True
+    elif word in forbidden_words_table:
+        del forbidden_words_table[word]
+
+
+@app.agent(
+    blocked_users_topic,
+    isolated_partitions=blocked_isolated_partitions
+)
 async def process_blocked_users(stream):
     """
     Добавляет/удаляет пользователей в список заблокированных,
     добавляет/удаляет запрещенные слова по ключу forbidden_words.
     """
     async for value in stream:
-        list_id = set(blocked_user_table[value.user_id])
-        if value.action == 'blocked':
-            if value.user_id == 'forbidden_words':
+        received_us = now_us()
+        started = blocked_metrics.start()
+        record_hops('blocked_users_topic', stream.current_event.headers,
+                    ('faust_in', received_us))
+        blocked = value.action == 'blocked'
+        if blocked:
+            if value.user_id == FORBIDDEN_WORDS_KEY:
                 logger.info('Получено сообщение о внесение слова '
                             '%s в список запрещенных', value.blocked_user_id)
             else:
                 logger.info('Получено сообщение о блокировке пользователя '
                             '%s для пользователя %s',
                             value.blocked_user_id, value.user_id)
-            list_id.add(value.blocked_user_id)
         else:
-            if value.user_id == 'forbidden_words':
+            if value.user_id == FORBIDDEN_WORDS_KEY:
                 logger.info('Получено сообщение о удалении слова '
                             '%s из списка запрещенных', value.blocked_user_id)
             else:
                 logger.info('Получено сообщение о разблокировке пользователя '
                             '%s для пользователя %s',
                             value.blocked_user_id, value.user_id)
-            list_id.discard(value.blocked_user_id)
-        blocked_user_table[value.user_id] = list(list_id)
-        if value.action == 'blocked':
-            if value.user_id == 'forbidden_words':
+        if value.user_id == FORBIDDEN_WORDS_KEY:
+            update_forbidden_word(value.blocked_user_id, blocked)
+        else:
+            update_block(value.user_id, value.blocked_user_id, blocked)
+        blocked_metrics.stage('table_update', started)
+        blocked_metrics.processed()
+        if blocked:
+            if value.user_id == FORBIDDEN_WORDS_KEY:
                 logger.info('Слово %s добавлено в список запрещенных',
                             value.blocked_user_id)
             else:
                 logger.info('Пользователь %s заблокирован для пользователя %s',
                             value.blocked_user_id, value.user_id)
         else:
-            if value.user_id == 'forbidden_words':
+            if value.user_id == FORBIDDEN_WORDS_KEY:
                 logger.info('Слово %s удалено из списка запрещенных',
                             value.blocked_user_id)
             else:
@@ -124,38 +326,84 @@ async def process_blocked_users(stream):
                 )
 
 
-@app.agent(messages_topic)
+def is_allowed(value: MessageModel) -> bool:
+    """
+    Проверяет блокировку отправителя.
+    Возвращает False, если сообщение нужно отбросить.
+    """
+    if block_view.is_blocked(value.recipient_id, value.user_id):
+        logger.debug('Пользователь %s заблокирован для пользователя %s. '
+                     'Сообщение отброшено',
+                     value.user_id,
+                     value.recipient_id)
+        return False
+    return True
+
+
+def clean_messages(values: list[MessageModel]):
+    """Удаляет запрещенные слова из текста сообщений."""
+    if not forbidden_words_filter.words:
+        return
+    for value in values:
+        if value.message:
+            value.message = forbidden_words_filter.clean(value.message)
+
+
+@app.agent(
+    messages_topic,
+    isolated_partitions=filter_isolated_partitions
+)
 async def process_filtered_messages(stream):
     """
     Фильтрует входящие сообщения от заблокированых пользователей
     и удаляет запрещенные слова.
+
+    Сообщения обрабатываются пачками, отправка в filtered_messages_topic
+    ставится в буфер продюсера в порядке поступления, и агент ждет
+    подтверждения сразу всей пачки, а не каждого сообщения.
+    Проверка блокировок и очистка слов выполняются отдельными
+    проходами по пачке, чтобы измерять время каждого этапа.
+    Заголовки трассировки переносятся в исходящие сообщения
+    с этапами faust_in (получение пачки) и faust_out (отправка).
     """
-    async for value in stream:
-        logger.info(
-            'Получено сообщение от пользователя %s для пользователя %s',
-            value.user_id,
-            value.recipient_id
-        )
-        if value.user_id in blocked_user_table[value.recipient_id]:
-            logger.info('Пользователь %s заблокирован для пользователя %s.'
-                        'Сообщение отброшено',
-                        value.user_id,
-                        value.recipient_id)
-            continue
-        forbidden_words = blocked_user_table['forbidden_words']
-        if forbidden_words and value.message:
-            message_text = value.message
-            for forbidden_word in forbidden_words:
-                message_text = message_text.replace(forbidden_word, '')
-            message_text = ' '.join(message_text.split())
-            value.message = message_text
-            logger.info('Сообщение от пользователя %s для пользователя %s '
-                        'очищено от запрещенных слов', value.user_id,
-                        value.recipient_id)
-        await filtered_messages_topic.send(value=value)
-        logger.info('Сообщение от пользователя %s для пользователя %s '
-                    'отправлено в Кафка-топис filtered_messages_topic',
-                    value.user_id, value.recipient_id)
+    async for events in stream.take_events(filter_batch_size,
+                                           within=filter_batch_within):
+        received_us = now_us()
+        started = filter_metrics.start()
+        # Метрики трассировки до отправки: ошибка в них не должна
+        # приводить к повторной отправке пачки
+        for event in events:
+            record_hops('messages_topic', event.headers,
+                        ('faust_in', received_us))
+        values = [event.value for event in events]
+        allowed = [
+            event for event in events if is_allowed(event.value)
+        ]
+        stage_started = filter_metrics.stage('table_lookup', started)
+        clean_messages([event.value for event in allowed])
+        stage_started = filter_metrics.stage('word_filter', stage_started)
+        sent_us = now_us()
+        futures = [
+            filtered_messages_topic.send_soon(
+                key=event.value.recipient_id,
+                value=event.value,
+                headers=extend_headers(
+                    event.headers,
+                    ('faust_in', received_us),
+                    ('faust_out', sent_us)
+                )
+            )
+            for event in allowed
+        ]
+        if futures:
+            await asyncio.gather(*futures)
+        filter_metrics.stage('send', stage_started)
+        filter_metrics.stage('total', started)
+        filter_metrics.processed(len(values))
+        filter_metrics.dropped(len(values) - len(allowed), 'blocked')
+        logger.info('Обработана пачка из %s сообщений, в Кафка-топик '
+                    'filtered_messages_topic отправлено %s',
+                    len(values), len(futures))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,192 @@
+"""
+Форматы сериализации записей Faust: json, avro или protobuf.
+
+Схемы записей читаются из общего с бэкендом файла schemas/records.avsc
+(backend/app/kafka_client/formats.py), поэтому схемы, которые
+регистрируют бэкенд и Faust, одинаковые.
+"""
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from faust.serializers import codecs
+
+
+FORMAT_JSON = 'json'
+FORMAT_AVRO = 'avro'
+FORMAT_PROTOBUF = 'protobuf'
+FORMATS = (FORMAT_JSON, FORMAT_AVRO, FORMAT_PROTOBUF)
+
+# Общий с бэкендом файл схем записей
+# (в контейнере каталог schemas монтируется в /schemas)
+RECORD_SCHEMAS_FILE = (
+    Path(__file__).resolve().parents[1] / 'schemas' / 'records.avsc'
+)
+
+
+@lru_cache(maxsize=None)
+def record_schemas() -> dict[str, dict]:
+    """Схемы Avro записей по имени, в порядке описания в файле."""
+    with open(RECORD_SCHEMAS_FILE, encoding='utf-8') as schemas_file:
+        return {schema['name']: schema for schema in json.load(schemas_file)}
+
+
+def record_fields(record_name: str) -> tuple[str, ...]:
+    """Имена полей записи."""
+    return tuple(
+        field['name'] for field in record_schemas()[record_name]['fields']
+    )
+
+
+def avro_schema_str(record_name: str) -> str:
+    """Схема Avro записи."""
+    return json.dumps(record_schemas()[record_name])
+
+
+@lru_cache(maxsize=None)
+def protobuf_message_type(record_name: str):
+    """
+    Класс сообщения Protobuf, собранный из схем записей
+    без сгенерированного protoc кода (поля нумеруются по порядку).
+    """
+    from google.protobuf import descriptor_pb2, descriptor_pool
+    from google.protobuf.message_factory import GetMessageClass
+
+    schemas = list(record_schemas().values())
+    namespace = schemas[0]['namespace']
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name=f'{namespace}/messages.proto',
+        package=namespace,
+        syntax='proto3'
+    )
+    for schema in schemas:
+        message_proto = file_proto.message_type.add(name=schema['name'])
+        for number, field in enumerate(schema['fields'], start=1):
+            if field['type'] != 'string':
+                raise ValueError(
+                    f"Поле {schema['name']}.{field['name']}: "
+                    f"поддерживаются только строковые поля"
+                )
+            message_proto.field.add(
+                name=field['name'],
+                number=number,
+                type=descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+                label=descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL
+            )
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    return GetMessageClass(
+        pool.FindMessageTypeByName(f'{namespace}.{record_name}')
+    )
+
+
+@lru_cache(maxsize=None)
+def schema_registry_client(url: str):
+    """Клиент Schema Registry, общий для всех кодеков."""
+    from confluent_kafka.schema_registry import SchemaRegistryClient
+
+    return SchemaRegistryClient({'url': url})
+
+
+class ConfluentRecordCodec(codecs.Codec):
+    """
+    Кодек Faust для записей в формате Confluent (Avro или Protobuf).
+
+    Сериализаторы confluent-kafka создаются при первом сообщении,
+    схема регистрируется (и ее ID кэшируется) один раз на топик.
+    """
+
+    def __init__(
+            self,
+            topic: str,
+            record_name: str,
+            message_format: str,
+            schema_registry_url: str,
+            **kwargs: Any
+    ) -> None:
+        super().__init__(
+            topic=topic,
+            record_name=record_name,
+            message_format=message_format,
+            schema_registry_url=schema_registry_url,
+            **kwargs
+        )
+        self.fields = record_fields(record_name)
+        self._serializer = None
+        self._deserializer = None
+
+    def _context(self):
+        from confluent_kafka.serialization import (
+            MessageField,
+            SerializationContext
+        )
+
+        return SerializationContext(self.kwargs['topic'], MessageField.VALUE)
+
+    def _build(self):
+        client = schema_registry_client(self.kwargs['schema_registry_url'])
+        record_name = self.kwargs['record_name']
+        if self.kwargs['message_format'] == FORMAT_AVRO:
+            from confluent_kafka.schema_registry.avro import (
+                AvroDeserializer,
+                AvroSerializer
+            )
+
+            schema_str = avro_schema_str(record_name)
+            self._serializer = AvroSerializer(client, schema_str)
+            self._deserializer = AvroDeserializer(client, schema_str)
+        else:
+            from confluent_kafka.schema_registry.protobuf import (
+                ProtobufDeserializer,
+                ProtobufSerializer
+            )
+
+            message_type = protobuf_message_type(record_name)
+            conf = {'use.deprecated.format': False}
+            serializer = ProtobufSerializer(message_type, client, conf)
+            deserializer = ProtobufDeserializer(message_type, conf)
+            fields = self.fields
+
+            def serialize(obj, ctx):
+                return serializer(message_type(**obj), ctx)
+
+            def deserialize(data, ctx):
+                message = deserializer(data, ctx)
+                return {field: getattr(message, field) for field in fields}
+
+            self._serializer = serialize
+            self._deserializer = deserialize
+
+    def _dumps(self, obj: Any) -> bytes:
+        if self._serializer is None:
+            self._build()
+        # В представлении записи Faust есть служебное поле __faust
+        return self._serializer(
+            {field: obj[field] for field in self.fields},
+            self._context()
+        )
+
+    def _loads(self, s: bytes) -> Any:
+        if self._deserializer is None:
+            self._build()
+        return self._deserializer(s, self._context())
+
+
+def value_serializer(
+        topic: str,
+        record_name: str,
+        message_format: str,
+        schema_registry_url: str
+):
+    """value_serializer топика Faust для выбранного формата."""
+    if message_format not in FORMATS:
+        raise ValueError(f'Неизвестный формат сообщений: {message_format}')
+    if message_format == FORMAT_JSON:
+        return 'json'
+    return ConfluentRecordCodec(
+        topic,
+        record_name,
+        message_format,
+        schema_registry_url
+    )
@@ -0,0 +1,94 @@
+"""
+Трассировка сообщений через заголовки Kafka.
+
+Формат заголовков совпадает с backend/app/kafka_client/tracing.py:
+x-request-id, x-ingest-ts и x-trace-hops ("этап@время_мкс,...").
+Агенты дописывают свои этапы и пишут задержки переходов в метрики.
+"""
+import time
+from typing import Optional
+
+from prometheus_client import Histogram
+
+
+REQUEST_ID_HEADER = 'x-request-id'
+INGEST_HEADER = 'x-ingest-ts'
+HOPS_HEADER = 'x-trace-hops'
+
+TRACE_BUCKETS = (
+    .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30
+)
+
+TRACE_HOP_SECONDS = Histogram(
+    'faust_trace_hop_seconds',
+    'Задержка перехода между этапами трассировки',
+    ['topic', 'hop'],
+    buckets=TRACE_BUCKETS
+)
+TRACE_TOTAL_SECONDS = Histogram(
+    'faust_trace_total_seconds',
+    'Задержка от приема запроса API до этапа stage',
+    ['topic', 'stage'],
+    buckets=TRACE_BUCKETS
+)
+
+
+def now_us() -> int:
+    return time.time_ns() // 1000
+
+
+def _hops_value(headers) -> Optional[bytes]:
+    if not headers:
+        return None
+    value = headers.get(HOPS_HEADER)
+    if isinstance(value, str):
+        value = value.encode()
+    return value
+
+
+def extend_headers(headers, *hops: tuple[str, int]) -> Optional[dict]:
+    """
+    Заголовки для исходящей записи с дописанными этапами
+    (stage, время_мкс). None, если входящая запись без трассировки.
+    """
+    value = _hops_value(headers)
+    if not value:
+        return None
+    result = dict(headers)
+    result[HOPS_HEADER] = b','.join(
+        [value] + [b'%s@%d' % (stage.encode(), ts) for stage, ts in hops]
+    )
+    return result
+
+
+def parse_hops(headers) -> list[tuple[str, int]]:
+    """
+    Этапы (stage, время_мкс) из заголовков. Некорректный заголовок
+    (например, от внешнего продюсера) считается отсутствием трассировки.
+    """
+    value = _hops_value(headers)
+    if not value:
+        return []
+    parsed = []
+    try:
+        for item in value.decode().split(','):
+            stage, _, timestamp = item.rpartition('@')
+            parsed.append((stage, int(timestamp)))
+    except ValueError:
+        return []
+    return parsed
+
+
+def record_hops(topic: str, headers, *hops: tuple[str, int]):
+    """Записывает задержки переходов с учетом новых этапов."""
+    parsed = parse_hops(headers)
+    if not parsed:
+        return
+    parsed.extend(hops)
+    for (previous, previous_ts), (stage, ts) in zip(parsed, parsed[1:]):
+        TRACE_HOP_SECONDS.labels(topic, f'{previous}->{stage}').observe(
+            max((ts - previous_ts) / 1e6, 0)
+        )
+    TRACE_TOTAL_SECONDS.labels(topic, parsed[-1][0]).observe(
+        max((parsed[-1][1] - parsed[0][1]) / 1e6, 0)
+    )
@@ -0,0 +1,136 @@
+"""Фильтр запрещенных слов на основе автомата Ахо-Корасик."""
+from collections import deque
+from typing import Iterable
+
+
+class ForbiddenWordsFilter:
+    """
+    Удаляет из текста все вхождения запрещенных слов за один
+    линейный проход по тексту.
+
+    Добавление слова достраивает бор, удаление помечает бор
+    для перестройки; суффиксные ссылки пересчитываются лениво
+    перед следующей очисткой текста.
+    """
+
+    def __init__(self, words: Iterable[str] = ()):
+        self.words: set[str] = set()
+        self._reset_trie()
+        self.update(words)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.words
+
+    def _reset_trie(self):
+        # Переходы бора, суффиксные ссылки и длина самого длинного
+        # слова, оканчивающегося в узле (с учетом суффиксных ссылок)
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[int] = [0]
+        self._needs_rebuild = False
+        self._needs_links = False
+
+    def _insert(self, word: str):
+        node = 0
+        for char in word:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(0)
+            node = next_node
+        self._out[node] = len(word)
+        self._needs_links = True
+
+    def add(self, word: str):
+        """Добавляет слово в фильтр."""
+        if not word or word in self.words:
+            return
+        self.words.add(word)
+        if not self._needs_rebuild:
+            self._insert(word)
+
+    def discard(self, word: str):
+        """Удаляет слово из фильтра."""
+        if word in self.words:
+            self.words.discard(word)
+            self._needs_rebuild = True
+
+    def update(self, words: Iterable[str]):
+        """Добавляет несколько слов."""
+        for word in words:
+            self.add(word)
+
+    def replace(self, words: Iterable[str]):
+        """Заменяет набор слов целиком."""
+        self.words = {word for word in words if word}
+        self._needs_rebuild = True
+
+    def _compile(self):
+        """Перестраивает бор и суффиксные ссылки при необходимости."""
+        if self._needs_rebuild:
+            words = self.words
+            self._reset_trie()
+            for word in words:
+                self._insert(word)
+        if not self._needs_links:
+            return
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque()
+        for child in goto[0].values():
+            fail[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                link = fail[node]
+                while link and char not in goto[link]:
+                    link = fail[link]
+                link = goto[link].get(char, 0)
+                fail[child] = link if link != child else 0
+                # Самое длинное слово, заканчивающееся в этом узле
+                if out[fail[child]] > out[child]:
+                    out[child] = out[fail[child]]
+                queue.append(child)
+        self._needs_links = False
+
+    def clean(self, text: str) -> str:
+        """
+        Удаляет все вхождения запрещенных слов и схлопывает
+        лишние пробелы.
+        """
+        if not self.words or not text:
+            return ' '.join(text.split())
+        self._compile()
+        goto, fail, out = self._goto, self._fail, self._out
+        # Вырезаемые интервалы [start, end) в порядке следования
+        spans: list[list[int]] = []
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            length = out[node]
+            if length:
+                end = index + 1
+                start = end - length
+                while spans and spans[-1][0] >= start:
+                    spans.pop()
+                if spans and spans[-1][1] >= start:
+                    spans[-1][1] = end
+                else:
+                    spans.append([start, end])
+        if not spans:
+            return ' '.join(text.split())
+        parts = []
+        position = 0
+        for start, end in spans:
+            parts.append(text[position:start])
+            position = end
+        parts.append(text[position:])
+        return ' '.join(''.join(parts).split())